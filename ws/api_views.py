@@ -1,3 +1,4 @@
+import base64
 import json
 from collections import defaultdict
 
@@ -8,8 +9,9 @@ from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import ValidationError
 from django.db import transaction
-from django.db.models import Q
-from django.http import JsonResponse
+from django.db.models import Count, Max, Q
+from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import reverse
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import DetailView, ListView, View
@@ -17,12 +19,17 @@ from django.views.generic.detail import SingleObjectMixin
 
 import ws.utils.dates as date_utils
 import ws.utils.geardb as geardb_utils
+import ws.utils.member_stats as stats_utils
+import ws.utils.membership as membership_utils
 import ws.utils.perms as perm_utils
+import ws.utils.rentals as rental_utils
 import ws.utils.signups as signup_utils
-from ws import enums, models
-from ws.decorators import group_required
+from ws import enums, instrumentation, models, tasks
+from ws.decorators import admin_only, conditional_cache, group_required
 from ws.templatetags.avatar_tags import avatar_url
+from ws.templatetags.trip_tags import annotated_for_trip_list
 from ws.utils.api import jwt_token_from_headers
+from ws.utils.search import participant_search
 from ws.views import AllLeadersView, TripLeadersOnlyView
 
 
@@ -214,19 +221,13 @@ class AdminTripSignupsView(SingleObjectMixin, FormatSignupMixin, TripLeadersOnly
         """Mark all signups as not on trip, then add signups in order."""
         keep_on_trip, to_delete = self.signups_to_update(signup_list, trip)
 
-        # Clear the trip first (delete removals, set others to not on trip)
-        # Both methods (update and skip_signals) ignore waitlist-bumping
-        keep_on_trip.update(on_trip=False)
+        # Delete removals first (skip_signals ignores waitlist-bumping)
         for kill_signup in to_delete:
             kill_signup.skip_signals = True
             kill_signup.delete()
 
-        # `all()` hits the db, will fetch current (`on_trip=False`) signups
-        ordered_signups = keep_on_trip.all()
-
-        for order, signup in enumerate(ordered_signups):
-            signup_utils.trip_or_wait(signup, trip_must_be_open=False)
-            signup_utils.next_in_order(signup, order)
+        # Compute who's on the trip (and in what order) in memory, then save in bulk
+        signup_utils.reorder_signups(trip, keep_on_trip)
 
     def get_signups(self):
         """Trip signups with selected models for use in describe_signup."""
@@ -331,14 +332,10 @@ class JsonParticipantsView(ListView):
 
     def top_matches(self, search=None, exclude_self=False, max_results=20):
         participants = self.get_queryset()
-        if search:
-            # This search is not indexed, or particularly advanced
-            # TODO: Use Postgres FTS, either in raw SQL or through ORM
-            # (Django 1.10 introduces support for full-text search)
-            match = Q(name__icontains=search) | Q(email__icontains=search)
-            participants = participants.filter(match)
         if exclude_self:
             participants = participants.exclude(pk=self.request.participant.pk)
+        if search:
+            participants = participant_search().search(participants, search)
 
         yield from self._serialize_participants(participants[:max_results])
 
@@ -375,6 +372,20 @@ class JsonParticipantsView(ListView):
         return super().dispatch(request, *args, **kwargs)
 
 
+def leaders_fingerprint(request, *args, **kwargs) -> str:
+    """Summarize active ratings (and their leaders) in a single query."""
+    summary = models.LeaderRating.objects.filter(active=True).aggregate(
+        count=Count('pk'),
+        max_pk=Max('pk'),
+        latest_rating=Max('time_created'),
+        latest_leader_update=Max('participant__last_updated'),
+    )
+    changes = [summary['latest_rating'], summary['latest_leader_update']]
+    # Only leaders may view every leader's ratings
+    is_leader = perm_utils.is_leader(request.user)
+    return f"{is_leader}:{summary['count']}:{summary['max_pk']}:{changes}"
+
+
 class JsonProgramLeadersView(View):
     """Give basic information about leaders for a program."""
 
@@ -400,6 +411,7 @@ class JsonProgramLeadersView(View):
                 'rating': rating.rating if activity_enum else None,
             }
 
+    @method_decorator(conditional_cache(leaders_fingerprint))
     def get(self, context, **response_kwargs):
         try:
             program_enum = enums.Program(self.kwargs['program'])
@@ -464,6 +476,7 @@ class JsonAllLeadersView(AllLeadersView):
             {'leaders': list(self.describe_leaders(with_ratings=user_is_leader))}
         )
 
+    @method_decorator(conditional_cache(leaders_fingerprint))
     def dispatch(self, request, *args, **kwargs):
         # Give leader names and Gravatars to the public
         # (Gravatar URLs hash the email with MD5)
@@ -477,6 +490,134 @@ def get_rating(request, pk, activity):
     return JsonResponse(lr[0] if lr else {})
 
 
+class InvalidTripsQuery(Exception):
+    pass
+
+
+class JsonTripsView(View):
+    """Page through all trips (newest first), optionally filtered.
+
+    Pages are fetched by keyset rather than by offset: each page links to the
+    next with a cursor identifying its last trip, and the next page starts
+    just after that trip. Every page (even deep in the archive) is then just
+    a short scan of the `ws_trip_list_order` index.
+
+    Query params:
+        program, algorithm: Only trips with these values
+        leader: Only trips led by this participant (by ID)
+        after, before: Only trips on or after/before these dates
+        limit: Trips per page (at most `max_limit`)
+        cursor: Resume from a previous page (given in its `next` link)
+    """
+
+    default_limit = 50
+    max_limit = 200
+
+    @staticmethod
+    def _encode_cursor(trip):
+        last = [trip.trip_date.isoformat(), trip.time_created.isoformat(), trip.pk]
+        return base64.urlsafe_b64encode(json.dumps(last).encode()).decode()
+
+    @staticmethod
+    def _after_cursor(trips, cursor):
+        """Filter to trips after the cursor (in descending order)."""
+        try:
+            trip_date, time_created, pk = json.loads(base64.urlsafe_b64decode(cursor))
+            trip_date = date_utils.date_from_iso(trip_date)
+            time_created = date_utils.datetime_from_iso(time_created)
+        except (TypeError, ValueError) as e:
+            raise InvalidTripsQuery("Invalid cursor") from e
+        if not isinstance(pk, int):
+            raise InvalidTripsQuery("Invalid cursor")
+
+        # Equivalent to `(trip_date, time_created, id) < (...)`
+        # (The redundant date bound lets the index scan start at the cursor)
+        return trips.filter(trip_date__lte=trip_date).filter(
+            Q(trip_date__lt=trip_date)
+            | Q(trip_date=trip_date, time_created__lt=time_created)
+            | Q(trip_date=trip_date, time_created=time_created, pk__lt=pk)
+        )
+
+    def filtered_trips(self, params):
+        trips = models.Trip.objects.order_by('-trip_date', '-time_created', '-pk')
+
+        if params.get('program'):
+            try:
+                trips = trips.filter(program=enums.Program(params['program']).value)
+            except ValueError as e:
+                raise InvalidTripsQuery("Unknown program") from e
+        if params.get('algorithm'):
+            trips = trips.filter(algorithm=params['algorithm'])
+        if params.get('leader'):
+            if not params['leader'].isdigit():
+                raise InvalidTripsQuery("Leader must be a participant ID")
+            trips = trips.filter(leaders=params['leader'])
+        for param, lookup in [
+            ('after', 'trip_date__gte'),
+            ('before', 'trip_date__lte'),
+        ]:
+            if params.get(param):
+                try:
+                    on_date = date_utils.date_from_iso(params[param])
+                except (TypeError, ValueError) as e:
+                    raise InvalidTripsQuery(f"Invalid date for '{param}'") from e
+                trips = trips.filter(**{lookup: on_date})
+        if params.get('cursor'):
+            trips = self._after_cursor(trips, params['cursor'])
+        return annotated_for_trip_list(trips)
+
+    @staticmethod
+    def describe_trip(trip):
+        return {
+            'id': trip.pk,
+            'name': trip.name,
+            'url': reverse('view_trip', args=(trip.pk,)),
+            'program': trip.program,
+            'algorithm': trip.algorithm,
+            'trip_date': trip.trip_date,
+            'difficulty_rating': trip.difficulty_rating,
+            'description': trip.description,
+            'maximum_participants': trip.maximum_participants,
+            'num_signups': trip.num_signups,
+            'open_slots': trip.open_slots,
+            'leaders': [
+                {
+                    'id': leader.pk,
+                    'name': leader.name,
+                    'rating': leader.rating_for_trip(trip),
+                }
+                for leader in trip.leaders.all()
+            ],
+        }
+
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = int(request.GET.get('limit', self.default_limit))
+        except ValueError:
+            return JsonResponse({'message': "Invalid limit"}, status=400)
+        limit = max(1, min(limit, self.max_limit))
+
+        try:
+            trips = self.filtered_trips(request.GET)
+        except InvalidTripsQuery as e:
+            return JsonResponse({'message': str(e)}, status=400)
+
+        page = list(trips[: limit + 1])
+        next_url = None
+        if len(page) > limit:
+            page = page[:limit]
+            params = request.GET.copy()
+            params['cursor'] = self._encode_cursor(page[-1])
+            next_url = f'{request.path}?{params.urlencode()}'
+
+        models.Participant.load_rating_timelines(
+            leader for trip in page for leader in trip.leaders.all()
+        )
+        return JsonResponse(
+            {'trips': [self.describe_trip(trip) for trip in page], 'next': next_url}
+        )
+
+
 class ApproveTripView(SingleObjectMixin, View):
     model = models.Trip
 
@@ -530,22 +671,86 @@ class UserMembershipView(UserView):
 
 class UserRentalsView(UserView):
     def get(self, request, *args, **kwargs):
-        """Describe all items the user has checked out from MITOC."""
+        """Describe all items the user has checked out from MITOC.
+
+        Participants' rentals are reported from the cache (which is refreshed
+        in the background once stale). Only the very first lookup waits on
+        the gear database.
+        """
         user = self.get_object()
-        rented_items = [
-            # TODO: Could instead use a dataclass with an `as_dict()` invocation
-            # Or a TypedDict once on Python 3.8
+        participant = models.Participant.from_user(user)
+        if not participant:
+            return JsonResponse(
+                {
+                    'rentals': [
+                        {
+                            'email': r.email,
+                            'id': r.id,
+                            'name': r.name,
+                            'cost': r.cost,
+                            'checkedout': r.checkedout,
+                            'overdue': r.overdue,
+                        }
+                        for r in geardb_utils.user_rentals(user)
+                    ],
+                    'last_cached': None,
+                }
+            )
+
+        if participant.rentals_last_cached is None:
+            rental_utils.refresh_rentals([participant.pk])
+            participant.refresh_from_db(fields=['rentals_last_cached'])
+        elif rental_utils.is_stale(participant):
+            tasks.refresh_rentals.delay([participant.pk])
+
+        return JsonResponse(
             {
-                'email': r.email,
-                'id': r.id,
-                'name': r.name,
-                'cost': r.cost,
-                'checkedout': r.checkedout,
-                'overdue': r.overdue,
+                'rentals': [
+                    rental_utils.format_rental(r) for r in participant.rental_set.all()
+                ],
+                'last_cached': participant.rentals_last_cached,
             }
-            for r in geardb_utils.user_rentals(user)
-        ]
-        return JsonResponse({'rentals': rented_items})
+        )
+
+
+class TripRentalsView(DetailView):
+    """Report cached rentals for leaders & participants on a trip.
+
+    Any stale rentals are refreshed in the background, so that a subsequent
+    page load will show the latest from the gear database.
+    """
+
+    model = models.Trip
+
+    def get(self, request, *args, **kwargs):
+        trip = self.get_object()
+        if not (
+            perm_utils.is_leader(request.user)
+            or perm_utils.chair_or_admin(request.user, trip.required_activity_enum())
+        ):
+            return JsonResponse({}, status=403)
+
+        trip_rentals = rental_utils.trip_rentals(trip)
+        if trip_rentals.stale_participant_ids:
+            tasks.refresh_rentals.delay(trip_rentals.stale_participant_ids)
+
+        return JsonResponse(
+            {
+                'rentals': [
+                    {
+                        'participant': {'id': par.pk, 'name': par.name},
+                        'items': [rental_utils.format_rental(r) for r in items],
+                    }
+                    for par, items in trip_rentals.by_participant
+                ],
+                'last_cached': trip_rentals.last_cached,
+                'refreshing': bool(trip_rentals.stale_participant_ids),
+            }
+        )
+
+    @method_decorator(login_required)
+    def dispatch(self, request, *args, **kwargs):
+        return super().dispatch(request, *args, **kwargs)
 
 
 class JWTView(View):
@@ -621,29 +826,16 @@ class MembershipStatusesView(View):
         if not isinstance(par_pks, list):
             return JsonResponse({'message': 'Bad request'}, status=400)
 
-        # Span databases to map from participants -> users -> email addresses
         participants = models.Participant.objects.filter(pk__in=par_pks)
         user_to_par = dict(participants.values_list('user_id', 'pk'))
-        email_addresses = EmailAddress.objects.filter(
-            user_id__in=user_to_par, verified=True
-        )
-        email_to_user = dict(email_addresses.values_list('email', 'user_id'))
-
-        # Gives email -> membership info for all matches
-        matches = geardb_utils.matching_memberships(email_to_user)
+        users = models.User.objects.filter(pk__in=user_to_par)
 
         # Default to blank memberships in case not found
         participant_memberships = {
             pk: geardb_utils.repr_blank_membership() for pk in par_pks
         }
-
-        # Update participants where matching membership information was found
-        for email, membership in matches.items():
-            par_pk = user_to_par[email_to_user[email]]
-            # We might overwrite a previous membership record, but that will
-            # only happen if the user has memberships under 2+ emails
-            # (Older memberships come first, so this will safely yield the newest)
-            participant_memberships[par_pk] = membership
+        for user_id, membership in membership_utils.get_many(users).items():
+            participant_memberships[user_to_par[user_id]] = membership
 
         return JsonResponse({'memberships': participant_memberships})
 
@@ -656,11 +848,26 @@ class MembershipStatusesView(View):
 class RawMembershipStatsView(View):
     @staticmethod
     def get(request, *args, **kwargs):
-        return JsonResponse(
-            {'members': list(geardb_utils.membership_information().values())}
+        # Stats are computed nightly (there may be thousands of members)
+        return StreamingHttpResponse(
+            stats_utils.stream_json(), content_type='application/json'
         )
 
     @method_decorator(group_required('leaders'))
     def dispatch(self, request, *args, **kwargs):
         # TODO: Restrict to BOD only
         return super().dispatch(request, *args, **kwargs)
+
+
+class InstrumentationSummaryView(View):
+    """Summarize the requests & tasks profiled by this process (if enabled)."""
+
+    @staticmethod
+    def get(request, *args, **kwargs):
+        return JsonResponse(
+            {'enabled': settings.INSTRUMENTATION_ENABLED, **instrumentation.summary()}
+        )
+
+    @method_decorator(admin_only)
+    def dispatch(self, request, *args, **kwargs):
+        return super().dispatch(request, *args, **kwargs)
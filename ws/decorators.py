@@ -1,13 +1,18 @@
+import hashlib
 from functools import wraps
 from typing import Optional
 
 from django.contrib.auth import REDIRECT_FIELD_NAME
 from django.contrib.auth.decorators import user_passes_test
 from django.contrib.auth.views import redirect_to_login
+from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
 from django.shortcuts import resolve_url
 from django.urls import reverse, reverse_lazy
+from django.utils.cache import get_conditional_response
 from django.utils.decorators import available_attrs
+from django.utils.http import quote_etag
 
 import ws.utils.perms as perm_utils
 from ws import enums
@@ -101,3 +106,51 @@ participant_or_anon = group_required(
 admin_only = user_passes_test(
     lambda u: u.is_superuser, login_url=reverse_lazy('account_login')
 )
+
+
+def conditional_cache(fingerprint_func, timeout=60 * 60):
+    """Answer conditional GETs with a 304, or serve a cached response body.
+
+    `fingerprint_func(request, *args, **kwargs)` should return a string which
+    describes everything that the response depends upon, ideally with one
+    cheap aggregate query. The fingerprint gives the response's ETag, and keys
+    a cache of its body (any change produces a new key, so bodies never need
+    to be invalidated).
+
+    No Last-Modified header is sent (even if the view sets one): content can
+    change without any newer timestamp (e.g. when a row drops out), so
+    clients must not be told to use `If-Modified-Since`.
+    """
+
+    def decorator(view_func):
+        @wraps(view_func, assigned=available_attrs(view_func))
+        def _wrapped_view(request, *args, **kwargs):
+            if request.method not in {'GET', 'HEAD'}:
+                return view_func(request, *args, **kwargs)
+
+            fingerprint = fingerprint_func(request, *args, **kwargs)
+            etag = quote_etag(hashlib.sha1(fingerprint.encode()).hexdigest())
+
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                full_key = f'{request.get_full_path()}|{etag}'
+                cache_key = f'response:{hashlib.sha1(full_key.encode()).hexdigest()}'
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    content, content_type = cached
+                    response = HttpResponse(content, content_type=content_type)
+                else:
+                    response = view_func(request, *args, **kwargs)
+                    if response.status_code == 200 and not response.streaming:
+                        body = (response.content, response['Content-Type'])
+                        cache.set(cache_key, body, timeout)
+
+            if response.status_code in {200, 304}:
+                response['ETag'] = etag
+                if response.has_header('Last-Modified'):  # (e.g. set by feeds)
+                    del response['Last-Modified']
+            return response
+
+        return _wrapped_view
+
+    return decorator
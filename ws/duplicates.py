@@ -0,0 +1,189 @@
+"""
+Find participants who may be duplicate accounts for the same person.
+
+Each participant has a handful of normalized "keys" (name, phone number, and
+the local part of their email address). Any two participants sharing a key
+are a candidate pair, scored by which keys they share.
+
+Keys & candidates are maintained incrementally whenever a participant is
+saved (see `ws.signals.duplicate_signals`), so that listing candidates is
+just a read from an index. They can be rebuilt from scratch with
+`manage.py rebuild_duplicate_candidates`.
+"""
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, Set, Tuple
+
+import phonenumbers
+from django.db import connections, transaction
+from django.db.models import Exists, OuterRef, Q
+
+from ws import models
+
+# Sharing a phone number is much more telling than sharing a common name
+SCORES = {'phone': 3, 'email': 2, 'name': 1}
+
+WHITESPACE = re.compile(r'\s+')
+
+
+def normalized_name(name: str) -> str:
+    return WHITESPACE.sub(' ', name).strip().casefold()
+
+
+def normalized_phone(phone) -> str:
+    """Format the phone number in E.164, or give '' if it's not a real number."""
+    try:
+        number = phonenumbers.parse(str(phone or ''), 'US')
+    except phonenumbers.NumberParseException:
+        return ''
+    if not phonenumbers.is_valid_number(number):
+        return ''
+    return phonenumbers.format_number(number, phonenumbers.PhoneNumberFormat.E164)
+
+
+def normalized_email(email: str) -> str:
+    """Give the local part of the address, ignoring case & any "+" suffix."""
+    local_part = (email or '').rpartition('@')[0]
+    return local_part.split('+')[0].casefold()
+
+
+def keys_for(participant: models.Participant) -> Set[Tuple[str, str]]:
+    keys = {
+        ('name', normalized_name(participant.name)),
+        ('phone', normalized_phone(participant.cell_phone)),
+        ('email', normalized_email(participant.email)),
+    }
+    return {(kind, value) for kind, value in keys if value}
+
+
+def _candidate(left_id: int, right_id: int, kinds: Iterable[str]):
+    kinds = set(kinds)
+    return models.DuplicateCandidate(
+        left_id=min(left_id, right_id),
+        right_id=max(left_id, right_id),
+        same_name='name' in kinds,
+        same_phone='phone' in kinds,
+        same_email='email' in kinds,
+        score=sum(SCORES[kind] for kind in kinds),
+    )
+
+
+def update_candidates(participant: models.Participant) -> None:
+    """Refresh one participant's keys, and every candidate pair including them.
+
+    If the participant's keys are unchanged, nothing else is queried.
+    """
+    keys = keys_for(participant)
+    existing = set(
+        models.DuplicateKey.objects.filter(participant=participant).values_list(
+            'kind', 'value'
+        )
+    )
+    if keys == existing:
+        return
+
+    with transaction.atomic():
+        models.DuplicateKey.objects.filter(participant=participant).delete()
+        models.DuplicateKey.objects.bulk_create(
+            models.DuplicateKey(participant=participant, kind=kind, value=value)
+            for kind, value in keys
+        )
+
+        shared_kinds: Dict[int, Set[str]] = defaultdict(set)
+        if keys:
+            matches = Q()
+            for kind, value in keys:
+                matches |= Q(kind=kind, value=value)
+            others = models.DuplicateKey.objects.filter(matches).exclude(
+                participant=participant
+            )
+            for par_id, kind in others.values_list('participant_id', 'kind'):
+                shared_kinds[par_id].add(kind)
+
+        models.DuplicateCandidate.objects.filter(
+            Q(left=participant) | Q(right=participant)
+        ).delete()
+        models.DuplicateCandidate.objects.bulk_create(
+            _candidate(participant.pk, par_id, kinds)
+            for par_id, kinds in shared_kinds.items()
+        )
+
+
+def remove_candidates(participant_id: int) -> None:
+    """Forget a participant's keys & candidates (e.g. when merging them away)."""
+    models.DuplicateKey.objects.filter(participant_id=participant_id).delete()
+    models.DuplicateCandidate.objects.filter(
+        Q(left_id=participant_id) | Q(right_id=participant_id)
+    ).delete()
+
+
+def rebuild_all(batch_size: int = 1000) -> int:
+    """Recompute every key & candidate pair. Returns the number of candidates."""
+    with transaction.atomic():
+        models.DuplicateCandidate.objects.all().delete()
+        models.DuplicateKey.objects.all().delete()
+
+        participants = models.Participant.objects.only(
+            'pk', 'name', 'cell_phone', 'email'
+        )
+        models.DuplicateKey.objects.bulk_create(
+            (
+                models.DuplicateKey(participant_id=par.pk, kind=kind, value=value)
+                for par in participants.iterator()
+                for kind, value in keys_for(par)
+            ),
+            batch_size=batch_size,
+        )
+
+        # Pair up all participants sharing a key in one pass over the index
+        cursor = connections['default'].cursor()
+        cursor.execute(
+            '''
+            insert into ws_duplicatecandidate
+                   (left_id, right_id, same_name, same_phone, same_email, score)
+            select a.participant_id,
+                   b.participant_id,
+                   bool_or(a.kind = 'name'),
+                   bool_or(a.kind = 'phone'),
+                   bool_or(a.kind = 'email'),
+                   sum(case a.kind when 'phone' then %(phone)s
+                                   when 'email' then %(email)s
+                                   else %(name)s end)
+              from ws_duplicatekey a
+                   join ws_duplicatekey b on a.kind = b.kind
+                                         and a.value = b.value
+                                         and a.participant_id < b.participant_id
+             group by a.participant_id, b.participant_id
+            ''',
+            SCORES,
+        )
+        return cursor.rowcount
+
+
+def ranked_pairs() -> Iterator[Tuple[models.Participant, models.Participant]]:
+    """Yield pairs of potential duplicates, likeliest first.
+
+    Pairs already marked as distinct are omitted. Each pair has the most
+    recently active person listed last. It's suggested that the merge is
+    done into that account.
+    """
+    distinct = models.DistinctAccounts.objects.filter(
+        Q(left_id=OuterRef('left_id'), right_id=OuterRef('right_id'))
+        | Q(left_id=OuterRef('right_id'), right_id=OuterRef('left_id'))
+    )
+    related = ['emergency_info__emergency_contact', 'car']
+    candidates = (
+        models.DuplicateCandidate.objects.annotate(marked_distinct=Exists(distinct))
+        .filter(marked_distinct=False)
+        .select_related(
+            *(f'left__{field}' for field in related),
+            *(f'right__{field}' for field in related),
+        )
+        .order_by('-score', 'pk')
+    )
+    for candidate in candidates:
+        old, new = sorted(
+            [candidate.left, candidate.right],
+            key=lambda par: (par.profile_last_updated, par.pk),
+        )
+        yield old, new
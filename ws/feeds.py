@@ -1,20 +1,40 @@
 # Using static methods instead of normal methods seems to break feed functionality
 # pylint: disable=no-self-use
 from django.contrib.syndication.views import Feed
+from django.db.models import Count, Max
 from django.urls import reverse, reverse_lazy
 from django.utils import timezone
+from django.utils.decorators import method_decorator
 
+from ws.decorators import conditional_cache
 from ws.models import Trip
 from ws.utils.dates import local_date
 
 DEFAULT_TIMEZONE = timezone.get_default_timezone()  # (US/Eastern)
 
 
+def upcoming_trips_fingerprint(request, *args, **kwargs) -> str:
+    """Summarize upcoming trips (and their creators), so readers can poll cheaply."""
+    today = local_date()
+    summary = Trip.objects.filter(trip_date__gte=today).aggregate(
+        count=Count('pk'),
+        max_pk=Max('pk'),
+        last_edited=Max('last_edited'),
+        creator_updated=Max('creator__last_updated'),
+    )
+    changes = [summary['last_edited'], summary['creator_updated']]
+    return f"{today}:{summary['count']}:{summary['max_pk']}:{changes}"
+
+
 class UpcomingTripsFeed(Feed):
     title = "MITOC Trips"
     link = reverse_lazy("upcoming_trips")
     description = "Upcoming trips by the MIT Outing Club"
 
+    @method_decorator(conditional_cache(upcoming_trips_fingerprint))
+    def __call__(self, request, *args, **kwargs):
+        return super().__call__(request, *args, **kwargs)
+
     def items(self):
         upcoming_trips = Trip.objects.filter(trip_date__gte=local_date())
         return upcoming_trips.order_by('-trip_date')
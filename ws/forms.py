@@ -286,6 +286,7 @@ class TripForm(DjangularRequiredModelForm):
     def clean_maximum_participants(self):
         trip = self.instance
         new_max = self.cleaned_data['maximum_participants']
+        # (Signup counts on the instance may be stale, so count afresh)
         accepted_signups = trip.signup_set.filter(on_trip=True).count()
         if self.instance and accepted_signups > new_max:
             raise ValidationError(
@@ -0,0 +1,213 @@
+"""Opt-in profiling of requests & Celery tasks, usable in production.
+
+When `settings.INSTRUMENTATION_ENABLED` is set, every request and every task
+is profiled: how many SQL queries were made (and how long they took), which
+statements were repeated from the same line of code (the telltale sign of an
+n+1 query), and calls out to external services (the gear database, Google
+Sheets, and DocuSign).
+
+Each profile is logged as a structured record (see `Profile.as_dict()`), and
+summed up by label so that admins can view a summary of this process's work.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from types import FrameType
+from typing import Dict, List, NamedTuple, Optional
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+WS_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Only report the worst offenders in each profile
+MAX_DUPLICATES = 10
+
+_local = threading.local()
+
+
+def _call_site() -> str:
+    """Describe the innermost line of our own code in the current stack."""
+    frame: Optional[FrameType] = sys._getframe(1)  # pylint: disable=protected-access
+    while frame:
+        filename = frame.f_code.co_filename
+        if filename.startswith(WS_ROOT) and filename != __file__:
+            path = os.path.relpath(filename, os.path.dirname(WS_ROOT))
+            return f'{path}:{frame.f_lineno} ({frame.f_code.co_name})'
+        frame = frame.f_back
+    return '(unknown)'
+
+
+class Duplicate(NamedTuple):
+    call_site: str
+    sql: str
+    num_calls: int
+
+
+class Profile:  # pylint: disable=too-many-instance-attributes
+    """Queries & external calls made while handling one request (or task)."""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.start = time.perf_counter()
+        self.seconds: Optional[float] = None
+
+        self.num_queries = 0
+        self.query_seconds = 0.0
+        self.statements: Dict[tuple, int] = Counter()  # (call site, SQL) -> count
+
+        self.external_calls: Dict[str, int] = Counter()
+        self.external_seconds: Dict[str, float] = defaultdict(float)
+
+    def __call__(self, execute, sql, params, many, context):
+        """Time each query (for use with `connection.execute_wrapper`)."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            if context['connection'].alias == 'geardb':
+                self.record_external('geardb', elapsed)
+            else:
+                self.num_queries += 1
+                self.query_seconds += elapsed
+                self.statements[_call_site(), sql] += 1
+
+    def record_external(self, service: str, seconds: float) -> None:
+        self.external_calls[service] += 1
+        self.external_seconds[service] += seconds
+
+    def duplicates(self) -> List[Duplicate]:
+        """Return statements repeated from the same line, most repeated first."""
+        repeated = [
+            Duplicate(call_site, sql, num_calls)
+            for (call_site, sql), num_calls in self.statements.items()
+            if num_calls > 1
+        ]
+        return sorted(repeated, key=lambda dupe: -dupe.num_calls)
+
+    def as_dict(self) -> dict:
+        return {
+            'label': self.label,
+            'ms': round((self.seconds or 0) * 1000, 2),
+            'num_queries': self.num_queries,
+            'query_ms': round(self.query_seconds * 1000, 2),
+            'duplicates': [
+                dupe._asdict() for dupe in self.duplicates()[:MAX_DUPLICATES]
+            ],
+            'external': {
+                service: {
+                    'calls': num_calls,
+                    'ms': round(self.external_seconds[service] * 1000, 2),
+                }
+                for service, num_calls in self.external_calls.items()
+            },
+        }
+
+
+class LabelSummary:  # pylint: disable=too-many-instance-attributes
+    """Running totals for every profile with the same label."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.num_queries = 0
+        self.max_queries = 0
+        self.query_seconds = 0.0
+        self.num_duplicated = 0  # Queries which repeated a statement & call site
+        self.external_calls: Dict[str, int] = Counter()
+
+    def add(self, prof: Profile) -> None:
+        self.count += 1
+        self.seconds += prof.seconds or 0
+        self.max_seconds = max(self.max_seconds, prof.seconds or 0)
+        self.num_queries += prof.num_queries
+        self.max_queries = max(self.max_queries, prof.num_queries)
+        self.query_seconds += prof.query_seconds
+        self.num_duplicated += sum(dupe.num_calls - 1 for dupe in prof.duplicates())
+        self.external_calls.update(prof.external_calls)
+
+    def as_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'mean_ms': round(self.seconds / self.count * 1000, 2),
+            'max_ms': round(self.max_seconds * 1000, 2),
+            'mean_queries': round(self.num_queries / self.count, 1),
+            'max_queries': self.max_queries,
+            'mean_query_ms': round(self.query_seconds / self.count * 1000, 2),
+            'duplicated_queries': self.num_duplicated,
+            'external_calls': dict(self.external_calls),
+        }
+
+
+_summaries: Dict[str, LabelSummary] = defaultdict(LabelSummary)
+_summaries_lock = threading.Lock()
+
+
+def summary() -> dict:
+    """Summarize all profiles taken by this process, slowest labels first."""
+    with _summaries_lock:
+        summaries = sorted(_summaries.items(), key=lambda item: -item[1].seconds)
+        return {
+            'pid': os.getpid(),
+            'labels': {label: totals.as_dict() for label, totals in summaries},
+        }
+
+
+def reset_summary() -> None:
+    with _summaries_lock:
+        _summaries.clear()
+
+
+def current_profile() -> Optional[Profile]:
+    return getattr(_local, 'profile', None)
+
+
+@contextmanager
+def profile(label: str):
+    """Profile all queries & external calls made within this block.
+
+    The label may be changed before the block ends (e.g. once a request's
+    view is known). Profiles are summed up by their final label.
+    """
+    prof = Profile(label)
+    outer_profile = current_profile()
+    _local.profile = prof
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(prof))
+            yield prof
+    finally:
+        _local.profile = outer_profile
+        prof.seconds = time.perf_counter() - prof.start
+        with _summaries_lock:
+            _summaries[prof.label].add(prof)
+        logger.info(
+            "%s took %.0fms (%d queries in %.0fms)",
+            prof.label,
+            prof.seconds * 1000,
+            prof.num_queries,
+            prof.query_seconds * 1000,
+            extra={'instrumentation': prof.as_dict()},
+        )
+
+
+@contextmanager
+def external_call(service: str):
+    """Time a call to an external service (if something is being profiled)."""
+    prof = current_profile()
+    if not prof:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        prof.record_external(service, time.perf_counter() - start)
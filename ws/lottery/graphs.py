@@ -1,5 +1,5 @@
 from collections import defaultdict
-from typing import List
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 
 from ws import models
 
@@ -60,60 +60,76 @@ class SeparationGraph:
 
         This allows us to easily ignore participants who have a separation request
         in place, but have not signed up for trips on a given Winter School week.
+
+        Internally, the graph is keyed by participant pk. Blocks are tracked
+        in both directions, so removing a participant is O(degree).
         """
+        self._participants: Dict[int, models.Participant] = {
+            par.pk: par for par in relevant_participants
+        }
         # Start with all relevant blocks. We'll remove nodes as we continue
-        self._graph = self._make_graph(relevant_participants)
+        self._graph, self._blocked_by = self._make_graph(self._participants)
 
     @staticmethod
     def _make_graph(participants):
-        """Express all separations as a directed graph of participants.
+        """Express all separations as a directed graph of participant pks.
 
         This graph may be a tree (a directed acyclic graph, or DAG) or it could have cycles.
 
         The most common expected incidence of cycles is a bi-directional block (two participants
         who have blocked one another).
+
+        Returns the graph, and its reverse (recipient pk -> initiator pks).
         """
         # If a participant is not taking part in a lottery, their block isn't relevant.
         # Be sure to exclude any blocks that will falsely denote cycles
         relevant_blocks = models.LotterySeparation.objects.filter(
-            initiator__in=participants,
-            recipient__in=participants,
-        )
-        mapping = defaultdict(set)
-        for block in relevant_blocks:
-            mapping[block.initiator].add(block.recipient)
-        return dict(mapping)
+            initiator_id__in=participants,
+            recipient_id__in=participants,
+        ).values_list('initiator_id', 'recipient_id')
+
+        mapping: Dict[int, Set[int]] = defaultdict(set)
+        reverse: Dict[int, Set[int]] = defaultdict(set)
+        for initiator_pk, recipient_pk in relevant_blocks:
+            mapping[initiator_pk].add(recipient_pk)
+            reverse[recipient_pk].add(initiator_pk)
+        return dict(mapping), dict(reverse)
 
     @property
     def participants_affected_by_blocks(self):
         seen_recipients = set()
         for initiator, blocked in self._graph.items():
-            yield initiator
+            yield self._participants[initiator]
             for recipient in blocked:
                 if recipient not in self._graph and recipient not in seen_recipients:
-                    yield recipient
+                    yield self._participants[recipient]
                 seen_recipients.add(recipient)
 
     @property
     def current_graph(self):
-        return self._graph
+        return {
+            self._participants[initiator]: {
+                self._participants[recipient] for recipient in recipients
+            }
+            for initiator, recipients in self._graph.items()
+        }
 
     def remove(self, par):
         """Mark a participant as handled, so remove them from the graph."""
         # None of the blocks made by this participant are relevant anymore!
-        self._graph.pop(par, None)
-
-        # There may be people blocking only this participant. We can remove them from the graph.
-        participants_now_blocking_nobody = set()
+        for recipient in self._graph.pop(par.pk, set()):
+            initiators = self._blocked_by[recipient]
+            initiators.discard(par.pk)
+            if not initiators:
+                del self._blocked_by[recipient]
 
         # Similarly, we don't need to consider any blocks by people towards this par
-        for initiator, recipients in self._graph.items():
-            recipients.discard(par)
+        # There may be people blocking only this participant. We can remove them from the graph.
+        for initiator in self._blocked_by.pop(par.pk, set()):
+            recipients = self._graph[initiator]
+            recipients.discard(par.pk)
             if not recipients:
-                participants_now_blocking_nobody.add(initiator)
-
-        for initiator in participants_now_blocking_nobody:
-            self._graph.pop(initiator)
+                del self._graph[initiator]
 
     @property
     def empty(self) -> bool:
@@ -121,6 +137,99 @@ class SeparationGraph:
         # TODO: Should also allow a key with an empty set?
         return not bool(self._graph)
 
+    def strongly_connected_components(self) -> List[List[models.Participant]]:
+        """Return groups of participants who all (transitively) block one another.
+
+        Every participant in the graph belongs to exactly one component.
+        Components are found with Tarjan's algorithm (iteratively, to avoid
+        recursion limits on large weeks) in time linear to the graph's size.
+        Components come in reverse topological order: no component blocks
+        anybody in a component that comes after it.
+        """
+        index: Dict[int, int] = {}
+        lowlink: Dict[int, int] = {}
+        stack: List[int] = []
+        on_stack: Set[int] = set()
+        components: List[List[models.Participant]] = []
+        # Each frame is a node, plus an iterator over the nodes it blocks
+        work: List[Tuple[int, Iterator[int]]] = []
+
+        def visit(node: int) -> None:
+            index[node] = lowlink[node] = len(index)
+            stack.append(node)
+            on_stack.add(node)
+            work.append((node, iter(sorted(self._graph.get(node, ())))))
+
+        def next_unvisited(node: int, children: Iterator[int]) -> Optional[int]:
+            """Return the next child not yet visited, noting any others on the stack."""
+            for child in children:
+                if child not in index:
+                    return child
+                if child in on_stack:
+                    lowlink[node] = min(lowlink[node], index[child])
+            return None
+
+        nodes = set(self._graph).union(*self._graph.values())
+        for root in sorted(nodes):
+            if root in index:
+                continue
+            visit(root)
+            while work:
+                node, children = work[-1]
+                child = next_unvisited(node, children)
+                if child is not None:
+                    visit(child)
+                    continue
+
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(self._participants[member])
+                        if member == node:
+                            break
+                    components.append(component[::-1])
+        return components
+
+    def deadlocked_cycles(self) -> List[Cycle]:
+        """Return one cycle from each group of participants blocking only one another.
+
+        Nobody in such a group can be placed by waiting on somebody outside
+        the group, so one participant from each cycle must be placed to break
+        it. Every other participant in the graph is (transitively) waiting on
+        either a terminal participant or one of these groups, so this single
+        linear-time pass finds everything that needs breaking.
+        """
+        cycles = []
+        for component in self.strongly_connected_components():
+            if len(component) < 2:
+                continue
+            members = {par.pk for par in component}
+            if any(
+                blocked not in members
+                for pk in members
+                for blocked in self._graph.get(pk, ())
+            ):
+                continue  # Somebody blocks a participant who can be placed first
+
+            # Walk blocks within the component until we revisit somebody.
+            path: List[int] = []
+            position: Dict[int, int] = {}
+            pk = min(members)
+            while pk not in position:
+                position[pk] = len(path)
+                path.append(pk)
+                pk = min(self._graph[pk] & members)
+            cycles.append(
+                Cycle([self._participants[pk] for pk in path[position[pk] :]])
+            )
+        return cycles
+
     def isolated_cycles(self, start_par) -> List[Cycle]:
         r""" Return any directed cycles containing this participant (with no terminal nodes reachable)
 
@@ -178,12 +287,12 @@ class SeparationGraph:
             |         |
             +--< C <--+
         """
-        if start_par not in self._graph:
+        if start_par.pk not in self._graph:
             return []
 
         termini = set()
 
-        seen = {start_par}
+        seen = {start_par.pk}
         path = []
 
         def dfs(par):
@@ -209,11 +318,11 @@ class SeparationGraph:
                     #   ^         v
                     #   +--< C <--+
                     just_cycle_subpath = path[path.index(child) :]
-                    yield Cycle(just_cycle_subpath)
+                    yield Cycle([self._participants[pk] for pk in just_cycle_subpath])
 
             path.pop()
 
         # Importantly, ignore any cycles that do not directly involve this participant.
         # (Also, exhaust the generator now, so as to set `termini`)
-        member_cycles = [cycle for cycle in dfs(start_par) if start_par in cycle]
+        member_cycles = [cycle for cycle in dfs(start_par.pk) if start_par in cycle]
         return [] if termini else member_cycles
@@ -4,7 +4,7 @@ from typing import Dict, List, Optional, Tuple
 from django.db.models import Q
 
 from ws import enums, models
-from ws.utils.signups import add_to_waitlist
+from ws.utils.signups import add_to_waitlist, save_on_trip
 
 
 def par_is_driver(participant):
@@ -29,8 +29,7 @@ def place_on_trip(signup, logger):
     trip = signup.trip
     slots = 'slot' if trip.open_slots == 1 else 'slots'
     logger.info(f"{trip} has {trip.open_slots} {slots}, adding {signup.participant}")
-    signup.on_trip = True
-    signup.save()
+    save_on_trip(signup, True)
 
 
 class ParticipantHandler:
@@ -115,10 +114,11 @@ class ParticipantHandler:
         Returns if successful.
         """
         trip = signup.trip
-        if trip.open_slots >= self.slots_needed:
+        open_slots = trip.current_open_slots()
+        if open_slots >= self.slots_needed:
             self.place_all_on_trip(signup)
             return True
-        if self.is_driver and not trip.open_slots and not self.paired:
+        if self.is_driver and not open_slots and not self.paired:
             # A driver may displace somebody else.
             # At present, we don't allow pairs of drivers to displace 2.
             # TODO: Support the above scenario!
@@ -134,8 +134,7 @@ class ParticipantHandler:
                 self.logger.info(
                     "Adding driver %s to %r", signup.participant.name, trip.name
                 )
-                signup.on_trip = True
-                signup.save()
+                save_on_trip(signup, True)
                 return True
         return False
 
@@ -225,13 +224,12 @@ class WinterSchoolParticipantHandler(ParticipantHandler):
         # Do not bother being picky about potentially being bumped by a driver
         future_signups = ranked_signups(par, after=self.lottery_rundate)
         for other_signup in future_signups.exclude(pk=signup.pk):
-            if not other_signup.trip.open_slots:
+            if not other_signup.trip.current_open_slots():
                 self.logger.debug("%r is full", other_signup.trip.name)
                 continue
             place_on_trip(other_signup, self.logger)
             self.logger.debug("Placed on %r", other_signup.trip.name)
-            signup.on_trip = False
-            signup.save()
+            save_on_trip(signup, False)
             return
 
         # No slots are open - just waitlist them on their top trip!
@@ -292,7 +290,7 @@ class WinterSchoolParticipantHandler(ParticipantHandler):
         This is invoked for every signup, so we make attempts to exit early
         (for efficiency) in most scenarios.
         """
-        open_slots = signup.trip.open_slots
+        open_slots = signup.trip.current_open_slots()
 
         if open_slots < self.slots_needed:
             return False  # Cannot place anyway, driver has nothing to do with it.
@@ -317,15 +315,20 @@ class WinterSchoolParticipantHandler(ParticipantHandler):
 
         # At this point, potential drivers could bump some of the last signups!
         # If other unhandled participants ranked this trip, consider it jeopardized
-        driver_signups = models.SignUp.objects.filter(
-            trip=signup.trip,
-            on_trip=False,  # If on the trip, we know they're handled.
-            participant__lotteryinfo__car_status__in=['own', 'rent'],
-            # TODO (Django 2): Exclude reciprocally-paired participants where both are signed up.
-            # These participants cannot bump.
-            # This is simpler in Django 2 (see `annotate_reciprocally_paired()`)
-        ).exclude(participant_id__in=self.to_be_placed)
+        driver_signups = (
+            models.SignUp.objects.select_related('participant')
+            .filter(
+                trip=signup.trip,
+                on_trip=False,  # If on the trip, we know they're handled.
+                participant__lotteryinfo__car_status__in=['own', 'rent'],
+                # TODO (Django 2): Exclude reciprocally-paired participants where both are signed up.
+                # These participants cannot bump.
+                # This is simpler in Django 2 (see `annotate_reciprocally_paired()`)
+            )
+            .exclude(participant_id__in=self.to_be_placed)
+        )
 
+        # Load participants up front; the number checked before `any()` stops varies.
         return any(
             not self.runner.handled(signup.participant) for signup in driver_signups
         )
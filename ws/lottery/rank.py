@@ -1,8 +1,9 @@
 import random
-from collections import namedtuple
+from collections import defaultdict, namedtuple
 from datetime import timedelta
+from typing import Dict, Optional
 
-from django.db.models import Q
+from django.db.models import Count, Q
 from mitoc_const import affiliations
 
 from ws import enums, models, settings
@@ -81,11 +82,25 @@ def affiliation_weighted_rand(participant, lottery_key):
 
     See `seed_for` for a full explanation of `lottery_key`.
     """
-    random.seed(seed_for(participant, lottery_key))
-    return random.random() - WEIGHTS[participant.affiliation]
+    # A dedicated generator gives the same number as seeding the `random`
+    # module would, without clobbering global state for anybody else.
+    rand = random.Random(seed_for(participant, lottery_key))
+    return rand.random() - WEIGHTS[participant.affiliation]
+
+
+def affiliation_weighted_rands(participants, lottery_key) -> Dict[int, float]:
+    """Return affiliation-weighted random numbers for many participants at once.
+
+    Results are keyed by participant pk, and are identical to calling
+    `affiliation_weighted_rand` on each participant.
+    """
+    return {par.pk: affiliation_weighted_rand(par, lottery_key) for par in participants}
 
 
 class ParticipantRanker:
+    # Unique to each lottery run (see `seed_for`), if ranking is randomized
+    lottery_key: Optional[str] = None
+
     def __iter__(self):
         """Participants in the order they should be placed, with their score.
 
@@ -96,11 +111,31 @@ class ParticipantRanker:
         Each participant is decorated with an attribute that says if they've
         reciprocally paired themselves with another participant.
         """
-        participants = annotate_reciprocally_paired(self.participants_to_handle())
+        participants = list(annotate_reciprocally_paired(self.participants_to_handle()))
+        if self.lottery_key is not None:
+            self.load_affiliation_weights(participants)
         with_keys = ((self.priority_key(par), par) for par in participants)
         for priority_key, participant in sorted(with_keys):
             yield participant, priority_key
 
+    def load_affiliation_weights(self, participants):
+        """Draw the random, affiliation-weighted numbers for all participants."""
+        if not hasattr(self, 'affiliation_weights'):
+            self.affiliation_weights = {}
+        self.affiliation_weights.update(
+            affiliation_weighted_rands(participants, self.lottery_key)
+        )
+
+    def affiliation_weight(self, participant) -> float:
+        """Return the participant's random number (drawn just once per run)."""
+        if not hasattr(self, 'affiliation_weights'):
+            self.affiliation_weights = {}
+        if participant.pk not in self.affiliation_weights:
+            self.affiliation_weights[participant.pk] = affiliation_weighted_rand(
+                participant, self.lottery_key
+            )
+        return self.affiliation_weights[participant.pk]
+
     def participants_to_handle(self):
         """QuerySet of participants to be ranked."""
         raise NotImplementedError
@@ -113,10 +148,10 @@ class ParticipantRanker:
 class SingleTripParticipantRanker(ParticipantRanker):
     def __init__(self, trip):
         self.trip = trip
+        self.lottery_key = f"trip-{trip.pk}"
 
     def priority_key(self, participant):
-        lottery_key = f"trip-{self.trip.pk}"
-        return affiliation_weighted_rand(participant, lottery_key)
+        return self.affiliation_weight(participant)
 
     def participants_to_handle(self):
         return models.Participant.objects.filter(signup__trip=self.trip)
@@ -141,6 +176,62 @@ class WinterSchoolParticipantRanker(ParticipantRanker):
         self.jan_1st = self.today.replace(month=1, day=1)
         self.lottery_key = f"ws-{today.isoformat()}"
 
+        # Populated in bulk when iterating over all participants (key: participant pk)
+        self._ws_trip_counts: Optional[Dict[int, TripCounts]] = None
+        self._num_trips_led: Optional[Dict[int, int]] = None
+
+    def __iter__(self):
+        self.load_trip_counts()
+        return super().__iter__()
+
+    def load_trip_counts(self):
+        """Count trips attended, flaked, & led for all participants at once.
+
+        Computing these counts per participant takes four queries each;
+        this instead uses a few aggregate queries over everybody in
+        `participants_to_handle()` so that ranking is a single pass.
+        """
+        par_pks = set(self.participants_to_handle().values_list('pk', flat=True))
+
+        flaked_by_par = defaultdict(set)
+        for par_pk, trip_pk in (
+            models.Feedback.objects.filter(  # (Bygones manager ignores old feedback)
+                participant_id__in=par_pks,
+                showed_up=False,
+                trip__program=enums.Program.WINTER_SCHOOL.value,
+            )
+            .values_list('participant_id', 'trip_id')
+            .distinct()
+        ):
+            flaked_by_par[par_pk].add(trip_pk)
+
+        on_trip_by_par = defaultdict(set)
+        for par_pk, trip_pk in models.SignUp.objects.filter(
+            participant_id__in=par_pks,
+            on_trip=True,
+            trip__program=enums.Program.WINTER_SCHOOL.value,
+            trip__trip_date__gt=self.jan_1st,
+            trip__trip_date__lt=self.today,
+        ).values_list('participant_id', 'trip_id'):
+            on_trip_by_par[par_pk].add(trip_pk)
+
+        last_year = self.today - timedelta(days=365)
+        num_led = dict(
+            models.Trip.leaders.through.objects.filter(
+                participant_id__in=par_pks,
+                trip__trip_date__gt=last_year,
+                trip__trip_date__lt=self.today,
+            )
+            .values_list('participant_id')
+            .annotate(num_trips=Count('trip_id'))
+        )
+
+        self._ws_trip_counts = {
+            pk: self._trip_counts(on_trip_by_par[pk], flaked_by_par[pk])
+            for pk in par_pks
+        }
+        self._num_trips_led = {pk: num_led.get(pk, 0) for pk in par_pks}
+
     def get_rank_override(self, participant):
         if not hasattr(self, 'adjustments_by_participant'):
             adjustments = models.LotteryAdjustment.objects.filter(
@@ -180,7 +271,7 @@ class WinterSchoolParticipantRanker(ParticipantRanker):
 
         # Ties are resolved by a random number
         # (MIT students/affiliates are more likely to come first)
-        affiliation_weight = affiliation_weighted_rand(participant, self.lottery_key)
+        affiliation_weight = self.affiliation_weight(participant)
 
         # Lower = higher in the list
         return WinterSchoolPriorityRank(
@@ -213,6 +304,9 @@ class WinterSchoolParticipantRanker(ParticipantRanker):
         participants could easily jump the queue every Winter School if they
         just lead a few trips once and then stop).
         """
+        if self._num_trips_led is not None and participant.pk in self._num_trips_led:
+            return self._num_trips_led[participant.pk]
+
         last_year = self.today - timedelta(days=365)
         within_last_year = Q(trip_date__gt=last_year, trip_date__lt=self.today)
         return participant.trips_led.filter(within_last_year).count()
@@ -228,6 +322,9 @@ class WinterSchoolParticipantRanker(ParticipantRanker):
         - Participant flaked, so leader removed them & left feedback
         - Participant flaked. Leader left feedback, but left them on the trip
         """
+        if self._ws_trip_counts is not None and participant.pk in self._ws_trip_counts:
+            return self._ws_trip_counts[participant.pk]
+
         marked_on_trip = set(
             participant.trip_set.filter(
                 program=enums.Program.WINTER_SCHOOL.value, signup__on_trip=True
@@ -236,7 +333,10 @@ class WinterSchoolParticipantRanker(ParticipantRanker):
             .values_list('pk', flat=True)
         )
         flaked = set(self.trips_flaked(participant))
+        return self._trip_counts(marked_on_trip, flaked)
 
+    @staticmethod
+    def _trip_counts(marked_on_trip, flaked) -> TripCounts:
         # Some leaders mark flakes, but don't remove participants
         # To calculate total, we can't double-count trips
         total = marked_on_trip.union(flaked)
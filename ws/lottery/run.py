@@ -3,6 +3,7 @@ import json
 import logging
 from datetime import datetime
 from pathlib import Path
+from typing import Dict, Iterable, List
 
 from mitoc_const import affiliations
 
@@ -12,6 +13,11 @@ from ws.lottery.handle import (
     WinterSchoolParticipantHandler,
 )
 from ws.lottery.rank import SingleTripParticipantRanker, WinterSchoolParticipantRanker
+from ws.lottery.snapshot import (
+    InMemoryParticipantHandler,
+    LotterySnapshot,
+    lowest_non_driver,
+)
 from ws.utils.dates import closest_wed_at_noon, local_now
 
 AFFILIATION_MAPPING = {
@@ -87,16 +93,21 @@ class SingleTripLotteryRunner(LotteryRunner):
         self.handler.setLevel(logging.DEBUG)
         self.logger.addHandler(self.handler)
 
+    def _close_log(self):
+        # The logger is shared by any runner for this trip; don't leave a closed stream
+        self.logger.removeHandler(self.handler)
+        self.log_stream.close()
+
     def _make_fcfs(self):
         """After lottery execution, mark the trip FCFS & write out the log."""
         self.trip.algorithm = 'fcfs'
         self.trip.lottery_log = self.log_stream.getvalue()
-        self.log_stream.close()
+        self._close_log()
         self.trip.save()
 
     def __call__(self):
         if self.trip.algorithm != 'lottery':
-            self.log_stream.close()
+            self._close_log()
             return
 
         self.logger.info("Randomly ordering (preference to MIT affiliates)...")
@@ -122,6 +133,37 @@ class SingleTripLotteryRunner(LotteryRunner):
         self._make_fcfs()
 
 
+def independent_trip_groups(trip_pks: Iterable[int]) -> List[List[int]]:
+    """Split trips into groups such that no two groups share any participants.
+
+    Single-trip lotteries for trips in different groups may safely run
+    concurrently. Trips within a group are sorted by pk (as are the groups
+    themselves, by their first trip), so that running each group in order
+    is deterministic.
+    """
+    trip_pks = sorted(set(trip_pks))
+    parent: Dict[int, int] = {pk: pk for pk in trip_pks}
+
+    def find(pk: int) -> int:
+        while parent[pk] != pk:
+            parent[pk] = parent[parent[pk]]
+            pk = parent[pk]
+        return pk
+
+    first_trip_for_participant: Dict[int, int] = {}
+    signups = models.SignUp.objects.filter(trip_id__in=trip_pks)
+    for trip_pk, par_pk in signups.values_list('trip_id', 'participant_id'):
+        other_trip_pk = first_trip_for_participant.setdefault(par_pk, trip_pk)
+        root, other_root = find(trip_pk), find(other_trip_pk)
+        if root != other_root:
+            parent[max(root, other_root)] = min(root, other_root)
+
+    groups: Dict[int, List[int]] = {}
+    for pk in trip_pks:
+        groups.setdefault(find(pk), []).append(pk)
+    return list(groups.values())
+
+
 class WinterSchoolLotteryRunner(LotteryRunner):
     def __init__(self, execution_datetime=None):
         self.execution_datetime = execution_datetime or local_now()
@@ -160,18 +202,26 @@ class WinterSchoolLotteryRunner(LotteryRunner):
     def signup_to_bump(self, trip):
         return self.ranker.lowest_non_driver(trip)
 
+    def ranked_participants(self):
+        """Yield participants in the order they should be placed, with their key."""
+        return iter(self.ranker)
+
+    def participant_handler(self, participant):
+        return WinterSchoolParticipantHandler(participant, self)
+
     def assign_trips(self):
         num_participants = self.ranker.participants_to_handle().count()
         self.logger.info(
             "%s participants signed up for trips this week", num_participants
         )
-        for global_rank, (participant, key) in enumerate(self.ranker, start=1):
+        ranked = self.ranked_participants()
+        for global_rank, (participant, key) in enumerate(ranked, start=1):
             # get_affiliation_display() includes extra explanatory text we don't need
             affiliation = AFFILIATION_MAPPING[participant.affiliation]
             handling_header = [f"\nHandling {participant}", f"({affiliation}, {key})"]
             self.logger.debug('\n'.join(handling_header))
             self.logger.debug('-' * max(len(line) for line in handling_header))
-            par_handler = WinterSchoolParticipantHandler(participant, self)
+            par_handler = self.participant_handler(participant)
 
             json_result = par_handler.place_participant()
             if json_result is not None:
@@ -179,3 +229,41 @@ class WinterSchoolLotteryRunner(LotteryRunner):
                     {'global_rank': global_rank, 'has_flaked': key.flake_factor > 0}
                 )
                 self.logger.debug("RESULT: %s", json.dumps(json_result))
+
+
+class InMemoryWinterSchoolLotteryRunner(WinterSchoolLotteryRunner):
+    """Run the Winter School lottery against an in-memory snapshot.
+
+    Results are identical to `WinterSchoolLotteryRunner`, but rather than
+    issuing queries (and saves) for every participant, all relevant state is
+    loaded at once and written back with a few bulk updates at the end.
+    """
+
+    def __init__(self, execution_datetime=None):
+        super().__init__(execution_datetime)
+        self.snapshot = None
+        self.priority_keys = {}  # Key: participant pk, gives their ranking key
+
+    def ranked_participants(self):
+        ranked = list(self.ranker)
+        self.priority_keys = {par.pk: key for par, key in ranked}
+        return iter(ranked)
+
+    def participant_handler(self, participant):
+        return InMemoryParticipantHandler(
+            self.snapshot.participants[participant.pk], self
+        )
+
+    def signup_to_bump(self, trip):
+        return lowest_non_driver(trip, self.priority_keys)
+
+    def load_snapshot(self):
+        return LotterySnapshot.load(self.execution_datetime.date())
+
+    def save_results(self):
+        self.snapshot.save()
+
+    def assign_trips(self):
+        self.snapshot = self.load_snapshot()
+        super().assign_trips()
+        self.save_results()
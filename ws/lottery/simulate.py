@@ -0,0 +1,188 @@
+"""Simulate the Winter School lottery without committing any results.
+
+Before each Wednesday's lottery, it's standard practice to do a test run.
+A simulation runs the very same `assign_trips()` algorithm (with either the
+ORM-backed or the in-memory engine) inside a transaction that is always
+rolled back, and reports what happened along with how long it took.
+"""
+import io
+import logging
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional, Type
+
+from django.db import connection, transaction
+from django.db.models import F
+
+from ws import enums, models
+from ws.lottery.run import InMemoryWinterSchoolLotteryRunner, WinterSchoolLotteryRunner
+from ws.utils.dates import local_now
+
+
+class PhaseStats(NamedTuple):
+    seconds: float
+    num_queries: int
+
+
+class SimulationReport(NamedTuple):
+    num_participants: int
+    # Trip pk -> participant pks (sorted by pk, but waitlists are in order)
+    placements: Dict[int, List[int]]
+    waitlists: Dict[int, List[int]]
+    wall_time: float
+    num_queries: int
+    phases: Dict[str, PhaseStats]
+    log: str
+
+    @property
+    def num_placed(self) -> int:
+        return sum(len(par_pks) for par_pks in self.placements.values())
+
+    @property
+    def num_waitlisted(self) -> int:
+        return sum(len(par_pks) for par_pks in self.waitlists.values())
+
+
+class QueryCounter:
+    """Count queries executed (without storing them, unlike `connection.queries`)."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def __len__(self):
+        return self.count
+
+
+class SimulationMixin(WinterSchoolLotteryRunner):
+    """Time each phase of the lottery, logging to memory instead of a file.
+
+    Mix in ahead of another Winter School runner to simulate it instead.
+    """
+
+    log_stream: io.StringIO
+
+    def __init__(self, queries: QueryCounter, execution_datetime=None):
+        self.queries = queries
+        self.phases: Dict[str, PhaseStats] = {}
+        super().__init__(execution_datetime)
+
+    def configure_logger(self):
+        self.log_stream = io.StringIO()
+        self.handler = logging.StreamHandler(stream=self.log_stream)
+        self.handler.setLevel(logging.DEBUG)
+        self.logger.addHandler(self.handler)
+
+    @contextmanager
+    def phase(self, name: str):
+        start, start_queries = time.perf_counter(), len(self.queries)
+        yield
+        self.phases[name] = PhaseStats(
+            time.perf_counter() - start, len(self.queries) - start_queries
+        )
+
+    def ranked_participants(self):
+        with self.phase('rank'):
+            ranked = list(super().ranked_participants())
+        return iter(ranked)
+
+    def load_snapshot(self):
+        with self.phase('load'):
+            return super().load_snapshot()
+
+    def save_results(self):
+        with self.phase('save'):
+            super().save_results()
+
+    def assign_trips(self):
+        with self.phase('total'):
+            super().assign_trips()
+
+        # Whatever wasn't spent ranking, loading, or saving went to placement
+        others = [stats for name, stats in self.phases.items() if name != 'total']
+        total = self.phases.pop('total')
+        self.phases['place'] = PhaseStats(
+            total.seconds - sum(stats.seconds for stats in others),
+            total.num_queries - sum(stats.num_queries for stats in others),
+        )
+
+
+class SimulatedLotteryRunner(SimulationMixin):
+    pass
+
+
+class SimulatedInMemoryLotteryRunner(
+    SimulationMixin, InMemoryWinterSchoolLotteryRunner
+):
+    pass
+
+
+def _results(runner) -> Dict[str, Dict[int, List[int]]]:
+    trips = models.Trip.objects.filter(
+        program=enums.Program.WINTER_SCHOOL.value,
+        algorithm='lottery',
+        trip_date__gt=runner.execution_datetime.date(),
+    )
+    placements: Dict[int, List[int]] = {trip.pk: [] for trip in trips}
+    waitlists: Dict[int, List[int]] = {trip.pk: [] for trip in trips}
+
+    on_trip = models.SignUp.objects.filter(trip__in=trips, on_trip=True)
+    for trip_pk, par_pk in on_trip.order_by('participant_id').values_list(
+        'trip_id', 'participant_id'
+    ):
+        placements[trip_pk].append(par_pk)
+
+    # Same ordering as `WaitList.signups` (ties broken by order of creation)
+    waitlisted = models.WaitListSignup.objects.filter(waitlist__trip__in=trips)
+    for trip_pk, par_pk in waitlisted.order_by(
+        F('manual_order').desc(nulls_last=True), 'time_created', 'pk'
+    ).values_list('waitlist__trip_id', 'signup__participant_id'):
+        waitlists[trip_pk].append(par_pk)
+
+    return {'placements': placements, 'waitlists': waitlists}
+
+
+def simulate_ws_lottery(
+    execution_datetime: Optional[datetime] = None,
+    in_memory: bool = False,
+    setup: Optional[Callable[[], object]] = None,
+) -> SimulationReport:
+    """Run the Winter School lottery, then roll back all changes.
+
+    If given, `setup` is invoked within the same transaction (e.g. to
+    generate synthetic participants and trips that will also be discarded).
+    """
+    runner_class: Type[SimulationMixin] = (
+        SimulatedInMemoryLotteryRunner if in_memory else SimulatedLotteryRunner
+    )
+    execution_datetime = execution_datetime or local_now()
+
+    with transaction.atomic():
+        if setup is not None:
+            setup()
+
+        queries = QueryCounter()
+        with connection.execute_wrapper(queries):
+            runner = runner_class(queries, execution_datetime)
+            num_participants = runner.ranker.participants_to_handle().count()
+            start = time.perf_counter()
+            runner.assign_trips()
+            wall_time = time.perf_counter() - start
+            num_queries = len(queries) - 1  # (Exclude counting participants)
+
+        results = _results(runner)
+        runner.handler.close()
+        transaction.set_rollback(True)
+
+    return SimulationReport(
+        num_participants=num_participants,
+        wall_time=wall_time,
+        num_queries=num_queries,
+        phases=runner.phases,
+        log=runner.log_stream.getvalue(),
+        **results,
+    )
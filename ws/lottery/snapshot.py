@@ -0,0 +1,603 @@
+"""An in-memory model of a single Winter School lottery run.
+
+The database-backed lottery handlers (see `ws.lottery.handle`) issue several
+queries for every participant they place: ranked signups, open slots on each
+trip, drivers on each trip, and a `save()` for every signup touched. For a week
+with hundreds of participants, that's tens of thousands of round trips.
+
+This module loads everything the Winter School lottery needs up front, places
+everybody in memory, and then writes the final on-trip/waitlist state back
+with a handful of bulk operations. The placement logic deliberately mirrors
+`WinterSchoolParticipantHandler` line-for-line so that results are identical.
+"""
+from datetime import date, datetime
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from ws import enums, models
+from ws.utils.signups import update_signup_counts
+
+DRIVER_CAR_STATUSES = {'own', 'rent'}
+
+
+class ParticipantState:  # pylint: disable=too-many-instance-attributes
+    __slots__ = (
+        'pk',
+        'name',
+        'email',
+        'affiliation',
+        'has_lotteryinfo',
+        'car_status',
+        'paired_with_id',
+        'reciprocally_paired',
+        'signups',
+        'trip_ids',
+    )
+
+    def __init__(
+        self,
+        pk: int,
+        name: str,
+        email: str,
+        affiliation: str,
+        car_status: Optional[str],
+        paired_with_id: Optional[int],
+    ):
+        self.pk = pk
+        self.name = name
+        self.email = email
+        self.affiliation = affiliation
+        self.has_lotteryinfo = car_status is not None
+        self.car_status = car_status
+        self.paired_with_id = paired_with_id
+        self.reciprocally_paired = False  # Set once all participants are loaded
+
+        # All signups for lottery trips, ordered by the participant's ranking
+        self.signups: List['SignupState'] = []
+        self.trip_ids: Set[int] = set()
+
+    @property
+    def is_driver(self) -> bool:
+        return self.car_status in DRIVER_CAR_STATUSES
+
+    def __str__(self):
+        return self.name
+
+
+class TripState:  # pylint: disable=too-many-instance-attributes
+    __slots__ = (
+        'pk',
+        'name',
+        'maximum_participants',
+        'waitlist_id',
+        'num_on_trip',
+        'num_leader_drivers',
+        'signups',
+        'waitlist',
+    )
+
+    def __init__(self, pk: int, name: str, maximum_participants: int, waitlist_id):
+        self.pk = pk
+        self.name = name
+        self.maximum_participants = maximum_participants
+        self.waitlist_id = waitlist_id
+        self.num_on_trip = 0
+        self.num_leader_drivers = 0
+        self.signups: List['SignupState'] = []
+        self.waitlist: Dict[int, 'WaitListEntry'] = {}  # Keyed by signup pk
+
+    @property
+    def open_slots(self) -> int:
+        return self.maximum_participants - self.num_on_trip
+
+    @property
+    def num_drivers_on_trip(self) -> int:
+        participant_drivers = sum(
+            1 for signup in self.signups if signup.on_trip and signup.par.is_driver
+        )
+        return participant_drivers + self.num_leader_drivers
+
+    def on_trip_signups(self) -> List['SignupState']:
+        """Signups on the trip, in the same order as `SignUp.Meta.ordering`."""
+        on_trip = (signup for signup in self.signups if signup.on_trip)
+        return sorted(
+            on_trip,
+            key=lambda s: (s.manual_order is None, s.manual_order, s.last_updated),
+        )
+
+    @property
+    def last_of_priority(self) -> int:
+        """Mirror `WaitList.last_of_priority`."""
+        manual_orders = [
+            entry.manual_order
+            for entry in self.waitlist.values()
+            if entry.manual_order is not None
+        ]
+        return min(manual_orders) - 1 if manual_orders else 10
+
+    def __str__(self):
+        return self.name
+
+
+class SignupState:  # pylint: disable=too-many-instance-attributes
+    __slots__ = (
+        'pk',
+        'par',
+        'trip',
+        'order',
+        'manual_order',
+        'time_created',
+        'last_updated',
+        'on_trip',
+        'dirty',
+    )
+
+    def __init__(
+        self,
+        pk: int,
+        par: ParticipantState,
+        trip: TripState,
+        order: Optional[int],
+        manual_order: Optional[int],
+        time_created: datetime,
+        last_updated: datetime,
+        on_trip: bool,
+    ):
+        self.pk = pk
+        self.par = par
+        self.trip = trip
+        self.order = order
+        self.manual_order = manual_order
+        self.time_created = time_created
+        self.last_updated = last_updated
+        self.on_trip = on_trip
+        self.dirty = False
+
+    @property
+    def rank_key(self) -> Tuple:
+        """Mirror `order_by('order', 'time_created', 'pk')` (nulls last in Postgres)."""
+        return (self.order is None, self.order, self.time_created, self.pk)
+
+    def __str__(self):
+        return f"{self.par.name} on {self.trip}"
+
+
+class WaitListEntry:
+    __slots__ = ('pk', 'signup', 'manual_order', 'dirty')
+
+    def __init__(self, pk: Optional[int], signup: SignupState, manual_order=None):
+        self.pk = pk  # (None if not yet written to the database)
+        self.signup = signup
+        self.manual_order = manual_order
+        self.dirty = False
+
+
+class LotterySnapshot:
+    """All state relevant to a Winter School lottery, held in memory."""
+
+    def __init__(self, lottery_date: date):
+        self.lottery_date = lottery_date
+        self.trips: Dict[int, TripState] = {}
+        self.participants: Dict[int, ParticipantState] = {}
+        self.signups: Dict[int, SignupState] = {}
+
+    @classmethod
+    def load(cls, lottery_date: date) -> 'LotterySnapshot':
+        snapshot = cls(lottery_date)
+        snapshot._load_trips()
+        snapshot._load_participants()
+        snapshot._load_signups()
+        snapshot._load_leaders()
+        snapshot._load_waitlists()
+        return snapshot
+
+    def _load_trips(self):
+        trips = models.Trip.objects.filter(
+            algorithm='lottery',
+            program=enums.Program.WINTER_SCHOOL.value,
+            trip_date__gt=self.lottery_date,
+        ).values_list('pk', 'name', 'maximum_participants', 'waitlist__pk')
+        for pk, name, maximum_participants, waitlist_id in trips:
+            self.trips[pk] = TripState(pk, name, maximum_participants, waitlist_id)
+
+    @staticmethod
+    def _participant_rows(participants):
+        return participants.values_list(
+            'pk',
+            'name',
+            'email',
+            'affiliation',
+            'lotteryinfo__car_status',
+            'lotteryinfo__paired_with_id',
+        )
+
+    def _load_participants(self):
+        """Load everybody signed up for a lottery trip (plus anybody they pair with)."""
+        signed_up = models.Participant.objects.filter(
+            signup__trip_id__in=list(self.trips)
+        ).distinct()
+        for row in self._participant_rows(signed_up):
+            self.participants[row[0]] = ParticipantState(*row)
+
+        partner_ids = {
+            par.paired_with_id
+            for par in self.participants.values()
+            if par.paired_with_id and par.paired_with_id not in self.participants
+        }
+        if partner_ids:
+            partners = models.Participant.objects.filter(pk__in=partner_ids)
+            for row in self._participant_rows(partners):
+                self.participants[row[0]] = ParticipantState(*row)
+
+        for par in self.participants.values():
+            partner = self.partner_of(par)
+            par.reciprocally_paired = bool(partner and partner.paired_with_id == par.pk)
+
+    def _load_signups(self):
+        signups = models.SignUp.objects.filter(
+            trip_id__in=list(self.trips)
+        ).values_list(
+            'pk',
+            'participant_id',
+            'trip_id',
+            'order',
+            'manual_order',
+            'time_created',
+            'last_updated',
+            'on_trip',
+        )
+        for pk, par_id, trip_id, *fields in signups:
+            par, trip = self.participants[par_id], self.trips[trip_id]
+            signup = SignupState(pk, par, trip, *fields)
+            self.signups[pk] = signup
+            par.signups.append(signup)
+            par.trip_ids.add(trip_id)
+            trip.signups.append(signup)
+            if signup.on_trip:
+                trip.num_on_trip += 1
+
+        for par in self.participants.values():
+            par.signups.sort(key=lambda signup: signup.rank_key)
+
+    def _load_leaders(self):
+        leader_car_statuses = models.Trip.leaders.through.objects.filter(
+            trip_id__in=list(self.trips), participant__lotteryinfo__isnull=False
+        ).values_list('trip_id', 'participant__lotteryinfo__car_status')
+        for trip_id, car_status in leader_car_statuses:
+            if car_status in DRIVER_CAR_STATUSES:
+                self.trips[trip_id].num_leader_drivers += 1
+
+    def _load_waitlists(self):
+        wl_signups = models.WaitListSignup.objects.filter(
+            signup__trip_id__in=list(self.trips)
+        ).values_list('pk', 'signup_id', 'manual_order')
+        for pk, signup_id, manual_order in wl_signups:
+            signup = self.signups[signup_id]
+            signup.trip.waitlist[signup_id] = WaitListEntry(pk, signup, manual_order)
+
+    def partner_of(self, par: ParticipantState) -> Optional[ParticipantState]:
+        """Return whom the participant paired with (if they're in the lottery)."""
+        if par.paired_with_id is None:
+            return None
+        return self.participants.get(par.paired_with_id)
+
+    @staticmethod
+    def ranked_signups(par: ParticipantState) -> List[SignupState]:
+        """Mirror `ws.lottery.handle.ranked_signups` (lottery trips are pre-filtered)."""
+        return [signup for signup in par.signups if not signup.on_trip]
+
+    @staticmethod
+    def signup_for(par: ParticipantState, trip: TripState) -> SignupState:
+        return next(signup for signup in par.signups if signup.trip is trip)
+
+    @staticmethod
+    def save_signup(signup: SignupState, on_trip: bool) -> None:
+        """Mirror `ws.utils.signups.save_on_trip`."""
+        if signup.on_trip != on_trip:
+            signup.trip.num_on_trip += 1 if on_trip else -1
+        signup.on_trip = on_trip
+        signup.last_updated = timezone.now()
+        signup.dirty = True
+
+    def add_to_waitlist(self, signup: SignupState, prioritize=False) -> WaitListEntry:
+        """Mirror `ws.utils.signups.add_to_waitlist`."""
+        self.save_signup(signup, on_trip=False)
+
+        waitlist = signup.trip.waitlist
+        entry = waitlist.get(signup.pk)
+        if entry is None:
+            entry = waitlist[signup.pk] = WaitListEntry(None, signup)
+            entry.dirty = True
+
+        if prioritize:
+            entry.manual_order = signup.trip.last_of_priority
+            entry.dirty = True
+        return entry
+
+    def _dirty_waitlist_entries(self) -> Iterator[WaitListEntry]:
+        for trip in self.trips.values():
+            yield from (entry for entry in trip.waitlist.values() if entry.dirty)
+
+    @transaction.atomic
+    def save(self) -> None:
+        """Write the final on-trip & waitlist state back to the database."""
+        changed_signups = [
+            models.SignUp(
+                pk=signup.pk, on_trip=signup.on_trip, last_updated=signup.last_updated
+            )
+            for signup in self.signups.values()
+            if signup.dirty
+        ]
+        models.SignUp.objects.bulk_update(
+            changed_signups, ['on_trip', 'last_updated'], batch_size=500
+        )
+
+        new_entries: List[WaitListEntry] = []
+        changed_entries: List[models.WaitListSignup] = []
+        for entry in self._dirty_waitlist_entries():
+            if entry.pk is None:
+                new_entries.append(entry)
+            else:
+                changed_entries.append(
+                    models.WaitListSignup(pk=entry.pk, manual_order=entry.manual_order)
+                )
+        created = models.WaitListSignup.objects.bulk_create(
+            [
+                models.WaitListSignup(
+                    signup_id=entry.signup.pk,
+                    waitlist_id=entry.signup.trip.waitlist_id,
+                    manual_order=entry.manual_order,
+                )
+                for entry in new_entries
+            ]
+        )
+        for entry, wl_signup in zip(new_entries, created):
+            entry.pk = wl_signup.pk
+        models.WaitListSignup.objects.bulk_update(
+            changed_entries, ['manual_order'], batch_size=500
+        )
+        update_signup_counts(models.Trip.objects.filter(pk__in=list(self.trips)))
+
+        for signup in self.signups.values():
+            signup.dirty = False
+        for entry in new_entries:
+            entry.dirty = False
+        for entry in self._dirty_waitlist_entries():
+            entry.dirty = False
+
+
+class InMemoryParticipantHandler:
+    """Place a single participant (or pair) using only the in-memory snapshot.
+
+    This mirrors `WinterSchoolParticipantHandler` exactly - any change to the
+    placement rules there must be reflected here, too.
+    """
+
+    def __init__(self, participant: ParticipantState, runner, min_drivers=2):
+        self.participant = participant
+        self.runner = runner
+        self.snapshot: LotterySnapshot = runner.snapshot
+        self.min_drivers = min_drivers
+        self.slots_needed = len(self.to_be_placed)
+
+    @property
+    def logger(self):
+        return self.runner.logger
+
+    @property
+    def paired(self) -> bool:
+        return self.participant.reciprocally_paired
+
+    @property
+    def paired_par(self) -> Optional[ParticipantState]:
+        return self.snapshot.partner_of(self.participant)
+
+    @property
+    def _partner(self) -> ParticipantState:
+        """The reciprocally-paired partner (only when `paired`)."""
+        partner = self.paired_par
+        assert partner is not None  # (Both members of a pair are loaded)
+        return partner
+
+    @property
+    def to_be_placed(self) -> Tuple[ParticipantState, ...]:
+        if self.paired:
+            return (self.participant, self._partner)
+        return (self.participant,)
+
+    @property
+    def is_driver(self) -> bool:
+        return any(par.is_driver for par in self.to_be_placed)
+
+    @property
+    def _par_text(self) -> str:
+        return " + ".join(map(str, self.to_be_placed))
+
+    def _place_on_trip(self, signup: SignupState) -> None:
+        trip = signup.trip
+        slots = 'slot' if trip.open_slots == 1 else 'slots'
+        self.logger.info(f"{trip} has {trip.open_slots} {slots}, adding {signup.par}")
+        self.snapshot.save_signup(signup, on_trip=True)
+
+    def place_all_on_trip(self, signup: SignupState) -> None:
+        self._place_on_trip(signup)
+        if self.paired:
+            self._place_on_trip(self.snapshot.signup_for(self._partner, signup.trip))
+
+    def _num_drivers_needed(self, trip: TripState) -> int:
+        return max(self.min_drivers - trip.num_drivers_on_trip, 0)
+
+    def _waitlist_at_top(self, signup: SignupState) -> None:
+        self.snapshot.add_to_waitlist(signup, prioritize=True)
+        self.logger.info("Moved %s to the top of the waitlist", signup)
+
+    def bump_participant(self, signup: SignupState) -> None:
+        assert signup.on_trip
+        par = signup.par
+
+        self.logger.info("Bumping %s off %s", par.name, signup.trip.name)
+
+        partner = self.snapshot.partner_of(par)
+        if par.has_lotteryinfo and partner and partner.paired_with_id == par.pk:
+            self._waitlist_at_top(signup)
+            return
+
+        self.logger.debug("Searching all signups for a potentially open trip.")
+        for other_signup in self.snapshot.ranked_signups(par):
+            if other_signup is signup:
+                continue
+            if not other_signup.trip.open_slots:
+                self.logger.debug("%r is full", other_signup.trip.name)
+                continue
+            self._place_on_trip(other_signup)
+            self.logger.debug("Placed on %r", other_signup.trip.name)
+            self.snapshot.save_signup(signup, on_trip=False)
+            return
+
+        self._waitlist_at_top(signup)
+
+    def _try_to_place(self, signup: SignupState) -> bool:
+        trip = signup.trip
+        if trip.open_slots >= self.slots_needed:
+            self.place_all_on_trip(signup)
+            return True
+        if self.is_driver and not trip.open_slots and not self.paired:
+            if self._num_drivers_needed(trip):
+                self.logger.info(
+                    "%r is full, but lacks %d drivers", trip.name, self.min_drivers
+                )
+                signup_to_bump = self.runner.signup_to_bump(trip)
+                if not signup_to_bump:
+                    self.logger.info("Trip does not have a non-driver to bump")
+                    return False
+                self.bump_participant(signup_to_bump)
+                self.logger.info("Adding driver %s to %r", signup.par.name, trip.name)
+                self.snapshot.save_signup(signup, on_trip=True)
+                return True
+        return False
+
+    def _placement_would_jeopardize_driver_bump(self, signup: SignupState) -> bool:
+        open_slots = signup.trip.open_slots
+
+        if open_slots < self.slots_needed:
+            return False
+
+        future_num_slots = open_slots - self.slots_needed
+        if future_num_slots > self.min_drivers:
+            return False
+
+        if self.is_driver:
+            return False
+
+        num_drivers_needed = self._num_drivers_needed(signup.trip)
+        if not num_drivers_needed:
+            return False
+
+        if num_drivers_needed <= future_num_slots:
+            return False
+
+        to_be_placed = {par.pk for par in self.to_be_placed}
+        return any(
+            not self.runner.handled(other.par)
+            for other in signup.trip.signups
+            if not other.on_trip
+            and other.par.is_driver
+            and other.par.pk not in to_be_placed
+        )
+
+    def place_participant(self) -> Optional[Dict]:
+        assert not self.runner.handled(self.participant)
+
+        self.runner.mark_seen(self.participant)
+
+        if self.paired:
+            self.logger.info(f"{self.participant} is paired with {self.paired_par}")
+            if not self.runner.seen(self.paired_par):
+                self.logger.info(f"Will handle signups when {self.paired_par} comes")
+                return None
+
+        future_signups = self.snapshot.ranked_signups(self.participant)
+        if self.paired:
+            partner_trip_ids = self._partner.trip_ids
+            desired_signups = [
+                signup
+                for signup in future_signups
+                if signup.trip.pk in partner_trip_ids
+            ]
+        else:
+            desired_signups = list(future_signups)
+
+        info = self._place_or_waitlist(future_signups, desired_signups)
+        self.runner.mark_handled(self.participant)
+        if self.paired_par:
+            self.runner.mark_handled(self.paired_par)
+
+        return info
+
+    def _place_or_waitlist(
+        self, future_signups: List[SignupState], desired_signups: List[SignupState]
+    ) -> Dict:
+        info = {
+            'participant_pk': self.participant.pk,
+            'paired_with_pk': self.paired_par and self.paired_par.pk,
+            'is_paired': bool(self.paired),
+            'affiliation': self.participant.affiliation,
+            'ranked_trips': [signup.trip.pk for signup in future_signups],
+            'placed_on_choice': None,
+            'waitlisted': False,
+        }
+
+        if not future_signups:
+            self.logger.info("%s did not choose any trips this week", self._par_text)
+            return info
+        if not desired_signups:
+            self.logger.info("%s has no remaining desired trips", self._par_text)
+            return info
+
+        desired_pks = {signup.pk for signup in desired_signups}
+        skipped_to_avoid_driver_bump: List[Tuple[int, SignupState]] = []
+        for rank, signup in enumerate(future_signups, start=1):
+            if signup.pk not in desired_pks:
+                self.logger.debug("Ignoring undesired signup %s", signup)
+                continue
+            trip_name = signup.trip.name
+            if self._placement_would_jeopardize_driver_bump(signup):
+                self.logger.debug("Placing on %r risks bump from a driver", trip_name)
+                skipped_to_avoid_driver_bump.append((rank, signup))
+                continue
+            if self._try_to_place(signup):
+                self.logger.debug(f"Placed on trip #{rank} of {len(future_signups)}")
+                return {**info, 'placed_on_choice': rank}
+            self.logger.info("Can't place %s on %r", self._par_text, trip_name)
+
+        for rank, signup in skipped_to_avoid_driver_bump:
+            if self._try_to_place(signup):
+                self.logger.debug(f"Placed on trip #{rank} of {len(future_signups)}")
+                return {**info, 'placed_on_choice': rank}
+
+        self.logger.info(f"None of {self._par_text}'s desired trips are open.")
+        favorite_trip = desired_signups[0].trip
+        for participant in self.to_be_placed:
+            self.snapshot.add_to_waitlist(
+                self.snapshot.signup_for(participant, favorite_trip)
+            )
+            with_email = f"{self._par_text} ({participant.email})"
+            self.logger.info(f"Waitlisted {with_email} on {favorite_trip.name}")
+
+        return {**info, 'waitlisted': True}
+
+
+def lowest_non_driver(
+    trip: TripState, priority_keys: Dict[int, Tuple]
+) -> Optional[SignupState]:
+    """Mirror `WinterSchoolParticipantRanker.lowest_non_driver`."""
+    non_drivers = [
+        signup
+        for signup in trip.on_trip_signups()
+        if not signup.par.has_lotteryinfo or signup.par.car_status == 'none'
+    ]
+    if not non_drivers:
+        return None
+    return max(non_drivers, key=lambda signup: priority_keys[signup.par.pk])
@@ -0,0 +1,177 @@
+"""Generate a synthetic week of Winter School signups.
+
+This is meant for simulating (and benchmarking) the lottery locally. Objects
+are saved with `bulk_create` wherever possible (creating thousands of
+participants one at a time is slow).
+The same seed will always produce the same week: the same trips, the same
+rankings, the same pairings, and so on. Primary keys (and therefore, each
+participant's random draw in the lottery) depend on the database, though.
+"""
+import random
+import uuid
+from datetime import date, timedelta
+from typing import List, Optional, Sequence
+
+from django.contrib.auth.hashers import make_password
+from mitoc_const import affiliations
+
+from ws import enums, models
+from ws.utils.signups import update_signup_counts
+
+AFFILIATION_CODES = [aff.CODE for aff in affiliations.ALL]
+PARTICIPANTS_PER_TRIP = 8
+
+
+def bulk_participants(
+    num: int, rand: random.Random, names: Optional[Sequence[str]] = None
+) -> List[models.Participant]:
+    """Create `num` participants (named `names`, if given)."""
+    if names is None:
+        names = [f"Synthetic Participant {i}" for i in range(1, num + 1)]
+
+    contacts = models.EmergencyContact.objects.bulk_create(
+        models.EmergencyContact(
+            name="My Mother",
+            cell_phone="+17815550342",
+            relationship="Mother",
+            email="mum@example.com",
+        )
+        for _ in range(num)
+    )
+    infos = models.EmergencyInfo.objects.bulk_create(
+        models.EmergencyInfo(
+            emergency_contact=contact,
+            allergies="None",
+            medications="None",
+            medical_history="None",
+        )
+        for contact in contacts
+    )
+
+    # Participants in a simulation never log in!
+    password = make_password(None)
+    usernames = [f"synthetic-{uuid.uuid4().hex}" for _ in range(num)]
+    users = models.User.objects.bulk_create(
+        models.User(
+            username=username, email=f"{username}@example.com", password=password
+        )
+        for username in usernames
+    )
+    return models.Participant.objects.bulk_create(
+        models.Participant(
+            name=name,
+            email=user.email,
+            user_id=user.pk,
+            emergency_info=info,
+            affiliation=rand.choice(AFFILIATION_CODES),
+        )
+        for name, user, info in zip(names, users, infos)
+    )
+
+
+def _ws_trip(creator, trip_date, **kwargs) -> models.Trip:
+    return models.Trip.objects.create(
+        creator=creator,
+        trip_date=trip_date,
+        description="A synthetic trip into the Whites",
+        difficulty_rating="Intermediate",
+        level="B",
+        activity=models.BaseRating.WINTER_SCHOOL,
+        trip_type=enums.TripType.HIKING.value,
+        program=enums.Program.WINTER_SCHOOL.value,
+        **kwargs,
+    )
+
+
+def make_ws_week(
+    num_participants: int, lottery_date: date, seed: str = 'synthetic'
+) -> List[models.Trip]:
+    """Create a week of Winter School lottery trips, returning those trips.
+
+    Trips take place on the weekend after `lottery_date`. Some participants
+    drive, some pair up, some have flaked on a trip from the previous weekend,
+    and most rank a handful of trips.
+    """
+    rand = random.Random(f"{seed}-{num_participants}")
+
+    num_trips = max(num_participants // PARTICIPANTS_PER_TRIP, 2)
+    leaders = bulk_participants(
+        num_trips,
+        rand,
+        names=[f"Synthetic Leader {i}" for i in range(1, num_trips + 1)],
+    )
+    participants = bulk_participants(num_participants, rand)
+
+    saturday = lottery_date + timedelta(days=(5 - lottery_date.weekday()) % 7 or 7)
+    trips = [
+        _ws_trip(
+            leader,
+            rand.choice([saturday, saturday + timedelta(days=1)]),
+            name=f"Synthetic Trip {i}",
+            algorithm='lottery',
+            maximum_participants=rand.randint(4, 12),
+        )
+        for i, leader in enumerate(leaders, start=1)
+    ]
+    models.Trip.leaders.through.objects.bulk_create(
+        [
+            models.Trip.leaders.through(trip_id=trip.pk, participant_id=leader.pk)
+            for trip, leader in zip(trips, leaders)
+        ]
+    )
+
+    # Last weekend's trip: some participants attended, others flaked.
+    last_weekend = _ws_trip(leaders[0], saturday - timedelta(days=7), algorithm='fcfs')
+    past_participants = rand.sample(participants, len(participants) // 5)
+    models.SignUp.objects.bulk_create(
+        [
+            models.SignUp(participant=par, trip=last_weekend, on_trip=True)
+            for par in past_participants
+        ]
+    )
+    models.Feedback.objects.bulk_create(
+        [
+            models.Feedback(
+                participant=par,
+                leader=leaders[0],
+                trip=last_weekend,
+                showed_up=False,
+                comments="Did not show up.",
+            )
+            for par in rand.sample(past_participants, len(past_participants) // 4)
+        ]
+    )
+
+    # Drivers (and pairs) need lottery information
+    lottery_infos = {
+        par.pk: models.LotteryInfo(
+            participant=par, car_status=rand.choice(['none', 'none', 'own', 'rent'])
+        )
+        for par in rand.sample(participants, (len(participants) * 3) // 5)
+    }
+    for leader in leaders:
+        lottery_infos[leader.pk] = models.LotteryInfo(
+            participant=leader, car_status=rand.choice(['none', 'own'])
+        )
+    paired = rand.sample(participants, (len(participants) // 20) * 2)
+    for one, two in zip(paired[::2], paired[1::2]):
+        for par, other in [(one, two), (two, one)]:
+            if par.pk not in lottery_infos:
+                lottery_infos[par.pk] = models.LotteryInfo(
+                    participant=par, car_status='none'
+                )
+            lottery_infos[par.pk].paired_with = other
+    models.LotteryInfo.objects.bulk_create(lottery_infos.values())
+
+    signups = []
+    for par in participants:
+        num_ranked = min(rand.choice([0, 1, 2, 3, 3, 4, 5]), len(trips))
+        for order, trip in enumerate(rand.sample(trips, num_ranked), start=1):
+            signups.append(models.SignUp(participant=par, trip=trip, order=order))
+    models.SignUp.objects.bulk_create(signups, batch_size=1000)
+
+    # Signups were created in bulk, so signals didn't count them
+    update_signup_counts(
+        models.Trip.objects.filter(pk__in=[trip.pk for trip in [*trips, last_weekend]])
+    )
+    return trips
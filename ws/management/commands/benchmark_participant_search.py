@@ -0,0 +1,99 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from ws import models
+from ws.lottery.synthetic import bulk_participants
+from ws.utils.search import PostgresParticipantSearch
+
+# fmt: off
+SYLLABLES = [
+    'al', 'bé', 'car', 'da', 'el', 'fer', 'gö', 'han', 'is', 'jo', 'ka', 'lu',
+    'mi', 'nó', 'or', 'pa', 'quin', 'ro', 'sø', 'ta', 'ul', 'vi', 'wen', 'za',
+]
+# fmt: on
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare indexed participant search to the old substring search on "
+        "synthetic participants, then roll everything back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[50_000, 200_000],
+            help="Benchmark after generating each of these many participants.",
+        )
+        parser.add_argument(
+            '--searches', type=int, default=50, help="Searches to time at each size."
+        )
+        parser.add_argument('--seed', default='search', help="Random seed.")
+
+    @staticmethod
+    def _name(rand):
+        def word():
+            num_syllables = rand.choice([2, 2, 3])
+            return ''.join(rand.choice(SYLLABLES) for _ in range(num_syllables))
+
+        return f"{word().capitalize()} {word().capitalize()}"
+
+    @staticmethod
+    def _search_text(name, rand):
+        """Return what a leader might type when searching for `name`."""
+        first, last = name.split()
+        return rand.choice([first[:3], last[:4], f"{first} {last[:2]}", name])
+
+    @staticmethod
+    def _time_ms(func, searches):
+        times = []
+        for text in searches:
+            start = time.perf_counter()
+            func(text)
+            times.append((time.perf_counter() - start) * 1000)
+        return statistics.median(times), max(times)
+
+    def handle(self, *args, **options):
+        rand = random.Random(options['seed'])
+        indexed = PostgresParticipantSearch()
+        participants = models.Participant.objects.all()
+
+        def substring_search(text):
+            match = Q(name__icontains=text) | Q(email__icontains=text)
+            return list(participants.filter(match)[:20])
+
+        def indexed_search(text):
+            return list(indexed.search(participants, text)[:20])
+
+        with transaction.atomic():
+            names = []
+            for size in sorted(options['sizes']):
+                new_names = [self._name(rand) for _ in range(size - len(names))]
+                bulk_participants(len(new_names), rand, new_names)
+                names.extend(new_names)
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE ws_participant')
+
+                searches = [
+                    self._search_text(rand.choice(names), rand)
+                    for _ in range(options['searches'])
+                ]
+                self.stdout.write(f"{participants.count()} participants:")
+                for label, func in [
+                    ('substring', substring_search),
+                    ('indexed', indexed_search),
+                ]:
+                    median, slowest = self._time_ms(func, searches)
+                    self.stdout.write(
+                        f"  {label:<10} median {median:8.2f}ms, max {slowest:8.2f}ms"
+                    )
+
+            transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS("All changes were rolled back."))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from ws import privacy
+
+
+class Command(BaseCommand):
+    help = "Export all data held on participants, for data requests & audits."
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="File to write the export to.")
+        parser.add_argument(
+            '--format',
+            choices=sorted(privacy.EXPORT_FORMATS),
+            default='ndjson',
+            help="Newline-delimited JSON, or a zip of JSON files (one per participant).",
+        )
+        parser.add_argument(
+            '--participant',
+            type=int,
+            nargs='+',
+            dest='participant_ids',
+            metavar='PK',
+            help="Only export these participants (default: everybody).",
+        )
+
+    def handle(self, *args, **options):
+        with open(options['output'], 'wb') as export_file:
+            num_exported = privacy.export(
+                export_file, options['format'], options['participant_ids']
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f"Exported data for {num_exported} participant(s).")
+        )
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ws import merge
+
+
+def _pair(value):
+    old, _, new = value.partition(':')
+    return int(old), int(new)
+
+
+class Command(BaseCommand):
+    help = "Merge pairs of duplicate participants, all in one transaction."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'pairs',
+            nargs='+',
+            type=_pair,
+            metavar='OLD:NEW',
+            help="PKs of a participant to merge away, and the one to merge into.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            counts = merge.merge_participant_pairs(options['pairs'])
+        except (ValueError, merge.models.Participant.DoesNotExist) as err:
+            raise CommandError(str(err)) from err
+
+        for table, num_rows in sorted(counts.items()):
+            self.stdout.write(f"{table}: {num_rows}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Merged {len(options['pairs'])} participant(s).")
+        )
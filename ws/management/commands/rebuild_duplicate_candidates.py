@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from ws import duplicates
+
+
+class Command(BaseCommand):
+    help = "Rebuild the index of participants who may be duplicate accounts."
+
+    def handle(self, *args, **options):
+        num_candidates = duplicates.rebuild_all()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Found {num_candidates} pair(s) of potential duplicates."
+            )
+        )
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Q
+
+from ws import models
+from ws.utils.signups import actual_signup_counts, update_signup_counts
+
+
+class Command(BaseCommand):
+    help = "Verify the signup counts stored on each trip, repairing any that drifted."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Only report trips with incorrect counts, don't fix them.",
+        )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        actual = {
+            f'actual_{field}': expr for field, expr in actual_signup_counts().items()
+        }
+        incorrect = Q()
+        for field in models.Trip.SIGNUP_COUNT_FIELDS:
+            incorrect |= ~Q(**{field: F(f'actual_{field}')})
+
+        # Lock the rows, so counts can't change between verifying & repairing
+        stale = (
+            models.Trip.objects.select_for_update()
+            .annotate(**actual)
+            .filter(incorrect)
+            .order_by('pk')
+        )
+        stale_pks = []
+        for trip in stale:
+            stale_pks.append(trip.pk)
+            changes = ', '.join(
+                f"{field}: {getattr(trip, field)} -> {getattr(trip, f'actual_{field}')}"
+                for field in models.Trip.SIGNUP_COUNT_FIELDS
+                if getattr(trip, field) != getattr(trip, f'actual_{field}')
+            )
+            self.stdout.write(f"Trip #{trip.pk} ({trip.name}): {changes}")
+
+        if not stale_pks:
+            self.stdout.write(self.style.SUCCESS("All signup counts are correct."))
+        elif options['dry_run']:
+            self.stdout.write(f"{len(stale_pks)} trip(s) have incorrect signup counts.")
+        else:
+            update_signup_counts(models.Trip.objects.filter(pk__in=stale_pks))
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Repaired signup counts on {len(stale_pks)} trip(s)."
+                )
+            )
@@ -0,0 +1,69 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ws.lottery.simulate import simulate_ws_lottery
+from ws.lottery.synthetic import make_ws_week
+from ws.utils.dates import local_now
+
+
+class Command(BaseCommand):
+    help = "Run the Winter School lottery, report results, then roll everything back."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--in-memory',
+            action='store_true',
+            help="Use the in-memory engine instead of the ORM-backed one.",
+        )
+        parser.add_argument(
+            '--execution-date',
+            type=lambda d: datetime.strptime(d, '%Y-%m-%d'),
+            help="Simulate the lottery as if run on this date (YYYY-MM-DD).",
+        )
+        parser.add_argument(
+            '--participants',
+            type=int,
+            help="Generate a synthetic week of this many participants (e.g. 1000).",
+        )
+        parser.add_argument(
+            '--seed',
+            default='synthetic',
+            help="Seed for generating the synthetic week.",
+        )
+        parser.add_argument(
+            '--show-log', action='store_true', help="Print the full lottery log."
+        )
+
+    def handle(self, *args, **options):
+        if options['execution_date']:
+            execution_datetime = timezone.make_aware(options['execution_date'])
+        else:
+            execution_datetime = local_now()
+
+        def make_synthetic_week():
+            make_ws_week(
+                options['participants'], execution_datetime.date(), seed=options['seed']
+            )
+
+        report = simulate_ws_lottery(
+            execution_datetime,
+            in_memory=options['in_memory'],
+            setup=make_synthetic_week if options['participants'] else None,
+        )
+
+        if options['show_log']:
+            self.stdout.write(report.log)
+        self.stdout.write(
+            f"Participants: {report.num_participants}\n"
+            f"Placed: {report.num_placed} on {len(report.placements)} trips\n"
+            f"Waitlisted: {report.num_waitlisted}\n"
+            f"Wall time: {report.wall_time:.3f}s\n"
+            f"Queries: {report.num_queries}"
+        )
+        for name, stats in report.phases.items():
+            self.stdout.write(
+                f"  {name:<6} {stats.seconds:8.3f}s {stats.num_queries:7} queries"
+            )
+        self.stdout.write(self.style.SUCCESS("All changes were rolled back."))
@@ -9,11 +9,14 @@ occasionally merge these accounts into one. The end result is that they get an
 account where they can log in with either email address, and get access to a
 complete history.
 """
-from typing import Dict, Tuple
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
 
 from django.db import connections, transaction
+from django.db.models import F
 
-from ws import models
+import ws.messages
+from ws import duplicates, models
 
 # An enumeration of columns that we explicitly intend to migrate in `ws`, grouped by table
 # If any table has a column with a foreign key to ws_participant that is not in here, we will error
@@ -33,6 +36,10 @@ EXPECTED_PARTICIPANT_TABLES: Dict[str, Tuple[str, ...]] = {
     'ws_winterschoolsettings': ('last_updated_by_id',),
     'ws_discount_administrators': ('participant_id',),
     'ws_distinctaccounts': ('left_id', 'right_id'),
+    'ws_rental': ('participant_id',),  # (Replaced on the next refresh)
+    'ws_memberstats': ('participant_id',),  # (Recomputed nightly)
+    'ws_duplicatekey': ('participant_id',),
+    'ws_duplicatecandidate': ('left_id', 'right_id'),
     # Each of these tables should only have one row for the given person.
     # (For example, it's possible that two participants representing the same human are on the same trip.
     # In practice, though, this should never actually be happening. Uniqueness constraints will protect us.
@@ -205,6 +212,11 @@ def _migrate_participant(old_pk, new_pk):
     simple_updates.pop('ws_passwordquality')
     models.PasswordQuality.objects.filter(participant_id=old_pk).delete()
 
+    # The old participant is no longer a potential duplicate of anybody.
+    simple_updates.pop('ws_duplicatekey')
+    simple_updates.pop('ws_duplicatecandidate')
+    duplicates.remove_candidates(old_pk)
+
     for table, cols in simple_updates.items():
         for col in cols:
             simple_fk_update(cursor, table, col, old_pk, new_pk)
@@ -214,7 +226,247 @@ def _migrate_participant(old_pk, new_pk):
     )
 
 
+def _invalidate_trips_led(participant_ids: Iterable[int]) -> None:
+    """Bump the cached rows of trips led by participants (see `cache_signals`).
+
+    Leaders & ratings are moved with raw SQL, so no signals do this.
+    """
+    models.Trip.objects.filter(leaders__in=participant_ids).update(
+        cache_version=F('cache_version') + 1
+    )
+
+
 def merge_participants(old, new):
     with transaction.atomic():  # Rollback if FK migration fails
         _migrate_user(old.user_id, new.user_id)
         _migrate_participant(old.pk, new.pk)
+        _invalidate_trips_led([new.pk])
+        ws.messages.invalidate_state([new.pk])
+
+
+class MergeConflict(ValueError):
+    """Merging a batch of participants would violate a uniqueness constraint."""
+
+
+def _merges_cte(pairs: List[Tuple[int, int]]) -> Tuple[str, List[int]]:
+    """Express (old, new) pairs as a `merges` table, for set-based statements."""
+    values = ', '.join(['(%s, %s)'] * len(pairs))
+    params = [pk for pair in pairs for pk in pair]
+    return f"with merges(old_id, new_id) as (values {values})", params
+
+
+def _unique_indexes(cursor, table: str) -> List[Tuple[str, List[str]]]:
+    """Return the name & columns of each unique index on the table (but the PK)."""
+    cursor.execute(
+        """
+        select i.indexrelid::regclass::text,
+               array(select a.attname
+                       from unnest(i.indkey) k
+                            join pg_attribute a on a.attrelid = i.indrelid
+                                               and a.attnum = k)
+          from pg_index i
+         where i.indrelid = %s::regclass and
+               i.indisunique and
+               not i.indisprimary
+        """,
+        (table,),
+    )
+    return cursor.fetchall()
+
+
+def _find_conflicts(cursor, merges, table: str, cols: Tuple[str, ...]) -> List[str]:
+    """Describe each unique index that rewriting the table's columns would violate."""
+    merges_sql, params = merges
+    conflicts = []
+    for index, index_cols in _unique_indexes(cursor, table):
+        rewritten = [col for col in index_cols if col in cols]
+        if not rewritten:
+            continue
+        joins = ' '.join(
+            f"left join merges m_{col} on m_{col}.old_id = t.{col}" for col in rewritten
+        )
+        values = ', '.join(
+            f"coalesce(m_{col}.new_id, t.{col})" if col in rewritten else f"t.{col}"
+            for col in index_cols
+        )
+        was_merged = ' or '.join(f"m_{col}.old_id is not null" for col in rewritten)
+        not_null = ' and '.join(f"t.{col} is not null" for col in index_cols)
+        cursor.execute(
+            f"""
+            {merges_sql}
+            select count(*)
+              from (select
+                      from {table} t {joins}
+                     where {not_null}
+                     group by {values}
+                    having count(*) > 1 and bool_or({was_merged})) as dupes
+            """,
+            params,
+        )
+        num_conflicts = cursor.fetchone()[0]
+        if num_conflicts:
+            conflicts.append(f"{index} ({num_conflicts} conflict(s))")
+    return conflicts
+
+
+def batch_fk_update(cursor, merges, table: str, col: str) -> int:
+    """Point the column at each new PK wherever it references an old PK."""
+    merges_sql, params = merges
+    cursor.execute(
+        f"""
+        {merges_sql}
+        update {table}
+           set {col} = merges.new_id
+          from merges
+         where {table}.{col} = merges.old_id
+        """,
+        params,
+    )
+    return cursor.rowcount
+
+
+def _validate_pairs(pairs: List[Tuple[int, int]]) -> None:
+    old_pks = [old for old, _new in pairs]
+    new_pks = {new for _old, new in pairs}
+    if len(set(old_pks)) != len(old_pks):
+        raise ValueError("Each participant can only be merged away once")
+    chained = new_pks.intersection(old_pks)
+    if chained:
+        raise ValueError(f"Participants both merged & merged into: {sorted(chained)}")
+
+
+def _batch_migrate_users(cursor, merges, counts: Dict[str, int]) -> None:
+    merges_sql, params = merges
+    check_fk_tables(cursor, 'auth_user', 'id', EXPECTED_USER_TABLES)
+
+    cursor.execute("select count(*) from auth_user_user_permissions")
+    if cursor.fetchone()[0]:
+        raise ValueError("Permissions exist, but this script doesn't handle that")
+
+    # There should only be one primary, taken from each new account
+    cursor.execute(
+        f"""
+        {merges_sql}
+        update account_emailaddress
+           set "primary" = false
+         where user_id in (select old_id from merges)
+        """,
+        params,
+    )
+    for table in ['account_emailaddress', 'django_admin_log']:
+        counts[table] += batch_fk_update(cursor, merges, table, 'user_id')
+
+    # Copy over old groups each user no longer has (duplicates are constrained)
+    cursor.execute(
+        f"""
+        {merges_sql}
+        insert into auth_user_groups (user_id, group_id)
+        select distinct merges.new_id, g.group_id
+          from auth_user_groups g
+               join merges on g.user_id = merges.old_id
+            on conflict do nothing
+        """,
+        params,
+    )
+    counts['auth_user_groups'] += cursor.rowcount
+    cursor.execute(
+        f"""
+        {merges_sql}
+        delete from auth_user_groups where user_id in (select old_id from merges)
+        """,
+        params,
+    )
+    cursor.execute(
+        f"{merges_sql} delete from auth_user where id in (select old_id from merges)",
+        params,
+    )
+
+
+def _batch_migrate_participants(cursor, merges, counts: Dict[str, int]) -> None:
+    merges_sql, params = merges
+    check_fk_tables(cursor, 'ws_participant', 'id', EXPECTED_PARTICIPANT_TABLES)
+
+    # Keep lottery info from the new participant, else the latest of the old.
+    cursor.execute(
+        f"""
+        {merges_sql}
+        delete from ws_lotteryinfo li
+         using merges m
+         where li.participant_id = m.old_id and
+               (exists(select
+                         from ws_lotteryinfo existing
+                        where existing.participant_id = m.new_id) or
+                exists(select
+                         from ws_lotteryinfo sibling
+                              join merges other on sibling.participant_id = other.old_id
+                        where other.new_id = m.new_id and sibling.id > li.id))
+        """,
+        params,
+    )
+
+    # As in `_migrate_participant()`, some tables just forget old participants
+    simple_updates = EXPECTED_PARTICIPANT_TABLES.copy()
+    for table, cols in [
+        ('ws_passwordquality', ('participant_id',)),
+        ('ws_duplicatekey', ('participant_id',)),
+        ('ws_duplicatecandidate', ('left_id', 'right_id')),
+    ]:
+        simple_updates.pop(table)
+        matches = ' or '.join(f"{col} in (select old_id from merges)" for col in cols)
+        cursor.execute(f"{merges_sql} delete from {table} where {matches}", params)
+
+    # Check the whole batch up front, rather than failing on the first conflict
+    conflicts = [
+        f"{table}: {conflict}"
+        for table, cols in simple_updates.items()
+        for conflict in _find_conflicts(cursor, merges, table, cols)
+    ]
+    if conflicts:
+        raise MergeConflict(f"Unable to merge: {'; '.join(conflicts)}")
+
+    for table, cols in simple_updates.items():
+        for col in cols:
+            counts[table] += batch_fk_update(cursor, merges, table, col)
+
+    cursor.execute(
+        f"{merges_sql} delete from ws_participant where id in (select old_id from merges)",
+        params,
+    )
+    counts['ws_participant'] += cursor.rowcount
+
+
+def merge_participant_pairs(pairs: Iterable[Tuple[int, int]]) -> Dict[str, int]:
+    """Merge many (old, new) pairs of participant PKs at once.
+
+    Each table is rewritten with one statement for the whole batch, so this
+    scales to hundreds of pairs (unlike calling `merge_participants()` for
+    each). If any pair would violate a uniqueness constraint, nothing is
+    merged and `MergeConflict` names each constraint.
+
+    Returns the number of rows rewritten in each table.
+    """
+    pairs = list(pairs)
+    if not pairs:
+        return {}
+    _validate_pairs(pairs)
+
+    user_id_by_par_id = dict(
+        models.Participant.objects.filter(
+            pk__in={pk for pair in pairs for pk in pair}
+        ).values_list('pk', 'user_id')
+    )
+    missing = {pk for pair in pairs for pk in pair} - set(user_id_by_par_id)
+    if missing:
+        raise models.Participant.DoesNotExist(f"Missing: {sorted(missing)}")
+    user_pairs = [
+        (user_id_by_par_id[old], user_id_by_par_id[new]) for old, new in pairs
+    ]
+
+    counts: Dict[str, int] = defaultdict(int)
+    cursor = connections['default'].cursor()
+    with transaction.atomic():  # Rollback if any table fails
+        _batch_migrate_participants(cursor, _merges_cte(pairs), counts)
+        _batch_migrate_users(cursor, _merges_cte(user_pairs), counts)
+        _invalidate_trips_led({new for _, new in pairs})
+        ws.messages.invalidate_state(new for _, new in pairs)
+    return dict(counts)
@@ -2,9 +2,40 @@
 Functions that take a request, create messages if applicable.
 
 Some messages may be called on *every* request, others as needed.
+
+Message generators which must query the database cache the results per
+participant (see `MessageGenerator.cached_state`). Any change which might
+alter those results replaces the participant's `message_state_token` (see
+`ws.signals.message_signals`), so unchanged state costs no queries.
 """
+import uuid
+from typing import Any, Callable, Iterable, Optional
+
 from django.contrib import messages
 from django.contrib.messages.storage.base import Message
+from django.core.cache import cache
+
+from ws import models
+from ws.utils.dates import local_date
+
+STATE_TIMEOUT = 24 * 60 * 60
+
+
+def invalidate_state(participant_ids: Iterable[int]) -> Optional[uuid.UUID]:
+    """Discard any cached message state for the given participants.
+
+    The token is stored in the database (not the cache), so every process
+    sees the change, and a rolled-back change restores the old token.
+    Returns the new token (if any participants were given).
+    """
+    participant_ids = set(participant_ids)
+    if not participant_ids:
+        return None
+    token = uuid.uuid4()
+    models.Participant.objects.filter(pk__in=participant_ids).update(
+        message_state_token=token
+    )
+    return token
 
 
 class MessageGenerator:
@@ -15,6 +46,31 @@ class MessageGenerator:
         """Supply all messages for this request."""
         raise NotImplementedError
 
+    def cached_state(self, compute: Callable[[], Any]) -> Any:
+        """Return state on the participant that messages need (e.g. query results).
+
+        State is cached for each generator until something changes which
+        could alter it. It's also recomputed daily, since most state depends
+        on which trips are recent or upcoming.
+
+        The token is read from the request's participant (loaded afresh for
+        each request), so this never queries when state is cached.
+
+        `compute` must return something other than None, and should contain
+        only plain values (not model instances).
+        """
+        participant = self.request.participant
+        generator = type(self).__module__
+        state_key = (
+            f'message-state-{generator}-{participant.pk}-'
+            f'{participant.message_state_token.hex}-{local_date()}'
+        )
+        state = cache.get(state_key)
+        if state is None:
+            state = compute()
+            cache.set(state_key, state, STATE_TIMEOUT)
+        return state
+
     def add_unique_message(self, level, message, **kwargs):
         """Add a message, but only after first making sure it's not already been emitted.
 
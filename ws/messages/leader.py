@@ -18,18 +18,21 @@ class Messages(MessageGenerator):
     def supply(self):
         if not perm_utils.is_leader(self.request.user):
             return
-        self._complain_if_missing_itineraries()
-        self._complain_if_missing_feedback()
-
-    def _complain_if_missing_itineraries(self):
-        """Create messages if the leader needs to complete trip itineraries."""
-        now = date_utils.local_now()
+        state = self.cached_state(
+            lambda: {
+                'future_trips_without_info': self._future_trips_without_info(),
+                'recent_trips_without_feedback': self._recent_trips_without_feedback(),
+            }
+        )
+        self._complain_if_missing_itineraries(state['future_trips_without_info'])
+        self._complain_if_missing_feedback(state['recent_trips_without_feedback'])
 
+    def _future_trips_without_info(self):
         # Most trips require itineraries, but some (TRS, etc.) do not
         # All WS trips require itineraries, though
-        future_trips_without_info = (
+        return list(
             self.request.participant.trips_led.filter(
-                trip_date__gte=now.date(),
+                trip_date__gte=date_utils.local_date(),
                 info__isnull=True,
                 program=enums.Program.WINTER_SCHOOL.value,
             )
@@ -37,6 +40,10 @@ class Messages(MessageGenerator):
             .values_list('pk', 'trip_date', 'name')
         )
 
+    def _complain_if_missing_itineraries(self, future_trips_without_info):
+        """Create messages if the leader needs to complete trip itineraries."""
+        now = date_utils.local_now()
+
         for trip_pk, trip_date, name in future_trips_without_info:
             if now > date_utils.itinerary_available_at(trip_date):
                 trip_url = reverse('trip_itinerary', args=(trip_pk,))
@@ -46,17 +53,13 @@ class Messages(MessageGenerator):
                 )
                 self.add_unique_message(messages.WARNING, msg, extra_tags='safe')
 
-    def _complain_if_missing_feedback(self):
-        """Create messages if the leader should supply feedback.
-
-        We request that leaders leave feedback on all trips they've led.
-        """
+    def _recent_trips_without_feedback(self):
         participant = self.request.participant
 
         today = date_utils.local_date()
         one_month_ago = today - timedelta(days=30)
 
-        recent_trips_without_feedback = (
+        return list(
             participant.trips_led.filter(
                 trip_date__lt=today, trip_date__gt=one_month_ago
             )
@@ -65,6 +68,11 @@ class Messages(MessageGenerator):
             .values_list('pk', 'name')
         )
 
+    def _complain_if_missing_feedback(self, recent_trips_without_feedback):
+        """Create messages if the leader should supply feedback.
+
+        We request that leaders leave feedback on all trips they've led.
+        """
         for trip_pk, name in recent_trips_without_feedback:
             trip_url = reverse('review_trip', args=(trip_pk,))
             msg = f'Please supply feedback for <a href="{trip_url}">{escape(name)}</a>'
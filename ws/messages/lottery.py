@@ -5,6 +5,7 @@ Messages pertaining to the Winter School lottery.
 from django.contrib import messages
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.functional import cached_property
 
 import ws.utils.dates as date_utils
 from ws import enums, models
@@ -17,15 +18,49 @@ class Messages(MessageGenerator):
 
     WARN_AFTER_DAYS_OLD = 5  # After these days, remind of lottery status
 
-    @property
-    def lotteryinfo(self):
-        participant = self.request.participant
-
+    @cached_property
+    def state(self):
+        """Query everything needed for messages (cached until changed)."""
+        return self.cached_state(self._query_state)
+
+    def _query_state(self):
+        lotteryinfo = self._query_lotteryinfo()
+        if not lotteryinfo:  # (Other warnings are redundant without lottery info)
+            return {'lotteryinfo': None, 'has_car': False, 'future_signup_orders': []}
+        return {
+            # (Just the values needed, since model instances shouldn't be cached)
+            'lotteryinfo': {
+                'car_status': lotteryinfo.car_status,
+                'is_driver': lotteryinfo.is_driver,
+                'last_updated': lotteryinfo.last_updated,
+            },
+            'has_car': self.request.participant.car is not None,
+            'future_signup_orders': self._query_future_signup_orders(),
+        }
+
+    def _query_lotteryinfo(self):
         try:
-            return participant and participant.lotteryinfo
+            return self.request.participant.lotteryinfo
         except models.LotteryInfo.DoesNotExist:
             return None
 
+    def _query_future_signup_orders(self):
+        # Only consider signups for lottery trips in the future
+        return list(
+            models.SignUp.objects.filter(
+                participant=self.request.participant,
+                on_trip=False,
+                trip__algorithm='lottery',
+                trip__program=enums.Program.WINTER_SCHOOL.value,
+                trip__trip_date__gte=date_utils.local_date(),
+            ).values_list('order', flat=True)
+        )
+
+    @property
+    def lotteryinfo(self):
+        """Describe the participant's lottery info (if they have any)."""
+        return self.request.participant and self.state['lotteryinfo']
+
     def supply(self):
         if not self.request.participant or not date_utils.is_currently_iap():
             return
@@ -62,7 +97,7 @@ class Messages(MessageGenerator):
         lottery = self.lotteryinfo
         if not lottery:
             return
-        if lottery.car_status == 'own' and not self.request.participant.car:
+        if lottery['car_status'] == 'own' and not self.state['has_car']:
             edit_car = self.profile_link("submitted car information")
             prefs = self.prefs_link()
             msg = (
@@ -79,14 +114,7 @@ class Messages(MessageGenerator):
         set which ones are your favorite! This reminder gives them a quick link
         to let them rank their most preferred trips.
         """
-        # Only consider signups for lottery trips in the future
-        future_signups = models.SignUp.objects.filter(
-            participant=self.request.participant,
-            on_trip=False,
-            trip__algorithm='lottery',
-            trip__program=enums.Program.WINTER_SCHOOL.value,
-            trip__trip_date__gte=date_utils.local_date(),
-        ).values_list('order', flat=True)
+        future_signups = self.state['future_signup_orders']
         some_trips_ranked = any(order for order in future_signups)
 
         if len(future_signups) > 1 and not some_trips_ranked:
@@ -98,14 +126,14 @@ class Messages(MessageGenerator):
         if not self.lotteryinfo:
             return
 
-        time_diff = timezone.now() - self.lotteryinfo.last_updated
+        time_diff = timezone.now() - self.lotteryinfo['last_updated']
         days_old = time_diff.days
 
         if days_old < self.WARN_AFTER_DAYS_OLD:
             return
 
         prefs = self.prefs_link()
-        driver_prefix = "" if self.lotteryinfo.is_driver else "non-"
+        driver_prefix = "" if self.lotteryinfo['is_driver'] else "non-"
         msg = (
             f"You haven't updated your {prefs} in {days_old} days. "
             f"You will be counted as a {driver_prefix}driver in the next lottery."
@@ -12,10 +12,23 @@ class Messages(MessageGenerator):
         if not self.request.user.is_authenticated:
             return
 
-        if any(problems_with_profile(self.request.participant)):
+        if self._has_problems_with_profile():
             edit_url = reverse('edit_profile')
             self.add_unique_message(
                 messages.WARNING,
                 f'<a href="{edit_url}">Update your profile</a> to sign up for trips.',
                 extra_tags='safe',
             )
+
+    def _has_problems_with_profile(self):
+        participant = self.request.participant
+        if not participant:
+            return True
+
+        # Info goes stale with time alone, but other problems need queries
+        if not participant.info_current:
+            return True
+        state = self.cached_state(
+            lambda: {'has_problems': any(problems_with_profile(participant))}
+        )
+        return state['has_problems']
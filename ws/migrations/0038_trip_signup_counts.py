@@ -0,0 +1,50 @@
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_signups(apps, schema_editor):
+    Trip = apps.get_model('ws', 'Trip')
+    SignUp = apps.get_model('ws', 'SignUp')
+
+    def signup_count(**filters):
+        signups = (
+            SignUp.objects.filter(trip=OuterRef('pk'), **filters)
+            .order_by()
+            .values('trip')
+            .annotate(count=Count('pk'))
+            .values('count')
+        )
+        return Coalesce(Subquery(signups, output_field=IntegerField()), 0)
+
+    Trip.objects.update(
+        num_signups=signup_count(),
+        num_on_trip=signup_count(on_trip=True),
+        num_waitlisted=signup_count(waitlistsignup__isnull=False),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ws', '0037_denormalize_hibp_passwords'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='num_on_trip',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='num_signups',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='num_waitlisted',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_signups, reverse_code=migrations.RunPython.noop),
+    ]
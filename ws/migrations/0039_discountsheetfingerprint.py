@@ -0,0 +1,37 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ws', '0038_trip_signup_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiscountSheetFingerprint',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                ('ga_key', models.CharField(max_length=63)),
+                ('rows', models.TextField()),
+                ('last_synced', models.DateTimeField(auto_now=True)),
+                (
+                    'discount',
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='sheet_fingerprint',
+                        to='ws.Discount',
+                    ),
+                ),
+            ],
+        ),
+    ]
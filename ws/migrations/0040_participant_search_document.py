@@ -0,0 +1,70 @@
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# (Kept in sync with `ws.utils.search`, but copied so this migration never changes)
+FOLD_FROM = (
+    'àáâãäåāăąçćčďđèéêëēėęěìíîïīįłñńňòóôõöøōőŕřśšşťùúûüūůűųýÿźżž'
+    'ÀÁÂÃÄÅĀĂĄÇĆČĎĐÈÉÊËĒĖĘĚÌÍÎÏĪĮŁÑŃŇÒÓÔÕÖØŌŐŔŘŚŠŞŤÙÚÛÜŪŮŰŲÝŸŹŻŽ'
+)
+FOLD_TO = 'aaaaaaaaacccddeeeeeeeeiiiiiilnnnoooooooorrssstuuuuuuuuyyzzz' * 2
+
+# Fold case & accents, and split emails into words (`bob@example.com` -> `bob`)
+CREATE_SEARCH_TEXT = f"""
+CREATE FUNCTION ws_participant_search_text(name text, email text) RETURNS text AS $$
+    SELECT translate(lower(name || ' ' || email), '{FOLD_FROM}@._+-', '{FOLD_TO}     ')
+$$ LANGUAGE SQL IMMUTABLE PARALLEL SAFE;
+"""
+
+CREATE_TRIGGER = """
+CREATE FUNCTION ws_participant_search_document() RETURNS trigger AS $$
+BEGIN
+    NEW.search_document := to_tsvector(
+        'simple'::regconfig, ws_participant_search_text(NEW.name, NEW.email)
+    );
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER ws_participant_search_document
+    BEFORE INSERT OR UPDATE OF name, email ON ws_participant
+    FOR EACH ROW EXECUTE PROCEDURE ws_participant_search_document();
+
+UPDATE ws_participant
+   SET search_document = to_tsvector(
+           'simple'::regconfig, ws_participant_search_text(name, email)
+       );
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER ws_participant_search_document ON ws_participant;
+DROP FUNCTION ws_participant_search_document();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ws', '0039_discountsheetfingerprint'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            CREATE_SEARCH_TEXT,
+            reverse_sql='DROP FUNCTION ws_participant_search_text(text, text);',
+        ),
+        migrations.AddField(
+            model_name='participant',
+            name='search_document',
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER, reverse_sql=DROP_TRIGGER),
+        migrations.AddIndex(
+            model_name='participant',
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=['search_document'], name='ws_participant_search'
+            ),
+        ),
+    ]
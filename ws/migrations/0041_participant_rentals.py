@@ -0,0 +1,55 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ws', '0040_participant_search_document'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='participant',
+            name='rentals_last_cached',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='Rental',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                (
+                    'email',
+                    models.EmailField(
+                        help_text='Verified email under which gear was rented',
+                        max_length=254,
+                    ),
+                ),
+                ('gear_id', models.CharField(max_length=63)),
+                ('name', models.CharField(max_length=255)),
+                (
+                    'cost',
+                    models.FloatField(help_text='Daily cost of renting the item'),
+                ),
+                ('checkedout', models.DateField()),
+                (
+                    'participant',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to='ws.Participant',
+                    ),
+                ),
+            ],
+            options={
+                'ordering': ['checkedout', 'gear_id'],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ws', '0042_trip_cache_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(
+                fields=['trip_date', 'time_created', 'id'], name='ws_trip_list_order'
+            ),
+        ),
+    ]
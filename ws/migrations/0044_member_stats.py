@@ -0,0 +1,53 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ws', '0043_trip_list_order_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemberStats',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                (
+                    'person_id',
+                    models.PositiveIntegerField(
+                        help_text='ID of the member in the gear database', unique=True
+                    ),
+                ),
+                ('last_known_affiliation', models.CharField(max_length=255)),
+                ('num_rentals', models.PositiveIntegerField()),
+                (
+                    'num_trips_attended',
+                    models.PositiveIntegerField(blank=True, null=True),
+                ),
+                ('num_trips_led', models.PositiveIntegerField(blank=True, null=True)),
+                ('num_discounts', models.PositiveIntegerField(blank=True, null=True)),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+                (
+                    'participant',
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to='ws.Participant',
+                    ),
+                ),
+            ],
+            options={
+                'ordering': ['person_id'],
+            },
+        ),
+    ]
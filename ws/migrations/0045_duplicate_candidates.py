@@ -0,0 +1,90 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ws', '0044_member_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DuplicateKey',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                (
+                    'kind',
+                    models.CharField(
+                        choices=[
+                            ('name', 'Name'),
+                            ('phone', 'Cell phone'),
+                            ('email', 'Email'),
+                        ],
+                        max_length=15,
+                    ),
+                ),
+                ('value', models.CharField(max_length=255)),
+                (
+                    'participant',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to='ws.Participant'
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DuplicateCandidate',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                ('same_name', models.BooleanField(default=False)),
+                ('same_phone', models.BooleanField(default=False)),
+                ('same_email', models.BooleanField(default=False)),
+                ('score', models.PositiveSmallIntegerField()),
+                (
+                    'left',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='+',
+                        to='ws.Participant',
+                    ),
+                ),
+                (
+                    'right',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='+',
+                        to='ws.Participant',
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='duplicatekey',
+            index=models.Index(fields=['kind', 'value'], name='ws_duplicatekey_lookup'),
+        ),
+        migrations.AddIndex(
+            model_name='duplicatecandidate',
+            index=models.Index(fields=['-score'], name='ws_duplicatecandidate_rank'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='duplicatecandidate',
+            unique_together={('left', 'right')},
+        ),
+    ]
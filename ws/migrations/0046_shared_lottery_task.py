@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ws', '0045_duplicate_candidates'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='trip',
+            name='lottery_task_id',
+            field=models.CharField(blank=True, db_index=True, max_length=36, null=True),
+        ),
+    ]
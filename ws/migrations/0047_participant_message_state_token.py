@@ -0,0 +1,18 @@
+import uuid
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ws', '0046_shared_lottery_task'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='participant',
+            name='message_state_token',
+            field=models.UUIDField(default=uuid.uuid4, editable=False),
+        ),
+    ]
@@ -1,16 +1,21 @@
+import uuid
+from collections import defaultdict
 from datetime import date, datetime, timedelta
-from typing import Dict, List, Tuple, Type, Union
+from typing import Dict, List, Optional, Tuple, Type, Union
 
 from allauth.account.models import EmailAddress
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator, RegexValidator
 from django.db import models
 from django.db.models import F, Q
 from django.urls import reverse_lazy
 from django.utils import timezone
+from django.utils.functional import cached_property
 from django.utils.safestring import mark_safe
 from django.utils.text import format_lazy
 from localflavor.us.models import USStateField
@@ -19,6 +24,7 @@ from mitoc_const.membership import RENEWAL_ALLOWED_WITH_DAYS_LEFT
 from phonenumber_field.modelfields import PhoneNumberField
 
 import ws.utils.dates as date_utils
+import ws.utils.rating_timeline as timeline_utils
 from ws import enums
 from ws.utils.avatar import avatar_url
 
@@ -155,6 +161,27 @@ class Discount(models.Model):
         return self.name
 
 
+class DiscountSheetFingerprint(models.Model):
+    """A record of exactly what was last written to a discount's spreadsheet.
+
+    Each row of the sheet is summarized by the participant's name, email, and
+    a digest of all its cell values. Comparing against this record lets us
+    send only the rows which have changed (without reading the sheet at all).
+    """
+
+    discount = models.OneToOneField(
+        Discount, on_delete=models.CASCADE, related_name='sheet_fingerprint'
+    )
+    # The fingerprint describes one sheet - if the key changes, it's useless.
+    ga_key = models.CharField(max_length=63)
+    # JSON-encoded `[name, email, digest]` for each row (including the header)
+    rows = models.TextField()
+    last_synced = models.DateTimeField(auto_now=True)
+
+    def __str__(self):  # pylint: disable=invalid-str-returned
+        return f"Fingerprint of {self.ga_key}"
+
+
 class Membership(models.Model):
     """Cached data about a participant's MITOC membership.
 
@@ -287,6 +314,8 @@ class Participant(models.Model):
     membership = models.OneToOneField(
         Membership, null=True, blank=True, on_delete=models.CASCADE
     )
+    # When `rental_set` was last refreshed from the gear database (if ever)
+    rentals_last_cached = models.DateTimeField(null=True, blank=True, editable=False)
 
     AFFILIATION_CHOICES: List[Tuple[str, Union[str, List[Tuple[str, str]]]]] = [
         (
@@ -325,6 +354,28 @@ class Participant(models.Model):
 
     discounts = models.ManyToManyField(Discount, blank=True)
 
+    # Words from the (case- and accent-folded) name & email, for fast searching.
+    # A database trigger keeps this current; see `ws.utils.search`.
+    search_document = SearchVectorField(null=True, editable=False)
+
+    # Replaced whenever anything shown in the participant's messages changes,
+    # so that their state can be cached (see `ws.messages.invalidate_state`)
+    message_state_token = models.UUIDField(default=uuid.uuid4, editable=False)
+
+    # The name as last loaded or saved, so that saves can tell if it changed
+    # (leader names are shown in cached trip rows; see `ws.signals.cache_signals`)
+    saved_name: Optional[str] = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.saved_name = instance.__dict__.get('name')  # (Unless deferred)
+        return instance
+
+    def save(self, *args, **kwargs):  # pylint: disable=signature-differs
+        super().save(*args, **kwargs)
+        self.saved_name = self.name
+
     @property
     def membership_active(self):
         """NOTE: This uses the cache, should only be called on a fresh cache."""
@@ -418,6 +469,12 @@ class Participant(models.Model):
         if not user.is_authenticated:
             return None
 
+        # The request's user already has the participant (& membership) loaded.
+        # (A participant may have been created since; only trust a cached hit)
+        cached = User.participant.related.get_cached_value(user, default=None)
+        if cached and (not join_membership or cls.membership.field.is_cached(cached)):
+            return cached
+
         one_or_none = cls.objects.filter(user_id=user.id)
         if join_membership:
             one_or_none = one_or_none.select_related('membership')
@@ -551,34 +608,80 @@ class Participant(models.Model):
             ratings = (r for r in ratings if r.time_created > after_time)
         return ratings
 
-    def name_with_rating(self, trip):
-        """Give the leader's name plus rating at the time of the trip.
+    @cached_property
+    def rating_timeline(self) -> timeline_utils.RatingTimeline:
+        """All the participant's ratings, for fast lookups (see `RatingTimeline`).
+
+        The timeline lasts only as long as this instance (usually one request
+        or task), and is built from prefetched ratings (or else, one query).
+        To avoid a query per participant, see `load_rating_timelines()`.
+        """
+        self.load_rating_timelines([self])
+        return self.__dict__['rating_timeline']
+
+    @staticmethod
+    def load_rating_timelines(participants) -> None:
+        """Build a rating timeline for each participant, in at most one query."""
+        participants = list(participants)
+        missing: Dict[int, List[Participant]] = defaultdict(list)
+        for par in participants:
+            if 'rating_timeline' not in par.__dict__:
+                missing[par.pk].append(par)
+
+        fields = ('activity', 'time_created', 'rating', 'active')
+        ratings_by_par_id: Dict[int, list] = {}
+        for par in participants:
+            prefetched = getattr(par, '_prefetched_objects_cache', {})
+            if par.pk in missing and 'leaderrating_set' in prefetched:
+                ratings_by_par_id[par.pk] = [
+                    tuple(getattr(rating, field) for field in fields)
+                    for rating in par.leaderrating_set.all()
+                ]
+        to_query = set(missing).difference(ratings_by_par_id)
+        if to_query:
+            ratings_by_par_id.update({par_id: [] for par_id in to_query})
+            rows = LeaderRating.objects.filter(participant_id__in=to_query)
+            for par_id, *rating in rows.values_list('participant_id', *fields):
+                ratings_by_par_id[par_id].append(tuple(rating))
+
+        for par_id, instances in missing.items():
+            timeline = timeline_utils.RatingTimeline(ratings_by_par_id[par_id])
+            for par in instances:
+                par.__dict__['rating_timeline'] = timeline
+
+    def rating_for_trip(self, trip) -> Optional[str]:
+        """Give the leader's rating at the time of the trip (if there was one).
 
         Note: Some leaders from Winter School 2014 or 2015 may not have any
         ratings. In those years, we deleted all Winter School ratings at the
         end of the season (so leaders who did not return the next year lost
         their ratings).
-
-        If no rating is found, simply the name will be given.
         """
         required_activity = trip.program_enum.required_activity()
         if required_activity is None:
-            return self.name
+            return None
 
         day_before = trip.trip_date - timedelta(days=1)
-        rating = self.activity_rating(
+        return self.activity_rating(
             required_activity.value,
             at_time=date_utils.late_at_night(day_before),
             must_be_active=False,
         )
+
+    def name_with_rating(self, trip):
+        """Give the leader's name plus rating at the time of the trip.
+
+        If no rating is found, simply the name will be given.
+        """
+        rating = self.rating_for_trip(trip)
         return f"{self.name} ({rating})" if rating else self.name
 
     def activity_rating(self, activity, **kwargs):
-        """Return leader's rating for the given activity (if one exists)."""
-        ratings = [r for r in self.ratings(**kwargs) if r.activity == activity]
-        if not ratings:
-            return None
-        return max(ratings, key=lambda rating: rating.time_created).rating
+        """Return leader's rating for the given activity (if one exists).
+
+        Accepts the same filters as `ratings()`.
+        """
+        return self.rating_timeline.rating(activity, **kwargs)
 
     @property
     def allowed_programs(self):
@@ -623,6 +726,7 @@ class Participant(models.Model):
 
     class Meta:
         ordering = ['name', 'email']
+        indexes = [GinIndex(fields=['search_document'], name='ws_participant_search')]
 
 
 class PasswordQuality(models.Model):
@@ -647,6 +751,64 @@ class PasswordQuality(models.Model):
         return f"{label} (as of {self.last_checked})"
 
 
+class Rental(models.Model):
+    """Cached record of an item a participant has checked out from MITOC.
+
+    Like `Membership`, the gear database is the authority on who has rented
+    what. Looking up rentals requires an API call, though, so we periodically
+    copy outstanding rentals here so that pages can report them quickly.
+
+    `Participant.rentals_last_cached` reports when the participant's rentals
+    were last copied (a participant with no rentals has no rows here).
+    """
+
+    participant = models.ForeignKey(Participant, on_delete=models.CASCADE)
+    email = models.EmailField(help_text="Verified email under which gear was rented")
+    gear_id = models.CharField(max_length=63)  # Example, 'BK-19-04'
+    name = models.CharField(max_length=255)
+    cost = models.FloatField(help_text="Daily cost of renting the item")
+    checkedout = models.DateField()
+
+    @property
+    def overdue(self):
+        return date_utils.local_date() - self.checkedout > timedelta(weeks=10)
+
+    def __str__(self):  # pylint: disable=invalid-str-returned
+        return f"{self.name} ({self.gear_id})"
+
+    class Meta:
+        ordering = ['checkedout', 'gear_id']
+
+
+class MemberStats(models.Model):
+    """Precomputed statistics about one current MITOC member.
+
+    Members are people in the gear database with current dues (there may be
+    no participant if they've never used this site). Rows are recomputed
+    nightly, so that the stats endpoint needn't query the gear database.
+    """
+
+    person_id = models.PositiveIntegerField(
+        unique=True, help_text="ID of the member in the gear database"
+    )
+    participant = models.ForeignKey(
+        Participant, null=True, blank=True, on_delete=models.SET_NULL
+    )
+    last_known_affiliation = models.CharField(max_length=255)
+    num_rentals = models.PositiveIntegerField()
+    # Only known for members with a participant
+    num_trips_attended = models.PositiveIntegerField(null=True, blank=True)
+    num_trips_led = models.PositiveIntegerField(null=True, blank=True)
+    num_discounts = models.PositiveIntegerField(null=True, blank=True)
+    last_updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):  # pylint: disable=invalid-str-returned
+        return f"Member #{self.person_id}"
+
+    class Meta:
+        ordering = ['person_id']
+
+
 class LectureAttendance(models.Model):
     year = models.PositiveIntegerField(
         validators=[MinValueValidator(2016)],
@@ -958,14 +1120,47 @@ class Trip(models.Model):
         choices=[('lottery', 'lottery'), ('fcfs', 'first-come, first-serve')],
     )
 
+    # Trips with signups closing at the same time share one task
     lottery_task_id = models.CharField(
-        max_length=36, unique=True, null=True, blank=True
+        max_length=36, db_index=True, null=True, blank=True
     )
     lottery_log = models.TextField(null=True, blank=True)
 
+    # Denormalized signup counts, maintained by signals, `save_on_trip()`, or bulk
+    # operations. They're for display: capacity checks count signups afresh.
+    # See `ws.utils.signups.update_signup_counts` for how to recompute these.
+    num_signups = models.IntegerField(default=0, editable=False)
+    num_on_trip = models.IntegerField(default=0, editable=False)
+    num_waitlisted = models.IntegerField(default=0, editable=False)
+
+    SIGNUP_COUNT_FIELDS = ('num_signups', 'num_on_trip', 'num_waitlisted')
+
+    # Incremented whenever anything shown in trip lists changes, so that
+    # rendered rows can be cached (see `ws.templatetags.trip_tags`)
+    cache_version = models.PositiveIntegerField(default=0, editable=False)
+
     def __str__(self):  # pylint: disable=invalid-str-returned
         return self.name
 
+    def save(self, *args, **kwargs):
+        """Save the trip, never overwriting signup counts with in-memory values.
+
+        Signup counts (and the cache version) are only ever changed with atomic
+        updates - an instance loaded before some signup changes will be stale.
+        """
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            skipped = {
+                *self.SIGNUP_COUNT_FIELDS,
+                'cache_version',
+                *self.get_deferred_fields(),
+            }
+            kwargs['update_fields'] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skipped
+            ]
+        super().save(*args, **kwargs)
+
     @property
     def program_enum(self):
         """Convert the string constant value to an instance of the enum."""
@@ -1117,6 +1312,16 @@ class Trip(models.Model):
 
     @property
     def open_slots(self):
+        """Give the number of open slots, per the denormalized count (for display).
+
+        Counts are maintained in the database, so this instance may be stale
+        if signups have changed since it was loaded (see `num_on_trip`).
+        Capacity checks should use `current_open_slots()` instead.
+        """
+        return self.maximum_participants - self.num_on_trip
+
+    def current_open_slots(self) -> int:
+        """Count the open slots from the trip's signups, as they are right now."""
         accepted_signups = self.signup_set.filter(on_trip=True)
         return self.maximum_participants - accepted_signups.count()
 
@@ -1207,6 +1412,12 @@ class Trip(models.Model):
 
     class Meta:
         ordering = ["-trip_date", "-time_created"]
+        # Supports keyset pagination in this order (see `JsonTripsView`)
+        indexes = [
+            models.Index(
+                fields=['trip_date', 'time_created', 'id'], name='ws_trip_list_order'
+            )
+        ]
 
 
 class BygonesManager(models.Manager):
@@ -1767,6 +1978,47 @@ class ClimbingLeaderApplication(LeaderApplication):
     )
 
 
+class DuplicateKey(models.Model):
+    """A normalized identifier for a participant (see `ws.duplicates`).
+
+    Participants who share any key may well be the same person.
+    """
+
+    participant = models.ForeignKey(Participant, on_delete=models.CASCADE)
+    kind = models.CharField(
+        max_length=15,
+        choices=[('name', 'Name'), ('phone', 'Cell phone'), ('email', 'Email')],
+    )
+    value = models.CharField(max_length=255)
+
+    def __str__(self):  # pylint: disable=invalid-str-returned
+        return f"{self.kind}: {self.value}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'value'], name='ws_duplicatekey_lookup')
+        ]
+
+
+class DuplicateCandidate(models.Model):
+    """Two participants who share some duplicate keys (`left` has the lower ID)."""
+
+    left = models.ForeignKey(Participant, on_delete=models.CASCADE, related_name='+')
+    right = models.ForeignKey(Participant, on_delete=models.CASCADE, related_name='+')
+    same_name = models.BooleanField(default=False)
+    same_phone = models.BooleanField(default=False)
+    same_email = models.BooleanField(default=False)
+    # Higher scores are likelier to be duplicates (see `ws.duplicates.SCORES`)
+    score = models.PositiveSmallIntegerField()
+
+    def __str__(self):  # pylint: disable=invalid-str-returned
+        return f"#{self.left_id} & #{self.right_id} ({self.score})"
+
+    class Meta:
+        unique_together = ('left', 'right')
+        indexes = [models.Index(fields=['-score'], name='ws_duplicatecandidate_rank')]
+
+
 class DistinctAccounts(models.Model):
     """Pairs of participants that are cleared as potential duplicates."""
 
@@ -1,18 +1,64 @@
+import json
 import types
+import zipfile
 from collections import OrderedDict, defaultdict
+from itertools import islice
+from typing import BinaryIO, Iterable, Iterator, Optional, Tuple
 
-from django.db.models import Q
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
 from django.forms.models import model_to_dict
 
 from ws import enums, models
 
 
+def participants_for_export():
+    """Participants, with everything that `DataDump` reports fetched up front.
+
+    Relations are prefetched, so a batch of participants takes the same
+    number of queries as just one participant.
+    """
+    # Unlike the default manager, include old feedback
+    all_feedback = models.Feedback.everything.select_related(
+        'trip', 'leader', 'participant'
+    )
+    return models.Participant.objects.select_related(
+        'user',
+        'membership',
+        'emergency_info__emergency_contact',
+        'car',
+        'lotteryinfo__paired_with',
+    ).prefetch_related(
+        'user__emailaddress_set',
+        'discounts',
+        'lectureattendance_set',
+        'signup_set__trip',
+        'wimp_trips',
+        'trips_led',
+        'created_trips',
+        Prefetch('feedback_set', queryset=all_feedback),
+        Prefetch('authored_feedback', queryset=all_feedback),
+        Prefetch(
+            'leaderrating_set',
+            queryset=models.LeaderRating.objects.select_related('creator'),
+        ),
+        'winterschoolleaderapplication_set__mentor_activities',
+        'winterschoolleaderapplication_set__mentee_activities',
+        'hikingleaderapplication_set',
+        'climbingleaderapplication_set',
+    )
+
+
 class DataDump:
-    def __init__(self, participant_id):
-        all_participants = models.Participant.objects.select_related(
-            'emergency_info__emergency_contact', 'car', 'lotteryinfo'
-        ).prefetch_related('signup_set__trip')
-        self.par = all_participants.get(pk=participant_id)
+    def __init__(self, participant_id, prefetched: Optional[models.Participant] = None):
+        """Dump one participant's data.
+
+        A participant already fetched with `participants_for_export()` may be
+        given, to avoid querying for just this participant.
+        """
+        if prefetched is None:
+            prefetched = participants_for_export().get(pk=participant_id)
+        self.par = prefetched
 
     @property
     def all_data(self):
@@ -69,10 +115,7 @@ class DataDump:
     @property
     def authored_feedback(self):
         """Feedback supplied by the participant."""
-        about_participant = Q(leader=self.par)
-        all_feedback = models.Feedback.everything.filter(about_participant)
-
-        for f in all_feedback.select_related('trip', 'participant'):
+        for f in self.par.authored_feedback.all():
             trip = None if f.trip is None else {'id': f.trip.pk, 'name': f.trip.name}
             yield {
                 'participant': {'id': f.participant.pk, 'name': f.participant.name},
@@ -85,10 +128,7 @@ class DataDump:
     @property
     def received_feedback(self):
         """Feedback _about_ the participant."""
-        about_participant = Q(participant=self.par)
-        all_feedback = models.Feedback.everything.filter(about_participant)
-
-        for f in all_feedback.select_related('trip', 'leader'):
+        for f in self.par.feedback_set.all():
             trip = None if f.trip is None else {'id': f.trip.pk, 'name': f.trip.name}
             yield {'leader': {'id': f.leader.pk, 'name': f.leader.name}, 'trip': trip}
 
@@ -146,8 +186,8 @@ class DataDump:
 
         return {
             'wimped': repr_trips(self.par.wimp_trips),
-            'led': repr_trips(self.par.trips_led.all()),
-            'created': repr_trips(self.par.created_trips.all()),
+            'led': repr_trips(self.par.trips_led),
+            'created': repr_trips(self.par.created_trips),
         }
 
     @property
@@ -178,11 +218,7 @@ class DataDump:
     @property
     def _ws_applications(self):
         """All Winter School leader applications by the user."""
-        ws_apps = models.WinterSchoolLeaderApplication.objects.filter(
-            participant=self.par
-        ).prefetch_related('mentor_activities', 'mentee_activities')
-
-        for app in ws_apps.all():
+        for app in self.par.winterschoolleaderapplication_set.all():
             formatted = model_to_dict(app, exclude=['id', 'participant'])
             formatted.update(
                 mentor_activities=[act.name for act in formatted['mentor_activities']],
@@ -200,16 +236,14 @@ class DataDump:
         if ws_apps:
             yield enums.Activity.WINTER_SCHOOL.label, ws_apps
 
-        by_participant = Q(participant=self.par)
-
         normal_apps = [
-            (enums.Activity.HIKING.label, models.HikingLeaderApplication),
-            (enums.Activity.CLIMBING.label, models.ClimbingLeaderApplication),
+            (enums.Activity.HIKING.label, self.par.hikingleaderapplication_set),
+            (enums.Activity.CLIMBING.label, self.par.climbingleaderapplication_set),
         ]
-        for activity, app_model in normal_apps:
+        for activity, applications_manager in normal_apps:
             applications = [
                 model_to_dict(app, exclude=['id', 'participant'])
-                for app in app_model.objects.filter(by_participant)
+                for app in applications_manager.all()
             ]
             if applications:
                 yield activity, applications
@@ -217,7 +251,7 @@ class DataDump:
     @property
     def leader_ratings(self):
         by_activity = defaultdict(list)
-        for rating in self.par.leaderrating_set.select_related('creator').all():
+        for rating in self.par.leaderrating_set.all():
             formatted = model_to_dict(rating, fields=['rating', 'notes', 'active'])
             formatted.update(
                 creator={'id': rating.creator.id, 'name': rating.creator.name},
@@ -225,3 +259,69 @@ class DataDump:
             )
             by_activity[rating.activity].append(formatted)
         return dict(by_activity)
+
+
+def iter_data_dumps(
+    participant_ids: Optional[Iterable[int]] = None, batch_size: int = 100
+) -> Iterator[Tuple[int, OrderedDict]]:
+    """Yield the data of each participant (or just those given), by ID.
+
+    Participants are fetched in batches, with a fixed number of queries per
+    batch. Only one batch is held in memory at a time.
+    """
+    if participant_ids is None:
+        participant_ids = (
+            models.Participant.objects.order_by('pk')
+            .values_list('pk', flat=True)
+            .iterator()
+        )
+    participant_ids = iter(participant_ids)
+
+    while True:
+        batch = list(islice(participant_ids, batch_size))
+        if not batch:
+            return
+        for par in participants_for_export().filter(pk__in=batch).order_by('pk'):
+            yield par.pk, DataDump(par.pk, prefetched=par).all_data
+
+
+def _to_json(data, **kwargs) -> bytes:
+    return json.dumps(data, cls=DjangoJSONEncoder, **kwargs).encode('utf-8')
+
+
+def write_ndjson(dumps: Iterable[Tuple[int, OrderedDict]], fileobj: BinaryIO) -> int:
+    """Write one line of JSON per participant, returning how many were written."""
+    num_written = 0
+    for participant_id, data in dumps:
+        fileobj.write(_to_json({'participant_id': participant_id, 'data': data}))
+        fileobj.write(b'\n')
+        num_written += 1
+    return num_written
+
+
+def write_zip(dumps: Iterable[Tuple[int, OrderedDict]], fileobj: BinaryIO) -> int:
+    """Write a zip archive with a JSON file per participant.
+
+    The file object need not be seekable (it may be a pipe or a response).
+    """
+    num_written = 0
+    with zipfile.ZipFile(fileobj, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for participant_id, data in dumps:
+            archive.writestr(
+                f'participant_{participant_id}.json', _to_json(data, indent=2)
+            )
+            num_written += 1
+    return num_written
+
+
+EXPORT_FORMATS = {'ndjson': write_ndjson, 'zip': write_zip}
+
+
+def export(
+    fileobj: BinaryIO,
+    export_format: str = 'ndjson',
+    participant_ids: Optional[Iterable[int]] = None,
+) -> int:
+    """Export the data of many participants, returning how many were written."""
+    writer = EXPORT_FORMATS[export_format]
+    return writer(iter_data_dumps(participant_ids), fileobj)
@@ -39,6 +39,8 @@ GEARDB_SECRET_KEY = os.getenv(
     'GEARDB_SECRET_KEY', 'secret shared with the mitoc-gear repo'
 )
 WS_LOTTERY_LOG_DIR = os.getenv('WS_LOTTERY_LOG_DIR', '/tmp/')
+# Place Winter School participants in memory, writing results back in bulk
+WS_LOTTERY_IN_MEMORY = bool(os.getenv('WS_LOTTERY_IN_MEMORY'))
 
 # URL to an avatar image that is self-hosted
 # (Users who opt out of Gravatar would prefer to not have requests made to
@@ -134,6 +136,18 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'ws.tasks.purge_old_medical_data',
         'schedule': crontab(minute=0, hour=2, day_of_week=2),
     },
+    'refresh-all-membership-cache': {
+        'task': 'ws.tasks.refresh_all_membership_cache',
+        'schedule': crontab(minute=0, hour=1),
+    },
+    'refresh-member-stats': {
+        'task': 'ws.tasks.refresh_member_stats',
+        'schedule': crontab(minute=30, hour=1),
+    },
+    'refresh-upcoming-rentals': {
+        'task': 'ws.tasks.refresh_upcoming_rentals',
+        'schedule': crontab(minute=30),
+    },
     'refresh-all-discount-spreadsheets': {
         'task': 'ws.tasks.update_all_discount_sheets',
         'schedule': crontab(minute=0, hour=3),
@@ -197,6 +211,7 @@ FORM_RENDERER = 'djng.forms.renderers.DjangoAngularBootstrap3Templates'
 
 
 MIDDLEWARE = [
+    'ws.middleware.InstrumentationMiddleware',  # (Unused unless enabled)
     'corsheaders.middleware.CorsMiddleware',
     'djng.middleware.AngularUrlMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -205,7 +220,6 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'ws.middleware.PrefetchGroupsMiddleware',
     'ws.middleware.ParticipantMiddleware',
     'ws.middleware.CustomMessagesMiddleware',
 ]
@@ -294,6 +308,12 @@ DOCUSIGN_EVENT_NOTIFICATION = {
 OAUTH_JSON_CREDENTIALS = os.getenv('OAUTH_JSON_CREDENTIALS')
 DISABLE_GSHEETS = bool(os.getenv('DISABLE_GSHEETS'))
 
+# Profile queries & external calls for every request & task (see `ws.instrumentation`)
+INSTRUMENTATION_ENABLED = bool(os.getenv('WS_INSTRUMENTATION'))
+
+# Backend for searching participants by name or email (see `ws.utils.search`)
+PARTICIPANT_SEARCH_BACKEND = 'ws.utils.search.PostgresParticipantSearch'
+
 # Internationalization
 # https://docs.djangoproject.com/en/2.2/topics/i18n/
 LANGUAGE_CODE = 'en-us'
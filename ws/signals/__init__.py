@@ -1 +1,8 @@
-from . import auth_signals, signup_signals
+from . import (
+    auth_signals,
+    cache_signals,
+    duplicate_signals,
+    message_signals,
+    signup_signals,
+    task_signals,
+)
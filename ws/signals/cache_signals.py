@@ -0,0 +1,69 @@
+"""
+Invalidate cached trip list rows whenever what they display changes.
+
+Rows are cached by trip version (see `ws.templatetags.trip_tags`), so
+invalidating a trip's rows is just a matter of bumping `Trip.cache_version`.
+Changes to signup counts bump the version alongside the counts themselves.
+
+Leader rating timelines last only as long as each participant instance (see
+`Participant.rating_timeline`), but are rebuilt if that instance's ratings change.
+"""
+
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from ws.models import LeaderRating, Participant, Trip
+
+
+def _bump_cache_version(trips, cached_trip=None):
+    trips.update(cache_version=F('cache_version') + 1)
+    if cached_trip is not None:
+        cached_trip.cache_version += 1
+
+
+@receiver(post_save, sender=Trip)
+def invalidate_saved_trip(sender, instance, created, raw, using, **kwargs):
+    # (New trips have never been cached)
+    if not (created or raw):
+        _bump_cache_version(Trip.objects.filter(pk=instance.pk), instance)
+
+
+@receiver(m2m_changed, sender=Trip.leaders.through)
+def invalidate_trip_leaders(sender, instance, action, reverse, pk_set, **kwargs):
+    """Leaders are listed with each trip (whichever side of the M2M changed)."""
+    if not reverse:
+        if action in {'post_add', 'post_remove', 'post_clear'}:
+            _bump_cache_version(Trip.objects.filter(pk=instance.pk), instance)
+    elif action in {'post_add', 'post_remove'}:
+        _bump_cache_version(Trip.objects.filter(pk__in=pk_set))
+    elif action == 'pre_clear':  # (`pk_set` is not given when clearing)
+        _bump_cache_version(Trip.objects.filter(leaders=instance))
+
+
+@receiver(post_save, sender=Participant)
+def invalidate_trips_led(sender, instance, created, raw, update_fields, **kwargs):
+    """Leader names are shown on every trip that they've led."""
+    if created or raw:
+        return
+    if update_fields is not None and 'name' not in update_fields:
+        return
+    if instance.name != instance.saved_name:
+        _bump_cache_version(Trip.objects.filter(leaders=instance))
+
+
+@receiver(post_save, sender=LeaderRating)
+@receiver(post_delete, sender=LeaderRating)
+def invalidate_rated_leader(sender, instance, **kwargs):
+    """Leaders are shown with their rating at the time of each trip."""
+    if kwargs.get('raw'):
+        return
+    _bump_cache_version(Trip.objects.filter(leaders=instance.participant_id))
+
+
+@receiver(post_save, sender=LeaderRating)
+@receiver(post_delete, sender=LeaderRating)
+def discard_rating_timeline(sender, instance, **kwargs):
+    """Let the rated participant's instance (if loaded) see the change."""
+    if LeaderRating.participant.is_cached(instance):
+        instance.participant.__dict__.pop('rating_timeline', None)
@@ -0,0 +1,20 @@
+"""
+Keep the index of potential duplicate accounts current (see `ws.duplicates`).
+"""
+
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from ws import duplicates
+from ws.models import Participant
+
+
+@receiver(post_save, sender=Participant)
+def update_duplicate_candidates(sender, instance, raw, update_fields, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not {'name', 'cell_phone', 'email'}.intersection(
+        update_fields
+    ):
+        return
+    duplicates.update_candidates(instance)
@@ -0,0 +1,104 @@
+"""
+Discard cached message state whenever it might have changed.
+
+Message generators cache the results of their queries for each participant
+(see `ws.messages.MessageGenerator.cached_state`). Each receiver here
+invalidates the state of every participant a change might concern.
+
+Tokens are replaced with an UPDATE, so instances already in memory keep the
+old token (only the saved participant's own instance is updated).
+"""
+
+from allauth.account.models import EmailAddress
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from ws.messages import invalidate_state
+from ws.models import EmergencyContact, Feedback, LotteryInfo, Participant, SignUp, Trip
+
+
+def _leader_ids(trip_id):
+    return Trip.leaders.through.objects.filter(trip_id=trip_id).values_list(
+        'participant_id', flat=True
+    )
+
+
+@receiver(post_save, sender=Trip)
+@receiver(pre_delete, sender=Trip)  # (Before leaders are removed)
+def trip_changed(sender, instance, **kwargs):
+    """Leaders are warned about trips, participants about trips they're on."""
+    if kwargs.get('created') or kwargs.get('raw'):
+        return  # (New trips have no leaders or signups yet)
+    signed_up = SignUp.objects.filter(trip=instance).values_list(
+        'participant_id', flat=True
+    )
+    invalidate_state([*_leader_ids(instance.pk), *signed_up])
+
+
+@receiver(m2m_changed, sender=Trip.leaders.through)
+def trip_leaders_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        if action in {'post_add', 'post_remove', 'post_clear'}:
+            invalidate_state([instance.pk])
+    elif action in {'post_add', 'post_remove'}:
+        invalidate_state(pk_set)
+    elif action == 'pre_clear':  # (`pk_set` is not given when clearing)
+        invalidate_state(_leader_ids(instance.pk))
+
+
+@receiver(post_save, sender=SignUp)
+@receiver(post_delete, sender=SignUp)
+def signup_changed(sender, instance, **kwargs):
+    """Participants rank signups, and leaders give feedback on trips with signups."""
+    if kwargs.get('raw'):
+        return
+    update_fields = kwargs.get('update_fields')
+    if update_fields and not update_fields & {'on_trip', 'order', 'trip'}:
+        return  # (Other fields, like notes, are never shown in messages)
+    changed = [instance.participant_id]
+    if kwargs.get('created', True):  # (Not given when deleting)
+        changed.extend(_leader_ids(instance.trip_id))
+    invalidate_state(changed)
+
+
+@receiver(post_save, sender=Feedback)
+@receiver(post_delete, sender=Feedback)
+def feedback_changed(sender, instance, **kwargs):
+    if not kwargs.get('raw'):
+        invalidate_state([instance.leader_id])
+
+
+@receiver(post_save, sender=LotteryInfo)
+@receiver(post_delete, sender=LotteryInfo)
+def lottery_info_changed(sender, instance, **kwargs):
+    if not kwargs.get('raw'):
+        invalidate_state([instance.participant_id])
+
+
+@receiver(post_save, sender=Participant)
+def participant_changed(sender, instance, created, raw, **kwargs):
+    """Participants are warned about problems with their profile."""
+    if not (created or raw):
+        instance.message_state_token = invalidate_state([instance.pk])
+
+
+@receiver(post_save, sender=EmergencyContact)
+def emergency_contact_changed(sender, instance, created, raw, **kwargs):
+    if not (created or raw):
+        invalidate_state(
+            Participant.objects.filter(
+                emergency_info__emergency_contact=instance
+            ).values_list('pk', flat=True)
+        )
+
+
+@receiver(post_save, sender=EmailAddress)
+@receiver(post_delete, sender=EmailAddress)
+def email_address_changed(sender, instance, **kwargs):
+    """Participants must verify their primary email address."""
+    if not kwargs.get('raw'):
+        invalidate_state(
+            Participant.objects.filter(user_id=instance.user_id).values_list(
+                'pk', flat=True
+            )
+        )
@@ -3,7 +3,9 @@ Handle aspects of trip creation/modification when receiving signup changes.
 """
 
 import logging
+import uuid
 
+from django.core.cache import cache
 from django.db.models.signals import (
     m2m_changed,
     post_delete,
@@ -12,15 +14,80 @@ from django.db.models.signals import (
     pre_save,
 )
 from django.dispatch import receiver
+from django.utils import timezone
 from kombu.exceptions import OperationalError
 
 from ws import enums, tasks
 from ws.celery_config import app
-from ws.models import LeaderSignUp, SignUp, Trip, WaitList
-from ws.utils.signups import trip_or_wait, update_queues_if_trip_open
+from ws.models import LeaderSignUp, SignUp, Trip, WaitList, WaitListSignup
+from ws.utils.signups import (
+    adjust_signup_counts,
+    trip_or_wait,
+    update_queues_if_trip_open,
+)
 
 logger = logging.getLogger(__name__)
 
+# Trips closing sooner than this won't join an existing lottery batch
+MIN_SECONDS_TO_JOIN_BATCH = 60
+
+
+def _trip_of(signup):
+    """Return the signup's trip, but only if it's already been loaded."""
+    return signup.trip if SignUp.trip.is_cached(signup) else None
+
+
+# NOTE: Signup counts must be adjusted before other receivers place signups!
+# (Receivers are invoked in the order that they're registered)
+
+
+@receiver(post_save, sender=SignUp)
+def count_new_signup(sender, instance, created, raw, using, update_fields, **kwargs):
+    if created and not raw:
+        adjust_signup_counts(
+            Trip.objects.filter(pk=instance.trip_id),
+            _trip_of(instance),
+            num_signups=1,
+            num_on_trip=int(instance.on_trip),
+        )
+
+
+@receiver(post_delete, sender=SignUp)
+def count_deleted_signup(sender, instance, using, **kwargs):
+    adjust_signup_counts(
+        Trip.objects.filter(pk=instance.trip_id),
+        _trip_of(instance),
+        num_signups=-1,
+        num_on_trip=-int(instance.on_trip),
+    )
+
+
+def _waitlisted_trip_of(wl_signup):
+    if WaitListSignup.signup.is_cached(wl_signup):
+        return _trip_of(wl_signup.signup)
+    return None
+
+
+@receiver(post_save, sender=WaitListSignup)
+def count_new_waitlist_signup(
+    sender, instance, created, raw, using, update_fields, **kwargs
+):
+    if created and not raw:
+        adjust_signup_counts(
+            Trip.objects.filter(waitlist=instance.waitlist_id),
+            _waitlisted_trip_of(instance),
+            num_waitlisted=1,
+        )
+
+
+@receiver(post_delete, sender=WaitListSignup)
+def count_deleted_waitlist_signup(sender, instance, using, **kwargs):
+    adjust_signup_counts(
+        Trip.objects.filter(waitlist=instance.waitlist_id),
+        _waitlisted_trip_of(instance),
+        num_waitlisted=-1,
+    )
+
 
 @receiver(post_save, sender=SignUp)
 def new_fcfs_signup(sender, instance, created, raw, using, update_fields, **kwargs):
@@ -115,7 +182,7 @@ def revoke_existing_task(sender, instance, raw, using, update_fields, **kwargs):
     needs_revoke = new_close_time or trip.algorithm != 'lottery'
     if trip.lottery_task_id and needs_revoke:
         try:
-            app.control.revoke(trip.lottery_task_id)
+            _leave_lottery_batch(trip)
         except OperationalError:
             # Log the exception, but don't raise exceptions, preventing trip saving
             logger.error("Failed to revoke lottery task for trip %s", trip.pk)
@@ -123,9 +190,62 @@ def revoke_existing_task(sender, instance, raw, using, update_fields, **kwargs):
             instance.lottery_task_id = None
 
 
+def _lottery_batch_key(close_time) -> str:
+    return f'lottery-batch-{close_time.timestamp()}'
+
+
+def _join_lottery_batch(close_time) -> str:
+    """Return the ID of a task running every lottery closing at the given time.
+
+    Only the first trip closing at a time schedules that task; later trips
+    join it. A trip closing imminently (or in the past) gets a batch of its
+    own, since an existing batch may have already run.
+    """
+    key = _lottery_batch_key(close_time)
+    task_id = str(uuid.uuid4())
+    seconds_left = (close_time - timezone.now()).total_seconds()
+    if seconds_left > MIN_SECONDS_TO_JOIN_BATCH:
+        timeout = seconds_left - MIN_SECONDS_TO_JOIN_BATCH
+        if not cache.add(key, task_id, timeout):
+            existing_task_id = cache.get(key)
+            if existing_task_id:
+                return existing_task_id
+            cache.set(key, task_id, timeout)  # (Expired since `add()`)
+
+    window = close_time.isoformat()
+    try:
+        tasks.run_lotteries_closing_between.apply_async(
+            (window, window), eta=close_time, task_id=task_id
+        )
+    except OperationalError:
+        cache.delete(key)
+        raise
+    return task_id
+
+
+def _leave_lottery_batch(trip):
+    """Remove a trip from its lottery batch, revoking the batch if now unused.
+
+    A batch that's still used by other trips just won't include this trip
+    (each batch runs trips by their closing time when it runs).
+    """
+    others = Trip.objects.filter(lottery_task_id=trip.lottery_task_id)
+    if others.exclude(pk=trip.pk).exists():
+        return
+
+    app.control.revoke(trip.lottery_task_id)
+    if trip.signups_close_at is not None:
+        key = _lottery_batch_key(trip.signups_close_at)
+        if cache.get(key) == trip.lottery_task_id:
+            cache.delete(key)
+
+
 @receiver(post_save, sender=Trip)
 def add_lottery_task(sender, instance, created, raw, using, update_fields, **kwargs):
-    """Add a task to execute the lottery at the time the trip closes.
+    """Ensure the lottery will execute at the time the trip closes.
+
+    All trips closing at the same time share one task, which runs their
+    lotteries in independent groups (see `run_lotteries_closing_between`).
 
     If the signups close at some point in the past, this will result in the
     lottery being executed immediately.
@@ -138,9 +258,10 @@ def add_lottery_task(sender, instance, created, raw, using, update_fields, **kwa
         return  # Only new lottery trips get a new task
 
     try:
-        task_id = tasks.run_lottery.apply_async(
-            (trip.pk, None), eta=trip.signups_close_at
-        )
+        if trip.signups_close_at is None:  # (No closing time to batch by)
+            task_id = tasks.run_lottery.apply_async((trip.pk, None)).id
+        else:
+            task_id = _join_lottery_batch(trip.signups_close_at)
     except OperationalError:
         logger.error("Failed to make lottery task for trip %s", trip.pk)
     else:
@@ -153,4 +274,4 @@ def add_lottery_task(sender, instance, created, raw, using, update_fields, **kwa
 def revoke_lottery_task(sender, instance, using, **kwargs):
     """Before deleting a Trip, de-schedule the lottery task."""
     if instance.lottery_task_id:
-        app.control.revoke(instance.lottery_task_id)
+        _leave_lottery_batch(instance)
@@ -0,0 +1,25 @@
+from contextlib import ExitStack
+from typing import Dict
+
+from celery.signals import task_postrun, task_prerun
+from django.conf import settings
+
+from ws import instrumentation
+
+# Tasks are profiled from just before they start until they finish
+_task_profiles: Dict[str, ExitStack] = {}
+
+
+@task_prerun.connect
+def start_task_profile(task_id, task, **kwargs):
+    if settings.INSTRUMENTATION_ENABLED:
+        stack = ExitStack()
+        stack.enter_context(instrumentation.profile(f'task {task.name}'))
+        _task_profiles[task_id] = stack
+
+
+@task_postrun.connect
+def finish_task_profile(task_id, **kwargs):
+    stack = _task_profiles.pop(task_id, None)
+    if stack:
+        stack.close()
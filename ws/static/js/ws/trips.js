@@ -1,22 +1,15 @@
 angular.module('ws.trips', [])
-.controller('tripTabManager', function($scope, $window) {
+.controller('tripTabManager', function($scope, $http) {
   $scope.$on('tripModified', function() {
     $scope.stale = true;
   });
 
   /**
-   * Hack: just reload the page, this time telling Django we want a rental table.
-   *
-   * The reason that we control this via a GET argument is so that:
-   *
-   * 1. Leaders can quickly view trips without waiting for the rentals API call.
-   * 2. If the API call fails for any reason, the page won't crash.
-   * 3. We can render a full table
-   *
-   * The proper fix is to build a FE component which does
+   * Rentals are rendered from a local cache; ask for any stale rentals to be refreshed.
    */
-  $scope.inlineRentals = function(tripId) {
-    $scope.reloading = true;
-    $window.location.assign('/trips/' + tripId + '?show_rentals_inline=1');
-  }
+  $scope.refreshRentals = function(tripId) {
+    $http.get('/trips/' + tripId + '/rentals.json').then(function(resp) {
+      $scope.rentalsRefreshing = resp.data.refreshing;
+    });
+  };
 });
@@ -3,17 +3,24 @@ import logging
 from contextlib import contextmanager
 from datetime import timedelta
 from functools import wraps
+from typing import List, Optional
 
 from celery import group, shared_task
 from celery.five import monotonic  # pylint: disable=no-name-in-module
 from django.core.cache import cache
+from django.utils.dateparse import parse_datetime
 
-from ws import cleanup, models, settings
+from ws import cleanup, enums, models, privacy, settings
 from ws.email.sole import send_email_to_funds
 from ws.email.trips import send_trips_summary
-from ws.lottery.run import SingleTripLotteryRunner, WinterSchoolLotteryRunner
+from ws.lottery.run import (
+    InMemoryWinterSchoolLotteryRunner,
+    SingleTripLotteryRunner,
+    WinterSchoolLotteryRunner,
+    independent_trip_groups,
+)
 from ws.utils import dates as date_utils
-from ws.utils import geardb, member_sheets
+from ws.utils import geardb, member_sheets, member_stats, membership, rentals
 
 logger = logging.getLogger(__name__)
 
@@ -103,7 +110,8 @@ def update_discount_sheet_for_participant(discount_id: int, participant_id: int)
         )
         return
 
-    member_sheets.update_participant(discount, participant)
+    report = member_sheets.update_participant(discount, participant)
+    logger.info("Synced %s to '%s': %s", participant.name, discount.name, report)
 
 
 @mutex_task('update_discount-{discount_id}')
@@ -131,7 +139,8 @@ def update_discount_sheet(discount_id):
         )
         return
 
-    member_sheets.update_discount_sheet(discount)
+    report = member_sheets.update_discount_sheet(discount)
+    logger.info("Synced the discount sheet for '%s': %s", discount.name, report)
 
 
 @mutex_task()
@@ -177,7 +186,10 @@ def send_sole_itineraries():
 @mutex_task()
 def run_ws_lottery():
     logger.info("Commencing Winter School lottery run")
-    runner = WinterSchoolLotteryRunner()
+    if settings.WS_LOTTERY_IN_MEMORY:
+        runner = InMemoryWinterSchoolLotteryRunner()
+    else:
+        runner = WinterSchoolLotteryRunner()
     runner()
 
 
@@ -188,6 +200,54 @@ def purge_non_student_discounts():
     cleanup.purge_non_student_discounts()
 
 
+@mutex_task()
+def refresh_all_membership_cache():
+    """Refresh stale membership caches (in bulk) from the gear database."""
+    logger.info("Refreshing stale membership caches")
+    membership.refresh_all_membership_cache()
+
+
+@mutex_task()
+def refresh_upcoming_rentals():
+    """Cache rentals (in bulk) for everybody on an upcoming trip."""
+    logger.info("Refreshing cached rentals for upcoming trips")
+    num_refreshed = rentals.refresh_upcoming_rentals()
+    logger.info("Refreshed cached rentals for %d participants", num_refreshed)
+
+
+@shared_task  # Harmless if we run it twice
+def refresh_rentals(participant_ids: List[int]):
+    """Refresh cached rentals for the given participants (in one API call)."""
+    rentals.refresh_rentals(participant_ids)
+
+
+@mutex_task()
+def refresh_member_stats():
+    """Recompute statistics about every current member (for `/stats`)."""
+    logger.info("Refreshing member statistics")
+    summary = member_stats.refresh_member_stats()
+    logger.info(
+        "Member stats: %d created, %d updated, %d deleted",
+        summary.created,
+        summary.updated,
+        summary.deleted,
+    )
+
+
+@shared_task  # Harmless if we run it twice (the same file is rewritten)
+def export_privacy_data(
+    path: str,
+    export_format: str = 'ndjson',
+    participant_ids: Optional[List[int]] = None,
+):
+    """Export participant data (for data requests & audits) to a file."""
+    logger.info("Exporting participant data to %s", path)
+    with open(path, 'wb') as export_file:
+        num_exported = privacy.export(export_file, export_format, participant_ids)
+    logger.info("Exported data for %d participants", num_exported)
+    return num_exported
+
+
 @mutex_task()
 def purge_old_medical_data():
     """Purge old, dated medical information."""
@@ -206,3 +266,49 @@ def run_lottery(trip_id, lottery_config=None):
     trip = models.Trip.objects.get(pk=trip_id)
     runner = SingleTripLotteryRunner(trip)
     runner()
+
+
+@shared_task  # Each trip is locked individually (and its lottery is idempotent)
+def run_lottery_group(trip_ids: List[int]):
+    """Run single-trip lotteries, one after the other, in the given order.
+
+    Trips in a group share participants, so they're run sequentially.
+    Each trip takes the same lock as `run_lottery`, so a trip is never
+    processed by both at once.
+    """
+    for trip_id in trip_ids:
+        with exclusive_lock(f'single_trip_lottery-{trip_id}') as has_lock:
+            if not has_lock:
+                logger.debug("Other worker already running lottery for %d", trip_id)
+                continue
+            logger.info("Running lottery for trip #%d", trip_id)
+            SingleTripLotteryRunner(models.Trip.objects.get(pk=trip_id))()
+
+
+@mutex_task('lotteries_closing_between-{start}-{end}')
+def run_lotteries_closing_between(start: str, end: str):
+    """Run the lottery for every (non-WS) trip with signups closing in a window.
+
+    Trips are split into groups that share no participants, and each group
+    is run as its own task (so independent groups run concurrently across the
+    worker pool). Datetimes are ISO 8601 strings, since tasks are JSON-serialized.
+
+    This is scheduled once for each distinct closing time (see `add_lottery_task`).
+    """
+    start_datetime, end_datetime = parse_datetime(start), parse_datetime(end)
+    if start_datetime is None or end_datetime is None:
+        raise ValueError(f"Invalid lottery window: {start} to {end}")
+
+    trips = models.Trip.objects.filter(
+        algorithm='lottery',
+        signups_close_at__gte=start_datetime,
+        signups_close_at__lte=end_datetime,
+    ).exclude(program=enums.Program.WINTER_SCHOOL.value)
+
+    trip_groups = independent_trip_groups(trips.values_list('pk', flat=True))
+    logger.info(
+        "Running lotteries for %d trips in %d groups",
+        sum(len(trip_ids) for trip_ids in trip_groups),
+        len(trip_groups),
+    )
+    group([run_lottery_group.s(trip_ids) for trip_ids in trip_groups])()
@@ -14,10 +14,7 @@ def _conditional_rendering(trip):
 
 @register.inclusion_tag('for_templatetags/email/upcoming_trip_summary.txt')
 def upcoming_trip_summary_txt(trip):
-    """Summarize an upcoming trip in textual format.
-
-    Trip should be annotated to have `signups_on_trip`
-    """
+    """Summarize an upcoming trip in textual format."""
     return {
         'trip': trip,
         'underline_trip_name': '=' * len(trip.name),
@@ -27,8 +24,5 @@ def upcoming_trip_summary_txt(trip):
 
 @register.inclusion_tag('for_templatetags/email/upcoming_trip_summary.html')
 def upcoming_trip_summary_html(trip):
-    """Summarize an upcoming trip in HTML format.
-
-    Trip should be annotated to have `signups_on_trip`
-    """
+    """Summarize an upcoming trip in HTML format."""
     return {'trip': trip, **_conditional_rendering(trip)}
@@ -4,7 +4,9 @@ register = template.Library()
 
 
 @register.inclusion_tag('for_templatetags/trip_rental_table.html')
-def trip_rental_table(trip, leader_on_trip, items_by_par, show_serial=False):
+def trip_rental_table(
+    trip, leader_on_trip, items_by_par, show_serial=False, last_cached=None
+):
     """Display a table of all items rented by participants."""
 
     # Enforce items are only those rented before the trip itself
@@ -19,4 +21,5 @@ def trip_rental_table(trip, leader_on_trip, items_by_par, show_serial=False):
         'leader_on_trip': leader_on_trip,
         'items_by_par': items_by_par,  # List of tuples: (Participant, items)
         'show_serial': show_serial,
+        'last_cached': last_cached,  # When rentals were copied from the gear database
     }
@@ -1,7 +1,12 @@
+import hashlib
 from datetime import timedelta
+from typing import List, Tuple
 
 from django import template
-from django.db.models import Case, Count, IntegerField, Sum, When
+from django.core.cache import cache
+from django.db.models import QuerySet
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
 
 import ws.utils.dates as date_utils
 import ws.utils.perms as perm_utils
@@ -10,6 +15,9 @@ from ws import icons, models
 
 register = template.Library()
 
+# Rows are keyed by trip version, so this just bounds the life of unused rows
+ROW_CACHE_TIMEOUT = 60 * 60 * 24
+
 
 @register.simple_tag
 def trip_icon(trip):
@@ -17,17 +25,70 @@ def trip_icon(trip):
 
 
 def annotated_for_trip_list(trips):
-    """Modify a trips queryset to have annotated fields used in tags."""
+    """Prepare a trips queryset for use in trip list tags."""
     # Each trip will need information about its leaders, so prefetch models
-    trips = trips.prefetch_related('leaders', 'leaders__leaderrating_set')
+    # (Signup counts are denormalized onto the trip, no need to annotate)
+    return trips.prefetch_related('leaders', 'leaders__leaderrating_set')
 
-    # Django 2.0: Use conditional aggregation instead!
-    signup_on_trip = Case(
-        When(signup__on_trip=True, then=1), default=0, output_field=IntegerField()
-    )
-    return trips.annotate(
-        num_signups=Count('signup'), signups_on_trip=Sum(signup_on_trip)
+
+def _trip_versions(trips) -> List[Tuple[int, int]]:
+    """Return the primary key & cache version of each trip, in order.
+
+    Trips are never loaded from a queryset, only their versions.
+    """
+    if isinstance(trips, QuerySet):
+        return list(trips.prefetch_related(None).values_list('pk', 'cache_version'))
+    return [(trip.pk, trip.cache_version) for trip in trips]
+
+
+def rendered_rows(trips, row_template: str, **context) -> str:
+    """Render a row for each trip, touching the database only for changed trips.
+
+    Each rendered row is cached under the trip's version (which signals bump
+    whenever anything shown in the row changes), as is the whole list of rows.
+    Repeat renders of an unchanged list need just one query for trip versions.
+
+    Given a list of trips (rather than a queryset), rows are rendered from
+    those trips without any further queries for trip versions.
+    """
+    today = date_utils.local_date()  # (Rows describe dates relative to today)
+    variant = ':'.join(
+        [row_template, today.isoformat()]
+        + [f'{key}={value}' for key, value in sorted(context.items())]
     )
+    context['today'] = today
+
+    versions = _trip_versions(trips)
+    digest = hashlib.sha1(f'{variant}|{versions}'.encode()).hexdigest()
+    list_key = f'trip-list:{digest}'
+    html = cache.get(list_key)
+    if html is not None:
+        return mark_safe(html)
+
+    row_keys = {pk: f'trip-row:{variant}:{pk}:{version}' for pk, version in versions}
+    cached = cache.get_many(row_keys.values())
+    missing = {pk for pk, key in row_keys.items() if key not in cached}
+    if missing:
+        if isinstance(trips, QuerySet):
+            to_render = annotated_for_trip_list(
+                models.Trip.objects.filter(pk__in=missing).select_related('info')
+            )
+        else:
+            to_render = [trip for trip in trips if trip.pk in missing]
+        # Leaders are shown with ratings, and often lead many of the trips
+        models.Participant.load_rating_timelines(
+            leader for trip in to_render for leader in trip.leaders.all()
+        )
+        rendered = {
+            row_keys[trip.pk]: render_to_string(row_template, {**context, 'trip': trip})
+            for trip in to_render
+        }
+        cache.set_many(rendered, ROW_CACHE_TIMEOUT)
+        cached.update(rendered)
+
+    html = ''.join(cached[row_keys[pk]] for pk, _ in versions)
+    cache.set(list_key, html, ROW_CACHE_TIMEOUT)
+    return mark_safe(html)
 
 
 @register.inclusion_tag('for_templatetags/simple_trip_list.html')
@@ -35,17 +96,27 @@ def simple_trip_list(
     trip_list, max_title_chars=45, max_description_chars=120, collapse_date=False
 ):
     return {
-        'today': date_utils.local_date(),
-        'trip_list': trip_list,
-        'max_title_chars': max_title_chars,
-        'max_description_chars': max_description_chars,
+        'rows': rendered_rows(
+            trip_list,
+            'for_templatetags/simple_trip_list_row.html',
+            max_title_chars=max_title_chars,
+            max_description_chars=max_description_chars,
+            collapse_date=collapse_date,
+        ),
         'collapse_date': collapse_date,
     }
 
 
 @register.inclusion_tag('for_templatetags/trip_list_table.html')
 def trip_list_table(trip_list, approve_mode=False):
-    return {'trip_list': trip_list, 'approve_mode': approve_mode}
+    return {
+        'rows': rendered_rows(
+            trip_list,
+            'for_templatetags/trip_list_table_row.html',
+            approve_mode=approve_mode,
+        ),
+        'approve_mode': approve_mode,
+    }
 
 
 @register.inclusion_tag('for_templatetags/feedback_table.html')
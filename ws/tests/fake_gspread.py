@@ -0,0 +1,87 @@
+"""A minimal, in-memory stand-in for the parts of gspread that we use.
+
+Every method which would make a request to the Sheets API is counted, so
+tests can make assertions about just how many requests were needed.
+"""
+from typing import Dict, List
+
+from gspread.utils import a1_to_rowcol
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet, rows: int = 1000, cols: int = 26):
+        self.spreadsheet = spreadsheet
+        self.id = 0
+        self.title = 'Sheet1'
+        self.cells: List[List[str]] = [[''] * cols for _ in range(rows)]
+
+    @property
+    def row_count(self) -> int:
+        return len(self.cells)
+
+    @property
+    def col_count(self) -> int:
+        return len(self.cells[0]) if self.cells else 0
+
+    def batch_update(self, data: List[dict], value_input_option='RAW'):
+        assert value_input_option == 'RAW'
+        self.spreadsheet.api_calls += 1
+
+        for value_range in data:
+            first, last = value_range['range'].split(':')
+            row1, col1 = a1_to_rowcol(first)
+            row2, col2 = a1_to_rowcol(last)
+            values = value_range['values']
+            if row2 > self.row_count or col2 > self.col_count:
+                raise ValueError(f"Range {value_range['range']} exceeds grid limits")
+            assert len(values) == row2 - row1 + 1
+            for row, row_values in zip(range(row1 - 1, row2), values):
+                assert len(row_values) == col2 - col1 + 1
+                self.cells[row][col1 - 1 : col2] = row_values
+
+    def resize(self, rows: int, cols: int):
+        self.cells = [
+            (row + [''] * cols)[:cols] for row in (self.cells + [[]] * rows)[:rows]
+        ]
+
+
+class FakeSpreadsheet:
+    def __init__(self, **kwargs):
+        self.api_calls = 0
+        self.sheet1 = FakeWorksheet(self, **kwargs)
+
+    def _empty_rows(self, num: int) -> List[List[str]]:
+        return [[''] * self.sheet1.col_count for _ in range(num)]
+
+    def batch_update(self, body: dict):
+        self.api_calls += 1
+        wks = self.sheet1
+
+        for request in body['requests']:
+            ((kind, params),) = request.items()
+            if kind == 'updateSheetProperties':
+                grid = params['properties']['gridProperties']
+                wks.resize(grid['rowCount'], grid['columnCount'])
+            elif kind == 'appendDimension':
+                assert params['dimension'] == 'ROWS'
+                wks.cells.extend(self._empty_rows(params['length']))
+            elif kind == 'insertDimension':
+                start, end = params['range']['startIndex'], params['range']['endIndex']
+                if start >= wks.row_count:
+                    raise ValueError("Can't insert rows past the end of the sheet")
+                wks.cells[start:start] = self._empty_rows(end - start)
+            elif kind == 'deleteDimension':
+                start, end = params['range']['startIndex'], params['range']['endIndex']
+                if end > wks.row_count or end - start == wks.row_count:
+                    raise ValueError("Invalid deletion")
+                del wks.cells[start:end]
+            else:
+                raise NotImplementedError(kind)
+
+
+class FakeClient:
+    def __init__(self):
+        self.spreadsheets: Dict[str, FakeSpreadsheet] = {}
+
+    def open_by_key(self, key: str) -> FakeSpreadsheet:
+        return self.spreadsheets.setdefault(key, FakeSpreadsheet())
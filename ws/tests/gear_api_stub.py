@@ -0,0 +1,99 @@
+"""A local HTTP server which behaves like the API on mitoc-gear.mit.edu.
+
+Results are paginated just like Django REST Framework does, so that clients
+must follow `next` links to get every result.
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from typing import Any, Callable, Dict, List
+from urllib.parse import parse_qs, urlencode, urlparse
+
+JsonDict = Dict[str, Any]
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class GearAPIStub:
+    """Serve canned results for each route, optionally failing some requests.
+
+    Each route maps to a function taking the (multi-valued) query params, and
+    returning every result that the real API would report.
+
+        with GearAPIStub({'rentals/': lambda params: [...]}) as stub:
+            client = GearAPIClient(stub.base_url)
+    """
+
+    def __init__(
+        self,
+        routes: Dict[str, Callable[[Dict[str, List[str]]], List[JsonDict]]],
+        page_size: int = 10,
+    ):
+        self.routes = routes
+        self.page_size = page_size
+        self.requests: List[str] = []  # Path & query string of each request
+        self.fail_next = 0  # Respond to this many requests with a 503
+        self._lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):  # pylint: disable=invalid-name
+                status, body = stub.respond(self.path)
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(json.dumps(body).encode())
+
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                pass
+
+        self.server = _ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        host, port = self.server.server_address
+        self.base_url = f'http://{host}:{port}/'
+
+    def respond(self, path: str):
+        with self._lock:
+            self.requests.append(path)
+            if self.fail_next:
+                self.fail_next -= 1
+                return 503, {}
+
+        url = urlparse(path)
+        params = parse_qs(url.query)
+        route = url.path.lstrip('/')
+        if route not in self.routes:
+            return 404, {}
+
+        results = self.routes[route](params)
+        page = int(params.pop('page', ['1'])[0])
+        start = (page - 1) * self.page_size
+        next_page = None
+        if start + self.page_size < len(results):
+            next_params: Dict[str, List[str]] = {**params, 'page': [str(page + 1)]}
+            query = urlencode(next_params, doseq=True)
+            next_page = f'{self.base_url}{route}?{query}'
+        return (
+            200,
+            {
+                'count': len(results),
+                'next': next_page,
+                'previous': None,
+                'results': results[start : start + self.page_size],
+            },
+        )
+
+    def __enter__(self):
+        threading.Thread(
+            target=self.server.serve_forever,
+            kwargs={'poll_interval': 0.01},  # (So that shutting down is quick)
+            daemon=True,
+        ).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
@@ -307,3 +307,79 @@ class GraphTests(TestCase):
 
         for par in all_pars:
             self.assertFalse(graph.isolated_cycles(par))
+
+
+class ComponentTests(TestCase):
+    @staticmethod
+    def _graph_with_blocks(names, blocks):
+        pars = {name: factories.ParticipantFactory.create(name=name) for name in names}
+        for initiator, recipient in blocks:
+            factories.LotterySeparationFactory.create(
+                creator=pars[initiator],
+                initiator=pars[initiator],
+                recipient=pars[recipient],
+            )
+        return graphs.SeparationGraph(pars.values()), pars
+
+    def test_tree_has_only_trivial_components(self):
+        graph, pars = self._graph_with_blocks("ABCD", ["AB", "BC", "BD"])
+        components = graph.strongly_connected_components()
+        self.assertCountEqual(components, [[par] for par in pars.values()])
+        # Nobody blocks anybody in a later component
+        self.assertEqual(components[-1], [pars['A']])
+        self.assertEqual(graph.deadlocked_cycles(), [])
+
+    def test_multiple_cycles_one_component(self):
+        graph, pars = self._graph_with_blocks(
+            "ABCDE", ["AB", "BC", "CD", "DE", "EA", "EC"]
+        )
+        components = graph.strongly_connected_components()
+        self.assertEqual(len(components), 1)
+        self.assertCountEqual(components[0], pars.values())
+
+        cycles = graph.deadlocked_cycles()
+        self.assertEqual(len(cycles), 1)
+        cycle = cycles[0]
+        self.assertIn(
+            cycle,
+            [
+                graphs.Cycle([pars[name] for name in "ABCDE"]),
+                graphs.Cycle([pars[name] for name in "CDE"]),
+            ],
+        )
+
+    def test_cycle_with_terminus_is_not_deadlocked(self):
+        graph, pars = self._graph_with_blocks("ABCD", ["AB", "BC", "BD", "CA"])
+        self.assertEqual(graph.deadlocked_cycles(), [])
+
+        graph.remove(pars['D'])
+        a, b, c = (pars[name] for name in "ABC")
+        self.assertEqual(graph.deadlocked_cycles(), [graphs.Cycle([a, b, c])])
+
+    def test_waiting_on_another_cycle(self):
+        """Only the cycle that blocks nobody else must be broken first.
+
+        A <---> B ---> C <---> D
+        """
+        graph, pars = self._graph_with_blocks("ABCD", ["AB", "BA", "BC", "CD", "DC"])
+        self.assertEqual(len(graph.strongly_connected_components()), 2)
+        self.assertEqual(
+            graph.deadlocked_cycles(), [graphs.Cycle([pars['C'], pars['D']])]
+        )
+
+        graph.remove(pars['C'])
+        self.assertEqual(
+            graph.deadlocked_cycles(), [graphs.Cycle([pars['A'], pars['B']])]
+        )
+
+    def test_removal_drops_participants_blocking_nobody(self):
+        graph, pars = self._graph_with_blocks("ABC", ["AC", "BC", "BA"])
+        graph.remove(pars['C'])
+        self.assertEqual(graph.current_graph, {pars['B']: {pars['A']}})
+        graph.remove(pars['A'])
+        self.assertTrue(graph.empty)
+
+    def test_graph_loaded_in_one_query(self):
+        pars = factories.ParticipantFactory.create_batch(3)
+        with self.assertNumQueries(1):
+            graphs.SeparationGraph(pars)
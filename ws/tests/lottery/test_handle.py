@@ -443,9 +443,11 @@ class WinterSchoolPlacementTests(TestCase, Helpers):
         # Driver gets the trip, bumps one of the two.
         self._place_participant(driver)
         self._assert_on_trip(driver, preferred_trip)
+        preferred_trip.refresh_from_db()
         self.assertFalse(preferred_trip.open_slots)
 
         # Though there's room on the second trip, we chose to keep them together
+        second_trip.refresh_from_db()
         self.assertTrue(second_trip.open_slots)
         waitlisted_signup = preferred_trip.waitlist.signups.get()
         self.assertIn(waitlisted_signup.participant, [one, two])
@@ -149,6 +149,37 @@ class SeedTests(unittest.TestCase):
             random.random(), rank.affiliation_weighted_rand(non_affiliate, 'trip-142')
         )
 
+    def test_global_random_state_untouched(self):
+        """Drawing numbers for the lottery does not reseed `random` for others."""
+        state = random.getstate()
+        rank.affiliation_weighted_rand(models.Participant(pk=3, affiliation='NA'), 'x')
+        self.assertEqual(state, random.getstate())
+
+    def test_batch_draws(self):
+        """Drawing numbers in batch gives the same results as one at a time."""
+        participants = [
+            models.Participant(pk=pk, affiliation=aff)
+            for pk, aff in [(1, 'MU'), (2, 'NA'), (3, 'MG'), (4, 'ML')]
+        ]
+        self.assertEqual(
+            rank.affiliation_weighted_rands(participants, 'ws-2020-01-15'),
+            {
+                par.pk: rank.affiliation_weighted_rand(par, 'ws-2020-01-15')
+                for par in participants
+            },
+        )
+
+    def test_draws_cached_per_ranker(self):
+        """Repeated lookups (e.g. when bumping for drivers) are not redrawn."""
+        ranker = rank.SingleTripParticipantRanker(models.Trip(pk=8))
+        participant = models.Participant(pk=3, affiliation='NA')
+        with patch.object(
+            rank, 'affiliation_weighted_rand', wraps=rank.affiliation_weighted_rand
+        ) as draw:
+            first = ranker.priority_key(participant)
+            self.assertEqual(first, ranker.priority_key(participant))
+        draw.assert_called_once_with(participant, 'trip-8')
+
 
 class ParticipantRankingTests(SimpleTestCase):
     """Test the logic by which we determine users with "first pick" status."""
@@ -416,3 +447,64 @@ class FlakeFactorTests(TestCase):
             rank.TripCounts(attended=0, flaked=1, total=1),
         )
         self.assertEqual(5, self.ranker.flake_factor(self.participant))
+
+
+@freeze_time("Wed, 24 Jan 2018 09:00:00 EST")
+class BulkTripCountsTests(TestCase):
+    """Counts loaded for all participants at once match individual queries."""
+
+    def setUp(self):
+        def ws_trip(trip_date, **kwargs):
+            return TripFactory.create(
+                program=enums.Program.WINTER_SCHOOL.value, trip_date=trip_date, **kwargs
+            )
+
+        upcoming = ws_trip(date(2018, 1, 27), algorithm='lottery')
+        past_trips = [ws_trip(date(2018, 1, 13)), ws_trip(date(2018, 1, 14))]
+        long_ago = ws_trip(date(2016, 1, 16))
+
+        self.flaker, self.leader, self.newbie = ParticipantFactory.create_batch(3)
+        for par in [self.flaker, self.leader, self.newbie]:
+            SignUpFactory.create(participant=par, trip=upcoming)
+
+        SignUpFactory.create(participant=self.flaker, trip=past_trips[0], on_trip=True)
+        FeedbackFactory.create(
+            participant=self.flaker, trip=past_trips[0], showed_up=False
+        )
+        FeedbackFactory.create(
+            participant=self.flaker, trip=past_trips[1], showed_up=False
+        )
+        # Feedback from long ago is ignored
+        FeedbackFactory.create(participant=self.newbie, trip=long_ago, showed_up=False)
+
+        SignUpFactory.create(participant=self.leader, trip=past_trips[1], on_trip=True)
+        for trip in past_trips:
+            trip.leaders.add(self.leader)
+        TripFactory.create(trip_date=date(2017, 11, 4)).leaders.add(self.leader)
+        long_ago.leaders.add(self.leader)
+
+    def test_bulk_counts_match(self):
+        individual = rank.WinterSchoolParticipantRanker()
+        bulk = rank.WinterSchoolParticipantRanker()
+        bulk.load_trip_counts()
+
+        for par in [self.flaker, self.leader, self.newbie]:
+            self.assertEqual(bulk.number_ws_trips(par), individual.number_ws_trips(par))
+            self.assertEqual(
+                bulk.number_trips_led(par), individual.number_trips_led(par)
+            )
+            self.assertEqual(bulk.priority_key(par), individual.priority_key(par))
+
+        self.assertEqual(
+            bulk.number_ws_trips(self.flaker),
+            rank.TripCounts(attended=0, flaked=2, total=2),
+        )
+        self.assertEqual(bulk.number_trips_led(self.leader), 3)
+        self.assertEqual(bulk.trips_led_balance(self.leader), 2)
+
+    def test_ranking_takes_constant_queries(self):
+        ranker = rank.WinterSchoolParticipantRanker()
+        # Participant pks, three aggregates, adjustments, then the participants
+        with self.assertNumQueries(6):
+            ranked = [par for par, _key in ranker]
+        self.assertCountEqual(ranked, [self.flaker, self.leader, self.newbie])
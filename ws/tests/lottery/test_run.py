@@ -121,6 +121,39 @@ class SingleTripLotteryTests(TestCase):
         self.assertTrue(bob.waitlistsignup)
 
 
+class IndependentTripGroupsTests(TestCase):
+    def test_no_trips(self):
+        self.assertEqual(run.independent_trip_groups([]), [])
+
+    def test_groups_share_no_participants(self):
+        one, two, three, four, five = factories.TripFactory.create_batch(5)
+        alice, bob, charles = factories.ParticipantFactory.create_batch(3)
+
+        # Alice links trips one & three, Bob links three & five
+        for par, trip in [(alice, one), (alice, three), (bob, three), (bob, five)]:
+            factories.SignUpFactory.create(participant=par, trip=trip)
+        # Charles is only on trip two, and nobody signed up for trip four
+        factories.SignUpFactory.create(participant=charles, trip=two)
+
+        self.assertEqual(
+            run.independent_trip_groups(
+                [five, four, three, two, one][i].pk for i in range(5)
+            ),
+            [[one.pk, three.pk, five.pk], [two.pk], [four.pk]],
+        )
+
+    def test_only_given_trips_considered(self):
+        """Signups on other trips do not link trips together."""
+        one, two, other = factories.TripFactory.create_batch(3)
+        par = factories.ParticipantFactory.create()
+        factories.SignUpFactory.create(participant=par, trip=one)
+        factories.SignUpFactory.create(participant=par, trip=other)
+
+        self.assertEqual(
+            run.independent_trip_groups([one.pk, two.pk]), [[one.pk], [two.pk]]
+        )
+
+
 @freeze_time("2020-01-15 09:00:00 EST")
 class WinterSchoolLotteryTests(TestCase):
     @staticmethod
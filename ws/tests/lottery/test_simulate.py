@@ -0,0 +1,74 @@
+from datetime import date
+from io import StringIO
+
+from django.core.management import call_command
+from freezegun import freeze_time
+
+from ws import models
+from ws.lottery import simulate, synthetic
+from ws.tests import TestCase
+from ws.utils.dates import local_now
+
+
+@freeze_time("2020-01-15 09:00:00 EST")
+class SimulateTests(TestCase):
+    def test_synthetic_week(self):
+        trips = synthetic.make_ws_week(40, date(2020, 1, 15), seed='test')
+
+        self.assertEqual(len(trips), 5)
+        self.assertEqual(
+            {trip.trip_date for trip in trips} - {date(2020, 1, 18), date(2020, 1, 19)},
+            set(),
+        )
+        self.assertTrue(models.SignUp.objects.filter(trip__in=trips).exists())
+        self.assertTrue(models.Feedback.objects.filter(showed_up=False).exists())
+        self.assertTrue(models.LotteryInfo.objects.exclude(paired_with=None).exists())
+
+    def test_synthetic_week_reproducible(self):
+        def week_shape(seed):
+            trips = synthetic.make_ws_week(30, date(2020, 1, 15), seed=seed)
+            return [
+                (
+                    trip.trip_date,
+                    trip.maximum_participants,
+                    sorted(trip.signup_set.values_list('order', flat=True)),
+                )
+                for trip in trips
+            ]
+
+        self.assertEqual(week_shape('same'), week_shape('same'))
+        self.assertNotEqual(week_shape('same'), week_shape('different'))
+
+    def test_engines_agree_and_roll_back(self):
+        trips = synthetic.make_ws_week(40, date(2020, 1, 15))
+
+        db_report = simulate.simulate_ws_lottery(local_now())
+        mem_report = simulate.simulate_ws_lottery(local_now(), in_memory=True)
+
+        self.assertEqual(db_report.num_participants, mem_report.num_participants)
+        self.assertEqual(db_report.placements, mem_report.placements)
+        self.assertEqual(db_report.waitlists, mem_report.waitlists)
+        self.assertGreater(db_report.num_placed, 0)
+        self.assertIn("Handling", db_report.log)
+
+        self.assertEqual(set(db_report.phases), {'rank', 'place'})
+        self.assertEqual(set(mem_report.phases), {'load', 'rank', 'place', 'save'})
+        # (The only query is to count participants, for the log)
+        self.assertEqual(mem_report.phases['place'].num_queries, 1)
+        self.assertLess(mem_report.num_queries, db_report.num_queries)
+
+        # Nothing was actually changed!
+        self.assertFalse(models.SignUp.objects.filter(trip__in=trips, on_trip=True))
+        self.assertFalse(models.WaitListSignup.objects.exists())
+
+    def test_command(self):
+        stdout = StringIO()
+        call_command(
+            'simulate_ws_lottery', participants=25, in_memory=True, stdout=stdout
+        )
+        output = stdout.getvalue()
+        self.assertIn("Participants: ", output)
+        self.assertIn("All changes were rolled back.", output)
+
+        # Even the synthetic data is discarded
+        self.assertFalse(models.Trip.objects.exists())
@@ -0,0 +1,166 @@
+import io
+import logging
+import random
+from datetime import date
+
+from django.db import transaction
+from django.db.models import F
+from django.test import SimpleTestCase
+from freezegun import freeze_time
+
+from ws import enums, models
+from ws.lottery import run, snapshot
+from ws.tests import TestCase, factories
+
+
+class Rollback(Exception):
+    pass
+
+
+@freeze_time("2020-01-15 09:00:00 EST")
+class InMemoryParityTests(TestCase):
+    """The in-memory engine must place participants exactly as the ORM engine does."""
+
+    @staticmethod
+    def _ws_trip(**kwargs):
+        return factories.TripFactory.create(
+            algorithm='lottery', program=enums.Program.WINTER_SCHOOL.value, **kwargs
+        )
+
+    def _make_week(self, seed):
+        rand = random.Random(seed)
+
+        trips = [
+            self._ws_trip(
+                name=f"Trip {i}",
+                maximum_participants=rand.randint(2, 5),
+                trip_date=rand.choice([date(2020, 1, 18), date(2020, 1, 19)]),
+            )
+            for i in range(6)
+        ]
+        for trip in rand.sample(trips, 3):
+            leader = factories.ParticipantFactory.create()
+            factories.LotteryInfoFactory.create(
+                participant=leader, car_status=rand.choice(['own', 'none'])
+            )
+            trip.leaders.add(leader)
+
+        participants = []
+        for i in range(30):
+            par = factories.ParticipantFactory.create(
+                name=f"Participant {i}",
+                affiliation=rand.choice(['MU', 'MG', 'MA', 'NA', 'NU']),
+            )
+            car_status = rand.choice([None, 'none', 'none', 'own', 'rent'])
+            if car_status:
+                factories.LotteryInfoFactory.create(
+                    participant=par, car_status=car_status
+                )
+            participants.append(par)
+
+        # Some participants pair up (one of whom ranked no trips at all)
+        for one, two in [(0, 1), (2, 3), (4, 5), (6, 30)]:
+            par_one = participants[one]
+            par_two = (
+                participants[two]
+                if two < len(participants)
+                else factories.ParticipantFactory.create(name="Unsigned Partner")
+            )
+            for par, other in [(par_one, par_two), (par_two, par_one)]:
+                models.LotteryInfo.objects.update_or_create(
+                    participant=par, defaults={'paired_with': other}
+                )
+
+        for par in participants:
+            num_ranked = rand.randint(0, 4)
+            for order, trip in enumerate(rand.sample(trips, num_ranked), start=1):
+                factories.SignUpFactory.create(participant=par, trip=trip, order=order)
+
+        for par in rand.sample(participants, 2):
+            factories.LotteryAdjustmentFactory.create(participant=par, adjustment=-1)
+
+        return trips
+
+    @staticmethod
+    def _final_state(trips):
+        on_trip = dict(
+            models.SignUp.objects.filter(trip__in=trips).values_list('pk', 'on_trip')
+        )
+        # Time is frozen, so break ties in `time_created` by order of creation
+        waitlists = {
+            trip.pk: list(
+                models.WaitListSignup.objects.filter(waitlist__trip=trip)
+                .order_by(F('manual_order').desc(nulls_last=True), 'pk')
+                .values_list('signup_id', 'manual_order')
+            )
+            for trip in trips
+        }
+        return on_trip, waitlists
+
+    def _run(self, runner_class, trips):
+        """Run the lottery, returning results & logs (then undo all changes)."""
+        runner = runner_class()
+        log_stream = io.StringIO()
+        runner.logger.addHandler(logging.StreamHandler(stream=log_stream))
+
+        try:
+            with transaction.atomic():
+                runner.assign_trips()
+                results = self._final_state(trips)
+                raise Rollback
+        except Rollback:
+            pass
+        return results, log_stream.getvalue()
+
+    def test_identical_results(self):
+        for seed in ['first week', 'second week', 'third week']:
+            with self.subTest(seed=seed), transaction.atomic():
+                trips = self._make_week(seed)
+
+                db_results, db_log = self._run(run.WinterSchoolLotteryRunner, trips)
+                mem_results, mem_log = self._run(
+                    run.InMemoryWinterSchoolLotteryRunner, trips
+                )
+                self.assertEqual(db_results, mem_results)
+                self.assertEqual(db_log, mem_log)
+
+                # Sanity check: the lottery did actually do something!
+                on_trip, _waitlists = mem_results
+                self.assertTrue(any(on_trip.values()))
+
+                transaction.set_rollback(True)
+
+    def test_bulk_writes(self):
+        """Writing results back takes a fixed number of queries."""
+        trips = self._make_week('bulk writes')
+
+        runner = run.InMemoryWinterSchoolLotteryRunner()
+        runner.snapshot = snapshot.LotterySnapshot.load(date(2020, 1, 15))
+        handlers = [
+            runner.participant_handler(par)
+            for par, _key in runner.ranked_participants()
+        ]
+        with self.assertNumQueries(0):
+            for handler in handlers:
+                if not runner.handled(handler.participant):
+                    handler.place_participant()
+
+        # Update signups, create waitlist entries, then recount signups on each
+        # trip (+ 2 for the savepoint).
+        # Nobody was on a waitlist beforehand, so there's nothing else to update.
+        with self.assertNumQueries(5):
+            runner.snapshot.save()
+
+        on_trip, _ = self._final_state(trips)
+        self.assertTrue(any(on_trip.values()))
+
+
+class LowestNonDriverTests(SimpleTestCase):
+    def test_only_drivers(self):
+        trip = snapshot.TripState(1, "Mt. Washington", 2, waitlist_id=1)
+        driver = snapshot.ParticipantState(
+            1, "Driver", "d@example.com", 'NA', 'own', None
+        )
+        signup = snapshot.SignupState(1, driver, trip, 1, None, None, None, True)
+        trip.signups.append(signup)
+        self.assertIsNone(snapshot.lowest_non_driver(trip, {1: (0,)}))
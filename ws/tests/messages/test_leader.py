@@ -3,6 +3,7 @@ from unittest import mock
 
 from django.contrib import messages
 from django.contrib.auth.models import AnonymousUser
+from django.db.models import prefetch_related_objects
 from freezegun import freeze_time
 
 from ws import models
@@ -158,3 +159,30 @@ class LeaderMessagesTest(MessagesTestCase):
                 ),
             ]
         )
+
+    @freeze_time("2020-01-15 14:56:00 EST")
+    def test_state_cached_until_feedback_given(self):
+        trip_leader = self._leader
+        trip = factories.TripFactory.create(name="Radness", trip_date=date(2020, 1, 4))
+        trip.leaders.add(trip_leader)
+        signup = factories.SignUpFactory.create(trip=trip, on_trip=True)
+
+        request = self._request_with_participant(trip_leader)
+        prefetch_related_objects([trip_leader.user], 'groups')  # (As middleware does)
+        with self._mock_add_message() as add_message:
+            leader.Messages(request).supply()
+        add_message.assert_called_once()
+
+        # Nothing has changed, so no queries are needed to warn again
+        with self._mock_add_message() as add_message:
+            with self.assertNumQueries(0):
+                leader.Messages(request).supply()
+        add_message.assert_called_once()
+
+        factories.FeedbackFactory.create(
+            leader=trip_leader, trip=trip, participant=signup.participant
+        )
+        trip_leader.refresh_from_db(fields=['message_state_token'])  # (New request)
+        with self._mock_add_message() as add_message:
+            leader.Messages(request).supply()
+        add_message.assert_not_called()
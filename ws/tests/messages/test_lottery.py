@@ -144,6 +144,7 @@ class LotteryMessagesTest(MessagesTestCase):
 
         # With two trips, we'll then warn that ranking should happen
         signup_2 = self._create_upcoming_ws_trip(par, order=None)
+        par.refresh_from_db(fields=['message_state_token'])  # (As a new request)
 
         with self._mock_add_message() as add_message:
             Messages(request).supply()
@@ -158,6 +159,7 @@ class LotteryMessagesTest(MessagesTestCase):
         # Now, we won't warn
         signup_2.on_trip = True
         signup_2.save()
+        par.refresh_from_db(fields=['message_state_token'])
         add_message.reset_mock()
 
         with self._mock_add_message() as add_message:
@@ -2,7 +2,10 @@ from contextlib import contextmanager
 from unittest import mock
 
 from django.contrib import messages
+from django.test import RequestFactory
+from freezegun import freeze_time
 
+import ws.messages
 from ws.messages import MessageGenerator
 from ws.tests import TestCase, factories
 
@@ -51,3 +54,49 @@ class MessageGeneratorTests(TestCase):
             # A new unique message will be sent, though!
             self.assertTrue(generator.add_unique_message(messages.INFO, "Goodbye"))
             self.assertIn(goodbye_call, add_message.call_args_list)
+
+
+class CachedStateTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.participant = factories.ParticipantFactory.create()
+        self.request = RequestFactory().get('/')
+        self.request.user = self.participant.user
+        self.request.participant = self.participant
+
+    def test_cached_until_invalidated(self):
+        compute = mock.Mock(return_value={'some': 'state'})
+        generator = MessageGenerator(self.request)
+
+        self.assertEqual(generator.cached_state(compute), {'some': 'state'})
+        self.assertEqual(generator.cached_state(compute), {'some': 'state'})
+        compute.assert_called_once_with()
+
+        ws.messages.invalidate_state([self.participant.pk])
+        generator.cached_state(compute)
+        compute.assert_called_once_with()  # (The request's participant is stale)
+
+        # Each request loads the participant afresh
+        self.participant.refresh_from_db(fields=['message_state_token'])
+        generator.cached_state(compute)
+        self.assertEqual(compute.call_count, 2)
+
+    def test_recomputed_daily(self):
+        compute = mock.Mock(return_value={'some': 'state'})
+        generator = MessageGenerator(self.request)
+
+        with freeze_time("2020-01-15 14:56:00 EST"):
+            generator.cached_state(compute)
+        with freeze_time("2020-01-16 09:00:00 EST"):
+            generator.cached_state(compute)
+        self.assertEqual(compute.call_count, 2)
+
+    def test_participant_changes_invalidate(self):
+        compute = mock.Mock(return_value={'some': 'state'})
+        generator = MessageGenerator(self.request)
+        generator.cached_state(compute)
+
+        self.participant.name = "New Name"
+        self.participant.save()
+        generator.cached_state(compute)
+        self.assertEqual(compute.call_count, 2)
@@ -354,6 +354,53 @@ class LeaderTest(TestCase):
         )
         self.assertEqual('John Long (Full leader)', john.name_with_rating(trip))
 
+    def test_rating_changes_are_reflected(self):
+        """Cached rating timelines are discarded when ratings change."""
+        trip = factories.TripFactory.create(
+            trip_date=date(2019, 10, 23), activity=models.BaseRating.WINTER_SCHOOL
+        )
+        leader = factories.ParticipantFactory.create(name='Lynn Hill')
+        self.assertEqual('Lynn Hill', leader.name_with_rating(trip))
+
+        with freeze_time("2019-10-01 12:00:00 EST"):
+            rating = factories.LeaderRatingFactory.create(
+                participant=leader,
+                activity=models.BaseRating.WINTER_SCHOOL,
+                rating='Co-leader',
+            )
+        self.assertEqual('Lynn Hill (Co-leader)', leader.name_with_rating(trip))
+
+        rating.delete()
+        self.assertEqual('Lynn Hill', leader.name_with_rating(trip))
+
+    def test_load_rating_timelines(self):
+        """Timelines for many participants can be loaded in one query."""
+        leaders = factories.ParticipantFactory.create_batch(3)
+        for leader in leaders:
+            factories.LeaderRatingFactory.create(
+                participant=leader, activity=enums.Activity.HIKING.value
+            )
+        same_leader = models.Participant.objects.get(pk=leaders[0].pk)
+        with self.assertNumQueries(1):
+            models.Participant.load_rating_timelines([*leaders, same_leader])
+        with self.assertNumQueries(0):
+            for leader in leaders:
+                self.assertTrue(leader.activity_rating(enums.Activity.HIKING.value))
+        self.assertIs(same_leader.rating_timeline, leaders[0].rating_timeline)
+
+    def test_timelines_last_as_long_as_instances(self):
+        """Ratings changed without signals (e.g. by another process) are seen anew."""
+        leader = factories.ParticipantFactory.create()
+        rating = factories.LeaderRatingFactory.create(
+            participant=leader, activity=enums.Activity.HIKING.value, rating='Leader'
+        )
+        self.assertEqual(leader.activity_rating(enums.Activity.HIKING.value), 'Leader')
+
+        models.LeaderRating.objects.filter(pk=rating.pk).update(active=False)
+        self.assertEqual(leader.activity_rating(enums.Activity.HIKING.value), 'Leader')
+        fresh = models.Participant.objects.get(pk=leader.pk)
+        self.assertIsNone(fresh.activity_rating(enums.Activity.HIKING.value))
+
     def test_participants_cannot_lead(self):
         participant = factories.ParticipantFactory()
         self.assertFalse(participant.can_lead(enums.Program.WINTER_SCHOOL))
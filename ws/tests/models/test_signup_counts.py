@@ -0,0 +1,121 @@
+from io import StringIO
+
+from django.core.management import call_command
+
+from ws import models
+from ws.tests import TestCase, factories
+from ws.utils import signups as signup_utils
+
+
+class SignupCountsTest(TestCase):
+    @staticmethod
+    def _counts(trip):
+        return tuple(getattr(trip, field) for field in models.Trip.SIGNUP_COUNT_FIELDS)
+
+    def _assert_counts(self, trip, *counts):
+        trip.refresh_from_db()
+        self.assertEqual(self._counts(trip), counts)
+
+    def test_fcfs_signups(self):
+        trip = factories.TripFactory.create(algorithm='fcfs', maximum_participants=2)
+        one, two, three = (factories.SignUpFactory.create(trip=trip) for _ in range(3))
+        self._assert_counts(trip, 3, 2, 1)
+        self.assertFalse(trip.open_slots)
+
+        # Dropping off the trip pulls the first participant from the waitlist
+        one.delete()
+        two.refresh_from_db()
+        three.refresh_from_db()
+        self.assertTrue(two.on_trip and three.on_trip)
+        self._assert_counts(trip, 2, 2, 0)
+
+        signup_utils.add_to_waitlist(two)
+        self._assert_counts(trip, 2, 1, 1)
+        self.assertEqual(trip.open_slots, 1)
+
+    def test_lottery_signups(self):
+        trip = factories.TripFactory.create(algorithm='lottery')
+        factories.SignUpFactory.create_batch(3, trip=trip)
+
+        # Signups had the same trip instance, so it was updated in memory too
+        self.assertEqual(self._counts(trip), (3, 0, 0))
+        self._assert_counts(trip, 3, 0, 0)
+
+    def test_save_on_trip(self):
+        """Only `on_trip` is written, and counts change only if it changed."""
+        trip = factories.TripFactory.create(algorithm='lottery')
+        signup = factories.SignUpFactory.create(trip=trip, notes="")
+        models.SignUp.objects.filter(pk=signup.pk).update(notes="Running late!")
+
+        signup_utils.save_on_trip(signup, True)
+        signup_utils.save_on_trip(signup, True)
+        self._assert_counts(trip, 1, 1, 0)
+        signup.refresh_from_db()
+        self.assertTrue(signup.on_trip)
+        self.assertEqual(signup.notes, "Running late!")
+
+        signup_utils.save_on_trip(signup, False)
+        self._assert_counts(trip, 1, 0, 0)
+
+    def test_capacity_checks_count_afresh(self):
+        """Stale trip instances still give the right number of open slots."""
+        trip = factories.TripFactory.create(algorithm='fcfs', maximum_participants=2)
+        stale_trip = models.Trip.objects.get(pk=trip.pk)
+        factories.SignUpFactory.create(trip=trip)
+
+        self.assertEqual(stale_trip.open_slots, 2)
+        self.assertEqual(stale_trip.current_open_slots(), 1)
+
+    def test_saving_stale_trip(self):
+        """Trip edits don't clobber counts which changed in the meantime."""
+        trip = factories.TripFactory.create(algorithm='fcfs')
+        stale_trip = models.Trip.objects.get(pk=trip.pk)
+        factories.SignUpFactory.create(trip=trip)
+
+        stale_trip.name = "Renamed"
+        stale_trip.save()
+        trip.refresh_from_db()
+        self.assertEqual(trip.name, "Renamed")
+        self.assertEqual(trip.num_on_trip, 1)
+
+    def test_trip_list_needs_no_aggregates(self):
+        trip = factories.TripFactory.create(algorithm='fcfs', maximum_participants=3)
+        factories.SignUpFactory.create_batch(2, trip=trip)
+        trips = models.Trip.objects.filter(pk=trip.pk)
+
+        self.assertNotIn('COUNT', str(trips.query))
+        (listed,) = trips
+        self.assertEqual((listed.num_signups, listed.open_slots), (2, 1))
+
+
+class RepairSignupCountsTest(TestCase):
+    @staticmethod
+    def _repair(*args):
+        stdout = StringIO()
+        call_command('repair_signup_counts', *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_nothing_to_repair(self):
+        trip = factories.TripFactory.create()
+        factories.SignUpFactory.create(trip=trip, on_trip=True)
+        self.assertIn("All signup counts are correct.", self._repair())
+
+    def test_repair_drift(self):
+        trip = factories.TripFactory.create(name="Drifted", algorithm='fcfs')
+        fine = factories.TripFactory.create(algorithm='fcfs')
+        factories.SignUpFactory.create_batch(2, trip=trip)
+        factories.SignUpFactory.create(trip=fine)
+
+        # Bulk updates bypass signals
+        trip.signup_set.update(on_trip=False)
+
+        output = self._repair('--dry-run')
+        self.assertIn(f"Trip #{trip.pk} (Drifted): num_on_trip: 2 -> 0", output)
+        self.assertNotIn(f"#{fine.pk}", output)
+        trip.refresh_from_db()
+        self.assertEqual(trip.num_on_trip, 2)
+
+        self.assertIn("Repaired signup counts on 1 trip(s).", self._repair())
+        trip.refresh_from_db()
+        self.assertEqual((trip.num_signups, trip.num_on_trip), (2, 0))
+        self.assertIn("All signup counts are correct.", self._repair())
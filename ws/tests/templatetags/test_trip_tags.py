@@ -1,10 +1,14 @@
 from datetime import date
 
 from bs4 import BeautifulSoup
+from django.core.cache import cache
+from django.db import connection
 from django.template import Context, Template
+from django.test.utils import CaptureQueriesContext
 from freezegun import freeze_time
 
-from ws import enums, models
+from ws import enums, merge, models
+from ws.templatetags.trip_tags import annotated_for_trip_list
 from ws.tests import TestCase, factories
 
 
@@ -151,3 +155,94 @@ class TripTagsTest(TestCase):
         template = Template('{% load trip_tags %}{{ feedback|leader_display }}')
         context = Context({'feedback': feedback})
         self.assertEqual(template.render(context), 'Janet Yellin')
+
+
+@freeze_time("Jan 10 2019 20:30:00 EST")
+class CachedTripListTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.trips = []
+        for name in ['Mount Washington', 'Cannon Cliff', 'Franconia Ridge']:
+            trip = factories.TripFactory.create(name=name, trip_date=date(2019, 1, 19))
+            trip.leaders.add(factories.ParticipantFactory.create())
+            self.trips.append(trip)
+        self.template = Template('{% load trip_tags %}{% trip_list_table trips %}')
+
+    def _render(self):
+        trips = annotated_for_trip_list(models.Trip.objects.order_by('pk'))
+        return self.template.render(Context({'trips': trips}))
+
+    @staticmethod
+    def _trip_names(html):
+        soup = BeautifulSoup(html, 'html.parser')
+        return [row.find('a').text.strip() for row in soup.find('tbody').find_all('tr')]
+
+    def test_repeat_renders_only_query_versions(self):
+        html = self._render()
+        self.assertEqual(
+            self._trip_names(html),
+            ['Mount Washington', 'Cannon Cliff', 'Franconia Ridge'],
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual(self._render(), html)
+
+    def test_changed_trip_rerendered(self):
+        self._render()
+        trip = self.trips[1]
+        trip.name = 'Cathedral Ledge'
+        trip.save()
+
+        # Only the changed trip is loaded (with its leaders & their ratings)
+        with CaptureQueriesContext(connection) as queries:
+            html = self._render()
+        self.assertEqual(len(queries), 4)
+        self.assertIn(f'IN ({trip.pk})', queries[1]['sql'])
+        self.assertEqual(
+            self._trip_names(html),
+            ['Mount Washington', 'Cathedral Ledge', 'Franconia Ridge'],
+        )
+
+    def test_invalidated_by_related_changes(self):
+        def version(trip):
+            return models.Trip.objects.values_list('cache_version', flat=True).get(
+                pk=trip.pk
+            )
+
+        versions = [version(trip) for trip in self.trips]
+        third = self.trips[2]
+
+        factories.SignUpFactory.create(trip=self.trips[0])
+        factories.LeaderRatingFactory.create(participant=self.trips[1].leaders.get())
+        third.leaders.add(factories.ParticipantFactory.create())
+        self.assertEqual(
+            [version(trip) for trip in self.trips], [v + 1 for v in versions]
+        )
+
+        leader = third.leaders.first()
+        leader.name = 'Renamed Leader'
+        leader.save()
+        self.assertEqual(version(third), versions[2] + 2)
+        self.assertIn('Renamed Leader', self._render())
+
+        # Saving without changing the name doesn't invalidate anything
+        leader.save()
+        self.assertEqual(version(third), versions[2] + 2)
+
+    def test_invalidated_by_merging_leaders(self):
+        def versions():
+            return [
+                models.Trip.objects.values_list('cache_version', flat=True).get(
+                    pk=trip.pk
+                )
+                for trip in self.trips
+            ]
+
+        first, second, third = (trip.leaders.get() for trip in self.trips)
+        before = versions()
+        merge.merge_participants(first, second)
+        self.assertEqual(versions(), [before[0] + 1, before[1] + 1, before[2]])
+
+        before = versions()
+        merge.merge_participant_pairs([(third.pk, second.pk)])
+        self.assertEqual(versions(), [v + 1 for v in before])
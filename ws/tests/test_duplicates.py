@@ -0,0 +1,125 @@
+import unittest
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from ws import duplicates, merge, models
+from ws.tests import TestCase, factories
+
+
+class NormalizationTest(unittest.TestCase):
+    def test_names_ignore_case_and_whitespace(self):
+        self.assertEqual(duplicates.normalized_name("  John\t SMITH "), "john smith")
+
+    def test_phone_numbers_in_e164(self):
+        self.assertEqual(duplicates.normalized_phone("(617) 555-1234"), "+16175551234")
+        self.assertEqual(duplicates.normalized_phone("+1 617.555.1234"), "+16175551234")
+
+    def test_invalid_phone_numbers(self):
+        self.assertEqual(duplicates.normalized_phone(""), "")
+        self.assertEqual(duplicates.normalized_phone(None), "")
+        self.assertEqual(duplicates.normalized_phone("555-1234"), "")
+
+    def test_email_local_part(self):
+        self.assertEqual(duplicates.normalized_email("Tim@example.com"), "tim")
+        self.assertEqual(duplicates.normalized_email("tim+mitoc@mit.edu"), "tim")
+        self.assertEqual(duplicates.normalized_email(""), "")
+
+
+class CandidatesTest(TestCase):
+    @staticmethod
+    def _pairs():
+        return [(old.pk, new.pk) for old, new in duplicates.ranked_pairs()]
+
+    def test_no_shared_keys(self):
+        factories.ParticipantFactory.create(name="Tim Beaver")
+        factories.ParticipantFactory.create(name="Tina Beaver")
+        self.assertEqual(self._pairs(), [])
+
+    def test_ranked_by_shared_keys(self):
+        par = factories.ParticipantFactory.create(
+            name="Tim Beaver", email="tim@example.com", cell_phone="+16175551234"
+        )
+        same_name = factories.ParticipantFactory.create(name="tim  beaver")
+        same_phone = factories.ParticipantFactory.create(
+            name="Timothy Beaver", cell_phone="+16175551234"
+        )
+        same_email = factories.ParticipantFactory.create(
+            name="T. Beaver", email="tim@mit.edu"
+        )
+        self.assertEqual(
+            self._pairs(),
+            [(par.pk, same_phone.pk), (par.pk, same_email.pk), (par.pk, same_name.pk)],
+        )
+
+        candidate = models.DuplicateCandidate.objects.get(right=same_phone)
+        self.assertEqual(
+            (candidate.same_name, candidate.same_phone, candidate.same_email),
+            (False, True, False),
+        )
+
+    def test_updated_when_participant_changes(self):
+        par = factories.ParticipantFactory.create(name="Tim Beaver")
+        other = factories.ParticipantFactory.create(name="Tina Beaver")
+        self.assertEqual(self._pairs(), [])
+
+        other.name = "Tim Beaver"
+        other.save()
+        self.assertEqual(self._pairs(), [(par.pk, other.pk)])
+
+        par.name = "Timothy Beaver"
+        par.save()
+        self.assertEqual(self._pairs(), [])
+
+    def test_unchanged_keys_are_not_rewritten(self):
+        par = factories.ParticipantFactory.create(name="Tim Beaver")
+        par.affiliation = 'MG'
+        with CaptureQueriesContext(connection) as captured:
+            par.save(update_fields=['affiliation', 'name'])
+        index_queries = [
+            query['sql'] for query in captured if 'ws_duplicate' in query['sql']
+        ]
+        self.assertEqual(len(index_queries), 1)
+        self.assertTrue(index_queries[0].startswith('SELECT'))
+
+    def test_distinct_accounts_omitted(self):
+        par = factories.ParticipantFactory.create(name="Tim Beaver")
+        other = factories.ParticipantFactory.create(name="Tim Beaver")
+        models.DistinctAccounts.objects.create(left=other, right=par)
+        self.assertEqual(self._pairs(), [])
+
+    def test_newest_listed_last(self):
+        newer = factories.ParticipantFactory.create(name="Tim Beaver")
+        older = factories.ParticipantFactory.create(name="Tim Beaver")
+        models.Participant.objects.filter(pk=older.pk).update(
+            profile_last_updated=newer.profile_last_updated.replace(year=2010)
+        )
+        self.assertEqual(self._pairs(), [(older.pk, newer.pk)])
+
+    def test_rebuild_matches_incremental(self):
+        par = factories.ParticipantFactory.create(
+            name="Tim Beaver", email="tim@example.com", cell_phone="+16175551234"
+        )
+        factories.ParticipantFactory.create(name="Tim Beaver", email="tim@mit.edu")
+        factories.ParticipantFactory.create(name="Tina", cell_phone="+16175551234")
+        factories.ParticipantFactory.create(name="Unrelated")
+
+        fields = ('left_id', 'right_id', 'same_name', 'same_phone', 'same_email')
+        incremental = set(
+            models.DuplicateCandidate.objects.values_list(*fields, 'score')
+        )
+        models.DuplicateCandidate.objects.all().delete()
+        models.DuplicateKey.objects.filter(participant=par).delete()
+
+        self.assertEqual(duplicates.rebuild_all(), 2)
+        rebuilt = set(models.DuplicateCandidate.objects.values_list(*fields, 'score'))
+        self.assertEqual(rebuilt, incremental)
+
+    def test_merged_participant_removed(self):
+        old = factories.ParticipantFactory.create(name="Tim Beaver")
+        new = factories.ParticipantFactory.create(name="Tim Beaver")
+        other = factories.ParticipantFactory.create(name="Tim Beaver")
+
+        merge.merge_participants(old, new)
+        self.assertEqual(self._pairs(), [(new.pk, other.pk)])
+        self.assertFalse(models.DuplicateKey.objects.filter(participant_id=old.pk))
@@ -0,0 +1,120 @@
+from unittest import mock
+
+from django.test import override_settings
+
+from ws import instrumentation, models
+from ws.signals import task_signals
+from ws.tests import TestCase, factories
+
+
+class ProfileTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        instrumentation.reset_summary()
+        self.addCleanup(instrumentation.reset_summary)
+
+    def test_queries_and_duplicates(self):
+        participants = [factories.ParticipantFactory.create() for _ in range(3)]
+
+        with self.assertLogs('ws.instrumentation', level='INFO') as logs:
+            with instrumentation.profile('lookups') as prof:
+                for par in participants:
+                    models.Participant.objects.get(pk=par.pk)
+                models.Trip.objects.count()
+
+        self.assertEqual(prof.num_queries, 4)
+        (dupe,) = prof.duplicates()
+        self.assertEqual(dupe.num_calls, 3)
+        self.assertIn('ws/tests/test_instrumentation.py', dupe.call_site)
+        self.assertIn('(test_queries_and_duplicates)', dupe.call_site)
+
+        (record,) = logs.records
+        self.assertEqual(record.instrumentation['num_queries'], 4)
+        self.assertEqual(record.instrumentation['duplicates'][0]['num_calls'], 3)
+
+    def test_external_calls(self):
+        # Calls made when nothing is profiled are ignored
+        with instrumentation.external_call('docusign'):
+            pass
+
+        with instrumentation.profile('waiver') as prof:
+            with instrumentation.external_call('docusign'):
+                pass
+            # Queries to the gear database are external calls too
+            geardb = {'connection': mock.Mock(alias='geardb')}
+            prof(mock.Mock(), 'SELECT 1', None, False, geardb)
+
+        self.assertEqual(prof.num_queries, 0)
+        self.assertEqual(prof.external_calls, {'docusign': 1, 'geardb': 1})
+        self.assertEqual(set(prof.as_dict()['external']['docusign']), {'calls', 'ms'})
+
+    def test_summary(self):
+        for _ in range(2):
+            with instrumentation.profile('count trips'):
+                models.Trip.objects.count()
+        with instrumentation.profile('nothing'):
+            pass
+
+        labels = instrumentation.summary()['labels']
+        self.assertEqual(set(labels), {'count trips', 'nothing'})
+        self.assertEqual(labels['count trips']['count'], 2)
+        self.assertEqual(labels['count trips']['max_queries'], 1)
+        self.assertEqual(labels['nothing']['mean_queries'], 0)
+
+
+class TaskProfileTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        instrumentation.reset_summary()
+        self.addCleanup(instrumentation.reset_summary)
+        self.task = mock.Mock()
+        self.task.name = 'ws.tasks.run_ws_lottery'
+
+    def _run_task(self):
+        task_signals.start_task_profile(task_id='abc123', task=self.task)
+        models.Trip.objects.count()
+        task_signals.finish_task_profile(task_id='abc123')
+
+    def test_disabled(self):
+        self._run_task()
+        self.assertEqual(instrumentation.summary()['labels'], {})
+
+    @override_settings(INSTRUMENTATION_ENABLED=True)
+    def test_enabled(self):
+        with self.assertLogs('ws.instrumentation', level='INFO'):
+            self._run_task()
+        labels = instrumentation.summary()['labels']
+        self.assertEqual(labels['task ws.tasks.run_ws_lottery']['max_queries'], 1)
+
+
+class InstrumentationMiddlewareTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        instrumentation.reset_summary()
+        self.addCleanup(instrumentation.reset_summary)
+        self.participant = factories.ParticipantFactory.create()
+        self.client.force_login(self.participant.user)
+
+    def test_disabled(self):
+        self.client.get('/participants.json')
+        self.assertEqual(instrumentation.summary()['labels'], {})
+
+    @override_settings(INSTRUMENTATION_ENABLED=True)
+    def test_requests_grouped_by_view(self):
+        with self.assertLogs('ws.instrumentation', level='INFO'):
+            self.client.get('/participants.json?search=bob')
+            self.client.get('/participants.json?search=alice')
+
+        labels = instrumentation.summary()['labels']
+        self.assertEqual(labels['GET json-participants']['count'], 2)
+        self.assertGreater(labels['GET json-participants']['mean_queries'], 0)
+
+    def test_summary_endpoint_admin_only(self):
+        response = self.client.get('/instrumentation.json')
+        self.assertEqual(response.status_code, 302)
+
+        self.participant.user.is_superuser = True
+        self.participant.user.save()
+        response = self.client.get('/instrumentation.json')
+        self.assertEqual(response.json()['enabled'], False)
+        self.assertEqual(response.json()['labels'], {})
@@ -152,3 +152,69 @@ class MergeTest(TestCase):
             self._migrate()
 
         self.old.refresh_from_db()  # Still exists! We rolled back.
+
+
+class BatchMergeTest(TestCase):
+    def test_no_pairs(self):
+        self.assertEqual(merge.merge_participant_pairs([]), {})
+
+    def test_chained_merges_rejected(self):
+        one, two, three = factories.ParticipantFactory.create_batch(3)
+        with self.assertRaises(ValueError):
+            merge.merge_participant_pairs([(one.pk, two.pk), (two.pk, three.pk)])
+        with self.assertRaises(ValueError):
+            merge.merge_participant_pairs([(one.pk, two.pk), (one.pk, three.pk)])
+
+    def test_merge_many(self):
+        old_1, new_1, old_2, new_2 = factories.ParticipantFactory.create_batch(4)
+        trip = factories.TripFactory.create()
+        factories.SignUpFactory.create(participant=old_1, trip=trip)
+        factories.FeedbackFactory.create(participant=old_2, leader=old_1)
+        old_info = factories.LotteryInfoFactory.create(participant=old_2)
+        factories.PasswordQualityFactory.create(participant=old_1)
+
+        counts = merge.merge_participant_pairs(
+            [(old_1.pk, new_1.pk), (old_2.pk, new_2.pk)]
+        )
+        self.assertEqual(counts['ws_participant'], 2)
+        self.assertEqual(counts['ws_signup'], 1)
+        self.assertEqual(counts['ws_feedback'], 2)
+        self.assertEqual(counts['account_emailaddress'], 2)
+
+        self.assertFalse(
+            models.Participant.objects.filter(pk__in=[old_1.pk, old_2.pk]).exists()
+        )
+        self.assertFalse(User.objects.filter(pk__in=[old_1.user_id, old_2.user_id]))
+        self.assertEqual(trip.signup_set.get().participant, new_1)
+        feedback = models.Feedback.objects.get()
+        self.assertEqual((feedback.participant, feedback.leader), (new_2, new_1))
+        old_info.refresh_from_db()
+        self.assertEqual(old_info.participant, new_2)
+        self.assertCountEqual(
+            new_1.user.emailaddress_set.values_list('email', 'primary'),
+            [(old_1.email, False), (new_1.email, True)],
+        )
+
+    def test_lotteryinfo_kept_from_new(self):
+        old, new = factories.ParticipantFactory.create_batch(2)
+        factories.LotteryInfoFactory.create(participant=old)
+        new_info = factories.LotteryInfoFactory.create(participant=new)
+
+        merge.merge_participant_pairs([(old.pk, new.pk)])
+        self.assertEqual(models.LotteryInfo.objects.get(), new_info)
+
+    def test_conflicts_reported_for_whole_batch(self):
+        old_1, new_1, old_2, new_2 = factories.ParticipantFactory.create_batch(4)
+        trip = factories.TripFactory.create()
+        for par in [old_1, new_1, old_2, new_2]:
+            factories.SignUpFactory.create(participant=par, trip=trip)
+        factories.LotteryInfoFactory.create(participant=old_1)
+
+        with self.assertRaises(merge.MergeConflict) as cm:
+            merge.merge_participant_pairs([(old_1.pk, new_1.pk), (old_2.pk, new_2.pk)])
+        self.assertIn('ws_signup', str(cm.exception))
+        self.assertIn('(2 conflict(s))', str(cm.exception))
+
+        # Nothing was changed
+        self.assertTrue(models.Participant.objects.filter(pk=old_2.pk))
+        self.assertTrue(models.LotteryInfo.objects.filter(participant=old_1))
@@ -1,7 +1,7 @@
 from typing import ClassVar
 from unittest import mock
 
-from django.contrib.auth.models import AnonymousUser
+from django.contrib.auth.models import AnonymousUser, Group
 from django.test import RequestFactory
 
 from ws import models
@@ -45,6 +45,45 @@ class ParticipantMiddlewareTests(TestCase):
         self.pm(self.request)
         self.assertEqual(self.request.participant, participant)
 
+    def test_everything_loaded_in_two_queries(self):
+        """Groups, participant, membership & password quality are all loaded."""
+        self.request.user = models.User.objects.get(pk=self.user.pk)
+        participant = ParticipantFactory.create(user_id=self.user.pk)
+        PasswordQualityFactory.create(participant=participant, is_insecure=True)
+        Group.objects.get(name='leaders').user_set.add(self.user)
+
+        with self.assertNumQueries(2):
+            self.pm(self.request)
+
+        with self.assertNumQueries(0):
+            self.assertIn('leaders', {g.name for g in self.request.user.groups.all()})
+            par = self.request.participant
+            self.assertTrue(par.passwordquality.is_insecure)
+            self.assertEqual(par.membership, participant.membership)
+            self.assertIs(par.user, self.request.user)
+            self.assertIs(
+                models.Participant.from_user(self.request.user, join_membership=True),
+                par,
+            )
+
+    def test_missing_password_quality_not_queried(self):
+        self.request.user = self.user
+        ParticipantFactory.create(user_id=self.user.pk)
+        self.pm(self.request)
+
+        with self.assertNumQueries(0):
+            with self.assertRaises(models.PasswordQuality.DoesNotExist):
+                self.request.participant.passwordquality  # pylint: disable=pointless-statement
+
+    def test_participant_created_later(self):
+        """A participant created after the middleware ran can still be found."""
+        self.request.user = self.user
+        self.pm(self.request)
+        self.assertIsNone(self.request.participant)
+
+        participant = ParticipantFactory.create(user_id=self.user.pk)
+        self.assertEqual(models.Participant.from_user(self.request.user), participant)
+
 
 class CustomMessagesMiddlewareTests(TestCase):
     user: ClassVar[models.User]
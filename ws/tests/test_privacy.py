@@ -1,9 +1,15 @@
+import io
+import json
+import zipfile
 from collections import OrderedDict
 from datetime import date, datetime
 from unittest import mock
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from freezegun import freeze_time
 
+from ws import privacy
 from ws.privacy import DataDump
 from ws.tests import TestCase, factories
 from ws.utils.dates import localize
@@ -193,3 +199,58 @@ class DataDumpTest(TestCase):
                 }
             ],
         )
+
+
+class BulkExportTest(TestCase):
+    @staticmethod
+    def _participant_with_data():
+        par = factories.ParticipantFactory.create()
+        factories.SignUpFactory.create(participant=par)
+        factories.FeedbackFactory.create(participant=par)
+        factories.LeaderRatingFactory.create(participant=par)
+        factories.WinterSchoolLeaderApplicationFactory.create(participant=par)
+        return par
+
+    def test_same_data_as_single_dump(self):
+        par = self._participant_with_data()
+        ((par_id, data),) = privacy.iter_data_dumps([par.pk])
+        self.assertEqual(par_id, par.pk)
+        self.assertEqual(data, DataDump(par.pk).all_data)
+
+    def test_queries_do_not_scale_with_participants(self):
+        one = self._participant_with_data()
+        with CaptureQueriesContext(connection) as one_participant:
+            list(privacy.iter_data_dumps([one.pk]))
+
+        others = [self._participant_with_data() for _ in range(3)]
+        with self.assertNumQueries(len(one_participant)):
+            dumps = list(privacy.iter_data_dumps([one.pk, *(p.pk for p in others)]))
+        self.assertEqual([pk for pk, _ in dumps], [one.pk, *(p.pk for p in others)])
+
+    def test_batches(self):
+        pars = factories.ParticipantFactory.create_batch(3)
+        with CaptureQueriesContext(connection) as one_batch:
+            list(privacy.iter_data_dumps([pars[0].pk]))
+        with self.assertNumQueries(2 * len(one_batch)):
+            list(privacy.iter_data_dumps([par.pk for par in pars], batch_size=2))
+
+    def test_ndjson(self):
+        pars = factories.ParticipantFactory.create_batch(2)
+        output = io.BytesIO()
+        self.assertEqual(privacy.export(output, 'ndjson'), 2)
+
+        lines = output.getvalue().decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        first = json.loads(lines[0])
+        self.assertEqual(first['participant_id'], pars[0].pk)
+        self.assertEqual(first['data']['user']['name'], pars[0].name)
+
+    def test_zip(self):
+        par = factories.ParticipantFactory.create()
+        output = io.BytesIO()
+        self.assertEqual(privacy.export(output, 'zip', [par.pk]), 1)
+
+        with zipfile.ZipFile(output) as archive:
+            self.assertEqual(archive.namelist(), [f'participant_{par.pk}.json'])
+            data = json.loads(archive.read(f'participant_{par.pk}.json'))
+        self.assertEqual(data['user']['emails'][0]['email'], par.email)
@@ -0,0 +1,283 @@
+"""Pin the number of queries made by the hot paths of the site.
+
+Each path runs against fixtures of increasing size. Paths which should make
+the same number of queries no matter how much data is involved fail as soon
+as any query is repeated per object (an n+1 query). Paths which do scale
+linearly are pinned to their current per-object cost.
+
+A table of queries (and time taken) per fixture size is printed after the
+tests run, e.g. `python manage.py test ws.tests.test_query_budgets`.
+"""
+import time
+from datetime import date
+from typing import Callable, ClassVar, List, Tuple
+from unittest import mock
+
+from django.db import connection, transaction
+from freezegun import freeze_time
+
+from ws import enums, instrumentation
+from ws.lottery import rank, run
+from ws.lottery.synthetic import make_ws_week
+from ws.tests import TestCase, factories
+from ws.tests.fake_gspread import FakeClient
+from ws.utils import member_sheets
+
+SIZES = (2, 4, 8)
+
+
+class Rollback(Exception):
+    pass
+
+
+class QueryBudgetTestCase(TestCase):
+    # (label, size, num queries, milliseconds)
+    results: ClassVar[List[Tuple[str, int, int, float]]]
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.results = []
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        print(f"\n{'Path':<44} {'Size':>5} {'Queries':>8} {'ms':>8}")
+        for label, size, num_queries, ms in cls.results:
+            print(f"{label:<44} {size:>5} {num_queries:>8} {ms:>8.1f}")
+
+    def _measure(self, label: str, build: Callable, run_path: Callable, size: int):
+        """Build a fixture, then run the path (undoing all changes after)."""
+        try:
+            with transaction.atomic():
+                fixture = build(size)
+                prof = instrumentation.Profile(label)
+                start = time.perf_counter()
+                with connection.execute_wrapper(prof):
+                    run_path(fixture)
+                ms = (time.perf_counter() - start) * 1000
+                raise Rollback
+        except Rollback:
+            pass
+        self.results.append((label, size, prof.num_queries, ms))
+        return prof
+
+    def assertQueryBudget(  # pylint: disable=invalid-name
+        self,
+        label: str,
+        build: Callable,
+        run_path: Callable,
+        max_queries: int,
+        per_item: int = 0,
+        sizes: Tuple[int, ...] = SIZES,
+    ):
+        """Assert the path's queries grow by only `per_item` per fixture item.
+
+        `max_queries` is the most queries permitted with the largest fixture.
+        """
+        self._measure(f'{label} (warm-up)', build, run_path, sizes[0])
+        self.results.pop()
+
+        profiles = [self._measure(label, build, run_path, size) for size in sizes]
+        smallest = profiles[0].num_queries
+        for size, prof in zip(sizes, profiles):
+            allowed = smallest + per_item * (size - sizes[0])
+            dupes = '\n'.join(
+                f'  {dupe.num_calls}x {dupe.call_site}: {dupe.sql[:120]}'
+                for dupe in prof.duplicates()[:5]
+            )
+            self.assertLessEqual(
+                prof.num_queries,
+                allowed,
+                f"{label}: {prof.num_queries} queries for size {size} "
+                f"(expected at most {allowed}). Repeated queries:\n{dupes}",
+            )
+        self.assertLessEqual(profiles[-1].num_queries, max_queries, label)
+
+
+def _ws_trip(**kwargs):
+    return factories.TripFactory.create(
+        program=enums.Program.WINTER_SCHOOL.value, **kwargs
+    )
+
+
+@freeze_time("2020-01-15 09:00:00 EST")
+class ViewQueryBudgetTests(QueryBudgetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.viewer = factories.ParticipantFactory.create()
+        factories.LeaderRatingFactory.create(
+            participant=self.viewer, activity=enums.Activity.WINTER_SCHOOL.label
+        )
+        self.client.force_login(self.viewer.user)
+
+    @staticmethod
+    def _upcoming_trips(num):
+        trips = []
+        for _ in range(num):
+            trip = _ws_trip(trip_date=date(2020, 1, 18))
+            trip.leaders.add(factories.ParticipantFactory.create())
+            factories.SignUpFactory.create(trip=trip, on_trip=True)
+            trips.append(trip)
+        return trips
+
+    def _get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    # Trips are new in each fixture, so their rows are never cached yet.
+    # (Once cached, each list just queries the version of every trip)
+
+    def test_upcoming_trips(self):
+        self.assertQueryBudget(
+            'UpcomingTripsView',
+            self._upcoming_trips,
+            lambda _trips: self._get('/trips/'),
+            max_queries=9,
+        )
+
+    def test_all_trips(self):
+        self.assertQueryBudget(
+            'AllTripsView',
+            self._upcoming_trips,
+            lambda _trips: self._get('/trips/all/'),
+            max_queries=10,
+        )
+
+    def _trip_with_signups(self, num):
+        trip = _ws_trip(trip_date=date(2020, 1, 18), maximum_participants=num // 2)
+        trip.leaders.add(self.viewer)
+        for i in range(num):
+            factories.SignUpFactory.create(trip=trip, on_trip=i < num // 2)
+        for signup in trip.signup_set.filter(on_trip=False):
+            factories.WaitListSignupFactory.create(
+                signup=signup, waitlist=trip.waitlist
+            )
+        return trip
+
+    def test_admin_trip_signups(self):
+        # Lecture attendance is (currently) checked once for each signup
+        self.assertQueryBudget(
+            'AdminTripSignupsView.get',
+            self._trip_with_signups,
+            lambda trip: self._get(f'/trips/{trip.pk}/admin/signups/'),
+            max_queries=34,
+            per_item=2,
+        )
+
+    def test_trip_view(self):
+        self.assertQueryBudget(
+            'TripView',
+            self._trip_with_signups,
+            lambda trip: self._get(f'/trips/{trip.pk}/'),
+            max_queries=23,
+        )
+
+    def _participant_history(self, num):
+        for _ in range(num):
+            trip = _ws_trip(trip_date=date(2020, 1, 18))
+            factories.SignUpFactory.create(
+                participant=self.viewer, trip=trip, on_trip=True
+            )
+            past_trip = _ws_trip(trip_date=date(2020, 1, 4))
+            factories.FeedbackFactory.create(participant=self.viewer, trip=past_trip)
+            past_trip.leaders.add(self.viewer)
+        return self.viewer
+
+    def test_participant_view(self):
+        with mock.patch('ws.utils.geardb.matching_memberships', return_value={}):
+            self.assertQueryBudget(
+                'ParticipantView (own profile)',
+                self._participant_history,
+                lambda _par: self._get('/'),
+                max_queries=34,
+            )
+
+    @staticmethod
+    def _leaders(num):
+        for _ in range(num):
+            factories.LeaderRatingFactory.create(
+                participant=factories.ParticipantFactory.create()
+            )
+
+    def test_all_leaders_json(self):
+        # (Includes the fingerprint query, which is all that repeat polls make)
+        self.assertQueryBudget(
+            'JsonAllLeadersView',
+            self._leaders,
+            lambda _: self._get('/leaders.json/'),
+            max_queries=8,
+        )
+
+    def test_membership_statuses(self):
+        def statuses(par_pks):
+            response = self.client.post(
+                '/participants/membership_statuses/',
+                {'participant_ids': par_pks},
+                content_type='application/json',
+            )
+            self.assertEqual(len(response.json()['memberships']), len(par_pks))
+
+        self.assertQueryBudget(
+            'MembershipStatusesView',
+            lambda num: [factories.ParticipantFactory.create().pk for _ in range(num)],
+            statuses,
+            max_queries=7,
+        )
+
+
+@freeze_time("2020-01-15 09:00:00 EST")
+class TaskQueryBudgetTests(QueryBudgetTestCase):
+    @staticmethod
+    def _ws_week(num):
+        return make_ws_week(num * 4, date(2020, 1, 15), seed='budget')
+
+    def test_lottery(self):
+        # Each participant is ranked & placed with their own queries.
+        # How many depends on who wins which trip, so seed each participant's
+        # draw by name (not pk) to place the same way on every run.
+        # (Each placement also replaces the participant's message state token,
+        # and open slots are counted afresh before placing anybody)
+        with mock.patch.object(
+            rank, 'seed_for', side_effect=lambda par, key: f"{par.name}-{key}"
+        ):
+            self.assertQueryBudget(
+                'WinterSchoolLotteryRunner',
+                self._ws_week,
+                lambda _trips: run.WinterSchoolLotteryRunner().assign_trips(),
+                max_queries=285,
+                per_item=64,
+            )
+
+    def test_in_memory_lottery(self):
+        # With only a handful of participants, not every query is needed
+        self.assertQueryBudget(
+            'InMemoryWinterSchoolLotteryRunner',
+            self._ws_week,
+            lambda _trips: run.InMemoryWinterSchoolLotteryRunner().assign_trips(),
+            max_queries=17,
+            sizes=(4, 8, 16),
+        )
+
+    def test_update_discount_sheet(self):
+        client = FakeClient()
+        creds = mock.Mock(access_token_expired=False)
+
+        def opt_in(num):
+            discount = factories.DiscountFactory.create(
+                ga_key='budget', report_leader=True, report_access=True
+            )
+            for _ in range(num):
+                factories.ParticipantFactory.create().discounts.add(discount)
+            return discount
+
+        with mock.patch.object(
+            member_sheets, 'connect_to_sheets', return_value=(client, creds)
+        ):
+            self.assertQueryBudget(
+                'update_discount_sheet',
+                opt_in,
+                member_sheets.update_discount_sheet,
+                max_queries=30,
+                per_item=3,
+            )
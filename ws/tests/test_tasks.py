@@ -1,14 +1,16 @@
-from datetime import date
+from datetime import date, timedelta
 from unittest import mock
 
 from django.core.cache import cache
+from django.db import transaction
 from django.test import SimpleTestCase
 from freezegun import freeze_time
 from mitoc_const import affiliations
 
-from ws import tasks
+from ws import enums, tasks
 from ws.tests import TestCase, factories
-from ws.utils import member_sheets
+from ws.utils import dates as date_utils
+from ws.utils import member_sheets, member_stats
 
 
 class MutexTaskTests(SimpleTestCase):
@@ -99,6 +101,33 @@ class TaskTests(TestCase):
         tasks.update_participant_affiliation(participant.pk)
         update_affiliation.assert_called_with(participant)
 
+    @staticmethod
+    @mock.patch('ws.utils.membership.refresh_all_membership_cache')
+    def test_refresh_all_membership_cache(refresh_all_membership_cache):
+        tasks.refresh_all_membership_cache()
+        refresh_all_membership_cache.assert_called_once_with()
+
+    @staticmethod
+    @mock.patch('ws.utils.rentals.refresh_upcoming_rentals', return_value=3)
+    def test_refresh_upcoming_rentals(refresh_upcoming_rentals):
+        tasks.refresh_upcoming_rentals()
+        refresh_upcoming_rentals.assert_called_once_with()
+
+    @staticmethod
+    @mock.patch('ws.utils.member_stats.refresh_member_stats')
+    def test_refresh_member_stats(refresh_member_stats):
+        refresh_member_stats.return_value = member_stats.RefreshSummary(1, 2, 3)
+        tasks.refresh_member_stats()
+        refresh_member_stats.assert_called_once_with()
+
+    @staticmethod
+    @mock.patch('ws.privacy.export', return_value=2)
+    def test_export_privacy_data(export):
+        with mock.patch('builtins.open', mock.mock_open()) as mocked_open:
+            tasks.export_privacy_data('/tmp/export.zip', 'zip', [1, 2])
+        mocked_open.assert_called_once_with('/tmp/export.zip', 'wb')
+        export.assert_called_once_with(mocked_open(), 'zip', [1, 2])
+
     @staticmethod
     @freeze_time("Fri, 25 Jan 2019 03:00:00 EST")
     @mock.patch('ws.tasks.send_email_to_funds')
@@ -206,3 +235,101 @@ class DiscountsWithoutGaKeyTest(TestCase):
             with mock.patch.object(tasks, 'group'):
                 tasks.update_all_discount_sheets()
         update_sheet.assert_called_once_with(other_discount.pk)
+
+
+class BatchedLotteryTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob = factories.ParticipantFactory.create_batch(2)
+
+    @staticmethod
+    def _lottery_trip(**kwargs):
+        return factories.TripFactory.create(
+            algorithm='lottery',
+            program=enums.Program.CLIMBING.value,
+            maximum_participants=1,
+            **kwargs,
+        )
+
+    @freeze_time("2020-10-05 12:00:00 EST")
+    def test_groups_dispatched(self):
+        close_at = date_utils.local_now()
+        one, two, three = (self._lottery_trip(signups_close_at=close_at) for _ in "123")
+        self._lottery_trip(signups_close_at=close_at + timedelta(days=1))
+        factories.TripFactory.create(
+            algorithm='lottery',
+            program=enums.Program.WINTER_SCHOOL.value,
+            signups_close_at=close_at,
+        )
+
+        factories.SignUpFactory.create(participant=self.alice, trip=one)
+        factories.SignUpFactory.create(participant=self.alice, trip=three)
+        factories.SignUpFactory.create(participant=self.bob, trip=two)
+
+        with mock.patch.object(tasks.run_lottery_group, 's') as run_group:
+            with mock.patch.object(tasks, 'group'):
+                tasks.run_lotteries_closing_between(
+                    (close_at - timedelta(minutes=5)).isoformat(),
+                    close_at.isoformat(),
+                )
+        self.assertEqual(
+            run_group.call_args_list,
+            [mock.call([one.pk, three.pk]), mock.call([two.pk])],
+        )
+
+    def test_group_logs_match_individual_runs(self):
+        """Running trips in a group writes the exact same log as running each alone."""
+        trips = [self._lottery_trip(), self._lottery_trip()]
+        for trip in trips:
+            for par in [self.alice, self.bob]:
+                factories.SignUpFactory.create(participant=par, trip=trip)
+
+        expected_logs = {}
+        for trip in trips:
+            with transaction.atomic():
+                tasks.run_lottery(trip.pk)
+                trip.refresh_from_db()
+                expected_logs[trip.pk] = trip.lottery_log
+                transaction.set_rollback(True)
+
+        tasks.run_lottery_group([trip.pk for trip in trips])
+        for trip in trips:
+            trip.refresh_from_db()
+            self.assertEqual(trip.algorithm, 'fcfs')
+            self.assertIn("Participants will be handled", trip.lottery_log)
+            self.assertEqual(trip.lottery_log, expected_logs[trip.pk])
+
+    def test_trip_already_locked(self):
+        trip = self._lottery_trip()
+        with tasks.exclusive_lock(f'single_trip_lottery-{trip.pk}'):
+            tasks.run_lottery_group([trip.pk])
+        trip.refresh_from_db()
+        self.assertEqual(trip.algorithm, 'lottery')
+
+    def test_invalid_window(self):
+        with self.assertRaises(ValueError):
+            tasks.run_lotteries_closing_between('not a date', 'also not a date')
+
+    @freeze_time("2020-10-05 12:00:00 EST")
+    def test_trips_closing_together_share_a_task(self):
+        close_at = date_utils.local_now() + timedelta(days=2)
+        with mock.patch.object(
+            tasks.run_lotteries_closing_between, 'apply_async'
+        ) as apply_async, mock.patch('ws.signals.signup_signals.app') as app:
+            one, two = (self._lottery_trip(signups_close_at=close_at) for _ in "12")
+            later = self._lottery_trip(signups_close_at=close_at + timedelta(hours=1))
+
+            self.assertEqual(one.lottery_task_id, two.lottery_task_id)
+            self.assertNotEqual(one.lottery_task_id, later.lottery_task_id)
+            self.assertEqual(apply_async.call_count, 2)
+            window = close_at.isoformat()
+            apply_async.assert_any_call(
+                (window, window), eta=close_at, task_id=one.lottery_task_id
+            )
+
+            # The batch is only revoked once no trips use it
+            one.signups_close_at = later.signups_close_at
+            one.save()
+            app.control.revoke.assert_not_called()
+            self.assertEqual(one.lottery_task_id, later.lottery_task_id)
+            two.delete()
+            app.control.revoke.assert_called_once_with(two.lottery_task_id)
@@ -1,12 +1,14 @@
 import unittest
+from collections import OrderedDict
+from datetime import date
 from unittest import mock
 
 import jwt
-import requests
 from django.contrib.auth.models import AnonymousUser
 from django.test import SimpleTestCase
 from freezegun import freeze_time
 
+from ws.tests.gear_api_stub import GearAPIStub
 from ws.utils import geardb
 
 
@@ -49,56 +51,104 @@ class JwtTest(unittest.TestCase):
         )
 
 
+def _rental(email, gear_id):
+    return {
+        'person': {'email': email, 'alternate_emails': []},
+        'gear': {
+            'id': gear_id,
+            'type': {'type_name': 'Bicycle', 'rental_amount': '10.00'},
+        },
+        'checkedout': '2020-01-10T12:00:00-05:00',
+    }
+
+
 class ApiTest(SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.stub = GearAPIStub(
+            {
+                'credentials/': lambda params: [
+                    {'user': user, 'password': 'plaintext.auth.rules'}
+                    for user in params['user']
+                ],
+                'rentals/': lambda params: [
+                    _rental(email, f'BK-{i}')
+                    for email in params['email']
+                    for i in range(3)
+                ],
+            },
+            page_size=4,
+        )
+        self.stub.__enter__()
+        self.addCleanup(self.stub.__exit__)
+        self.client = geardb.GearAPIClient(self.stub.base_url, backoff_factor=0)
+
     def test_bad_status_code(self):
-        fake_response = mock.Mock(spec=requests.Response)
-        fake_response.status_code = 404
+        with self.assertRaises(geardb.APIError):
+            self.client.get('unknown/', user='admin')
 
-        with mock.patch.object(requests, 'get') as fake_get:
-            fake_get.return_value = fake_response
-            with self.assertRaises(geardb.APIError):
-                geardb.query_api('/credentials', user='admin')
+    def test_unreachable(self):
+        client = geardb.GearAPIClient(
+            'http://127.0.0.1:9/', retries=0, timeout=(0.5, 0.5)
+        )
+        with self.assertRaises(geardb.APIError):
+            client.get('credentials/', user='admin')
 
     @mock.patch.object(geardb, 'settings')
     def test_query_api(self, settings):
         settings.GEARDB_SECRET_KEY = 'sooper.secret'
-
-        fake_response = mock.Mock(spec=requests.Response)
-        fake_response.status_code = 200
-        fake_response.json.return_value = {
-            "count": 1,
-            "next": None,
-            "previous": None,
-            "results": [{'user': 'admin', 'password': 'plaintext.auth.rules'}],
-        }
-
-        with mock.patch.object(requests, 'get') as fake_get:
-            fake_get.return_value = fake_response
-            results = geardb.query_api('/credentials', user='admin')
+        with mock.patch.object(geardb, 'api_client', return_value=self.client):
+            results = geardb.query_api('credentials/', user='admin')
         self.assertEqual(
             results, [{'user': 'admin', 'password': 'plaintext.auth.rules'}]
         )
 
-    def test_pagination_not_handled(self):
-        """At present, we don't handle any pagination of results."""
-        fake_response = mock.Mock(spec=requests.Response)
-        fake_response.status_code = 200
-        fake_response.json.return_value = {
-            "count": 10,
-            "next": 'https://mitoc-gear.mit.edu/api-auth/v1/credentials?page=2',
-            "previous": None,
-            "results": [{'user': 'admin', 'password': 'plaintext.auth.rules'}],
-        }
-
-        with mock.patch.object(requests, 'get') as fake_get:
-            fake_get.return_value = fake_response
-            with mock.patch.object(geardb.logger, 'error') as log_error:
-                results = geardb.query_api('/credentials', user='admin')
+    def test_pagination(self):
+        """Every page of results is followed."""
+        users = [f'user{i}' for i in range(10)]
+        results = self.client.get('credentials/', user=users)
+        self.assertEqual([r['user'] for r in results], users)
+        self.assertEqual(len(self.stub.requests), 3)
+
+    def test_transient_failures_retried(self):
+        self.stub.fail_next = 2
+        results = self.client.get('credentials/', user='admin')
+        self.assertEqual(len(results), 1)
+        self.assertEqual(len(self.stub.requests), 3)
+
+    def test_persistent_failures_raise(self):
+        self.stub.fail_next = 10
+        with self.assertRaises(geardb.APIError):
+            self.client.get('credentials/', user='admin')
+        self.assertEqual(len(self.stub.requests), 4)  # The first try, then 3 retries
+
+    def test_batched(self):
+        """Many emails are split into batches, each of which may have pages."""
+        emails = [f'tim{i}@mit.edu' for i in range(5)]
+        results = self.client.get_batched('rentals/', 'email', emails, batch_size=2)
         self.assertEqual(
-            results, [{'user': 'admin', 'password': 'plaintext.auth.rules'}]
+            [(r['person']['email'], r['gear']['id']) for r in results],
+            [(email, f'BK-{i}') for email in emails for i in range(3)],
         )
-        log_error.assert_called_once_with(
-            "Results are paginated; this is not expected or handled."
+        # Batches of 2, 2, and 1 emails (with 6, 6, and 3 results)
+        self.assertEqual(len(self.stub.requests), 5)
+
+    @freeze_time("2020-01-15 12:00:00 EST")
+    def test_outstanding_items(self):
+        emails = [f'Tim{i}@mit.edu' for i in range(60)]
+        with mock.patch.object(geardb, 'api_client', return_value=self.client):
+            items = list(geardb.outstanding_items(emails))
+        self.assertEqual(len(items), 180)
+        self.assertEqual(
+            items[0],
+            geardb.Rental(
+                email='Tim0@mit.edu',
+                id='BK-0',
+                name='Bicycle',
+                cost=10.0,
+                checkedout=date(2020, 1, 10),
+                overdue=False,
+            ),
         )
 
 
@@ -114,3 +164,46 @@ class NoUserTests(SimpleTestCase):
         """Test users with no email addresses."""
         self.assertEqual(geardb.verified_emails(AnonymousUser()), [])
         self.assertEqual(geardb.verified_emails(None), [])
+
+
+class MembershipsByUserTests(SimpleTestCase):
+    @staticmethod
+    def _membership(email, expires, waiver_expires=None):
+        return geardb.format_membership(email, expires, waiver_expires)
+
+    @freeze_time("2019-03-19 14:30:00 EST")
+    def test_chunked_lookups(self):
+        """Emails are looked up in chunks, grouping results by user."""
+        email_to_user = {
+            'old@example.com': 1,
+            'new@example.com': 1,
+            'other@example.com': 2,
+            'missing@example.com': 3,
+            'another@example.com': 4,
+        }
+        found = {
+            'old@example.com': self._membership('old@example.com', date(2018, 1, 1)),
+            'new@example.com': self._membership('new@example.com', date(2020, 1, 1)),
+            'other@example.com': self._membership('other@example.com', None),
+        }
+
+        def fake_lookup(emails):
+            return OrderedDict(
+                (email, found[email]) for email in emails if email in found
+            )
+
+        with mock.patch.object(
+            geardb, 'matching_memberships', side_effect=fake_lookup
+        ) as lookup:
+            memberships = geardb.memberships_by_user(email_to_user, chunk_size=2)
+
+        self.assertEqual(lookup.call_count, 3)
+        self.assertEqual(
+            memberships,
+            {1: found['new@example.com'], 2: found['other@example.com']},
+        )
+
+    def test_no_emails(self):
+        with mock.patch.object(geardb, 'matching_memberships') as lookup:
+            self.assertEqual(geardb.memberships_by_user({}), {})
+        lookup.assert_not_called()
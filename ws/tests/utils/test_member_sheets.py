@@ -0,0 +1,221 @@
+import random
+from datetime import date
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from ws import models
+from ws.tests import TestCase, factories
+from ws.tests.fake_gspread import FakeClient, FakeSpreadsheet
+from ws.utils import member_sheets
+
+HEADER = ['Name', 'Email', 'Membership Status']
+
+
+class DiffRowsTests(SimpleTestCase):
+    @staticmethod
+    def _apply(old, new):
+        """Apply the planned diff to a one-column sheet, returning the sheet."""
+        spreadsheet = FakeSpreadsheet(rows=len(old), cols=1)
+        wks = spreadsheet.sheet1
+        wks.cells = [[digest] for digest in old]
+
+        plan = member_sheets.diff_rows(old, new, wks.id)
+        if plan.requests:
+            spreadsheet.batch_update({'requests': plan.requests})
+        for start, end in plan.to_write:
+            wks.cells[start:end] = [[digest] for digest in new[start:end]]
+        return wks, plan
+
+    def test_insert_one_row(self):
+        wks, plan = self._apply(['h', 'a', 'c'], ['h', 'a', 'b', 'c'])
+        self.assertEqual(wks.cells, [['h'], ['a'], ['b'], ['c']])
+        self.assertEqual(plan.to_write, [(2, 3)])
+        self.assertEqual((plan.num_inserted, plan.num_deleted), (1, 0))
+
+    def test_unchanged(self):
+        plan = member_sheets.diff_rows(['h', 'a', 'b'], ['h', 'a', 'b'], 0)
+        self.assertEqual(plan, member_sheets.RowDiff([], [], 0, 0))
+
+    def test_applying_diffs_gives_new_rows(self):
+        rand = random.Random('diff rows')
+        letters = 'abcdefghijklmnopqrstuvwxyz'
+        for _ in range(200):
+            old = ['header', *sorted(rand.sample(letters, rand.randint(0, 12)))]
+            new = ['header', *sorted(rand.sample(letters, rand.randint(0, 12)))]
+            wks, plan = self._apply(old, new)
+            self.assertEqual(wks.cells, [[digest] for digest in new])
+
+            # Rows found in both old & new are never rewritten
+            num_written = sum(end - start for start, end in plan.to_write)
+            self.assertEqual(num_written, len(set(new) - set(old)))
+
+
+class SheetSyncTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.discount = factories.DiscountFactory.create(ga_key='sheet-key')
+        self.client = FakeClient()
+        self.spreadsheet = self.client.open_by_key('sheet-key')
+        self.wks = self.spreadsheet.sheet1
+
+        patcher = mock.patch.object(
+            member_sheets,
+            'connect_to_sheets',
+            return_value=(self.client, mock.Mock(access_token_expired=False)),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.bob = self._opt_in("Bob", 'bob@example.com')
+        self.alice = self._opt_in("Alice", 'alice@example.com')
+        self.carol = self._opt_in("Carol", 'carol@example.com')
+
+    def _opt_in(self, name, email):
+        par = factories.ParticipantFactory.create(name=name, email=email)
+        par.discounts.add(self.discount)
+        return par
+
+    def _sync(self):
+        """Sync the entire sheet (checking that the report counts API calls)."""
+        calls_before = self.spreadsheet.api_calls
+        report = member_sheets.update_discount_sheet(self.discount)
+        self.assertEqual(report.api_calls, self.spreadsheet.api_calls - calls_before)
+        return report
+
+    def test_first_sync_writes_everything(self):
+        report = self._sync()
+        self.assertEqual(
+            self.wks.cells,
+            [
+                HEADER,
+                ['Alice', 'alice@example.com', 'Active'],
+                ['Bob', 'bob@example.com', 'Active'],
+                ['Carol', 'carol@example.com', 'Active'],
+            ],
+        )
+        # Resize the sheet, then write every row
+        self.assertEqual(report.api_calls, 2)
+        self.assertEqual(report.rows_written, 4)
+        self.assertTrue(
+            models.DiscountSheetFingerprint.objects.filter(
+                discount=self.discount
+            ).exists()
+        )
+
+    def test_unchanged_sheet(self):
+        self._sync()
+        report = self._sync()
+        self.assertEqual(report.api_calls, 0)
+        self.assertEqual(report.rows_written, 0)
+        self.assertEqual(report.api_calls_saved, 3)
+        self.assertIn("4 rows (0 written", str(report))
+
+    def test_only_changed_rows_are_written(self):
+        self._sync()
+        self.bob.membership.membership_expires = date(2019, 3, 1)
+        self.bob.membership.save()
+
+        report = self._sync()
+        self.assertEqual(report.api_calls, 1)
+        self.assertEqual(report.rows_written, 1)
+        self.assertEqual(
+            self.wks.cells[2], ['Bob', 'bob@example.com', 'Expired 2019-03-01']
+        )
+
+    def test_rows_inserted_and_deleted(self):
+        self._sync()
+        self.carol.discounts.remove(self.discount)
+        self._opt_in("Aaron", 'aaron@example.com')
+
+        report = self._sync()
+        self.assertEqual(
+            self.wks.cells,
+            [
+                HEADER,
+                ['Aaron', 'aaron@example.com', 'Active'],
+                ['Alice', 'alice@example.com', 'Active'],
+                ['Bob', 'bob@example.com', 'Active'],
+            ],
+        )
+        self.assertEqual(report.api_calls, 2)
+        self.assertEqual(report.rows_written, 1)
+        self.assertEqual((report.rows_inserted, report.rows_deleted), (1, 1))
+
+    def test_sheet_edited_by_hand(self):
+        """If the sheet doesn't match its fingerprint, everything is rewritten."""
+        self._sync()
+        self.wks.cells.append(['Mallory', 'mallory@example.com', 'Active'])
+
+        report = self._sync()
+        self.assertEqual(report.rows_written, 4)
+        self.assertEqual(len(self.wks.cells), 4)
+
+    def test_new_columns(self):
+        self._sync()
+        self.discount.report_school = True
+        self.discount.save()
+
+        report = self._sync()
+        self.assertEqual(report.rows_written, 4)
+        self.assertEqual(self.wks.cells[0], [*HEADER, 'School'])
+        self.assertEqual(
+            self.wks.cells[1], ['Alice', 'alice@example.com', 'Active', 'N/A']
+        )
+
+    def test_failed_write_forgets_fingerprint(self):
+        self._sync()
+        self.bob.membership.membership_expires = date(2019, 3, 1)
+        self.bob.membership.save()
+
+        with mock.patch.object(self.wks, 'batch_update', side_effect=OSError):
+            with self.assertRaises(OSError):
+                self._sync()
+        self.assertFalse(models.DiscountSheetFingerprint.objects.exists())
+
+        # The next sync doesn't trust what's in the sheet
+        self.assertEqual(self._sync().rows_written, 4)
+
+    def test_update_participant_without_fingerprint(self):
+        """Without a fingerprint, we can't find the participant's row."""
+        report = member_sheets.update_participant(self.discount, self.bob)
+        self.assertEqual(report.rows_written, 4)
+
+    def test_update_participant(self):
+        self._sync()
+
+        report = member_sheets.update_participant(self.discount, self.bob)
+        self.assertEqual(report.api_calls, 0)
+
+        self.bob.membership.membership_expires = date(2019, 3, 1)
+        self.bob.membership.save()
+        report = member_sheets.update_participant(self.discount, self.bob)
+        self.assertEqual(report.api_calls, 1)
+        self.assertEqual(report.rows_written, 1)
+        self.assertEqual(
+            self.wks.cells[2], ['Bob', 'bob@example.com', 'Expired 2019-03-01']
+        )
+
+    def test_update_new_participant(self):
+        self._sync()
+
+        report = member_sheets.update_participant(
+            self.discount, self._opt_in("Barbara", 'barbara@example.com')
+        )
+        self.assertEqual((report.api_calls, report.rows_written), (2, 1))
+        self.assertEqual(
+            [row[0] for row in self.wks.cells],
+            ['Name', 'Alice', 'Barbara', 'Bob', 'Carol'],
+        )
+
+    def test_update_renamed_participant(self):
+        self._sync()
+        self.alice.name = "Zelda"
+        self.alice.save()
+
+        member_sheets.update_participant(self.discount, self.alice)
+        self.assertEqual(
+            [row[0] for row in self.wks.cells], ['Name', 'Bob', 'Carol', 'Zelda']
+        )
+        # The sheet matches its fingerprint, so future syncs send nothing
+        self.assertEqual(self._sync().api_calls, 0)
@@ -0,0 +1,84 @@
+import json
+from unittest import mock
+
+from ws import models
+from ws.tests import TestCase, factories
+from ws.utils import member_stats
+
+
+def _members(*rows):
+    """Mimic the gear database, which reports active members once per email."""
+    return mock.patch.object(
+        member_stats.geardb,
+        'stats_only_all_active_members',
+        return_value=[
+            (
+                email,
+                {
+                    'person_id': person_id,
+                    'last_known_affiliation': 'MIT undergrad',
+                    'num_rentals': num_rentals,
+                },
+            )
+            for person_id, email, num_rentals in rows
+        ],
+    )
+
+
+class RefreshMemberStatsTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.par = factories.ParticipantFactory.create(email='tim@mit.edu')
+        trip = factories.TripFactory.create()
+        factories.SignUpFactory.create(participant=self.par, trip=trip, on_trip=True)
+        factories.SignUpFactory.create(participant=self.par, on_trip=False)
+        trip.leaders.add(self.par)
+        self.par.discounts.add(factories.DiscountFactory.create())
+
+    @staticmethod
+    def _stats():
+        return {
+            stats.person_id: (stats.participant_id, stats.num_rentals)
+            for stats in models.MemberStats.objects.all()
+        }
+
+    def test_computed_for_members(self):
+        # Tim has two emails (only one of which has an account), Bob has none
+        with _members(
+            (1, 'tim@mit.edu', 3), (1, 'tim@example.com', 3), (2, 'bob@mit.edu', 0)
+        ):
+            summary = member_stats.refresh_member_stats()
+        self.assertEqual(summary, (2, 0, 0))
+
+        self.assertEqual(
+            json.loads(''.join(member_stats.stream_json())),
+            {
+                'members': [
+                    {
+                        'last_known_affiliation': 'MIT undergrad',
+                        'num_rentals': 3,
+                        'num_trips_attended': 1,
+                        'num_trips_led': 1,
+                        'num_discounts': 1,
+                    },
+                    {'last_known_affiliation': 'MIT undergrad', 'num_rentals': 0},
+                ]
+            },
+        )
+
+    def test_only_changes_written(self):
+        with _members((1, 'tim@mit.edu', 3), (2, 'bob@mit.edu', 0)):
+            member_stats.refresh_member_stats()
+        with _members((1, 'tim@mit.edu', 3), (2, 'bob@mit.edu', 0)):
+            self.assertEqual(member_stats.refresh_member_stats(), (0, 0, 0))
+
+        # Bob rented something, Tim's dues expired, Alice became a member
+        with _members((2, 'bob@mit.edu', 1), (3, 'alice@mit.edu', 0)):
+            self.assertEqual(member_stats.refresh_member_stats(), (1, 1, 1))
+        self.assertEqual(self._stats(), {2: (None, 1), 3: (None, 0)})
+
+        # Bob creates an account, and is matched up on the next refresh
+        bob = factories.ParticipantFactory.create(email='bob@mit.edu')
+        with _members((2, 'bob@mit.edu', 1), (3, 'alice@mit.edu', 0)):
+            self.assertEqual(member_stats.refresh_member_stats(), (0, 1, 0))
+        self.assertEqual(self._stats(), {2: (bob.pk, 1), 3: (None, 0)})
@@ -55,17 +55,13 @@ class UpdateMembershipCacheTest(TestCase):
 
         participant = factories.ParticipantFactory.create(membership=None, user=user)
 
-        with mock.patch.object(geardb, 'membership_expiration') as mem_exp:
-            mem_exp.return_value = {
-                'membership': {'expires': None, 'active': False, 'email': None},
-                'waiver': {'expires': None, 'active': False},
-                'status': 'Missing',
-            }
+        with mock.patch.object(geardb, 'matching_memberships') as all_matches:
+            all_matches.return_value = OrderedDict()
             membership.update_membership_cache(participant)
 
-        mem_exp.assert_called_once()
+        all_matches.assert_called_once()
         self.assertCountEqual(
-            mem_exp.call_args_list[0][0][0],
+            all_matches.call_args_list[0][0][0],
             ['primary@example.com', 'secondary@example.com'],
         )
         participant.refresh_from_db()
@@ -92,14 +88,14 @@ class UpdateMembershipCacheTest(TestCase):
         )
         factories.ParticipantFactory.create(membership=cached_now)
 
-        with mock.patch.object(membership, 'update_membership_cache') as update_cache:
+        with mock.patch.object(membership, 'refresh_memberships') as refresh:
             membership.refresh_all_membership_cache()
 
-        update_cache.assert_has_calls(
-            [mock.call(stale_participant), mock.call(no_membership_participant)],
-            any_order=True,
+        # All participants are refreshed in bulk (recent participant was omitted!)
+        refresh.assert_called_once()
+        self.assertCountEqual(
+            refresh.call_args[0][0], [stale_participant, no_membership_participant]
         )
-        self.assertEqual(update_cache.call_count, 2)  # recent participant was omitted!
 
 
 @freeze_time("2019-03-19 14:30:00 EST")
@@ -124,14 +120,14 @@ class RefreshAllMembershipCacheTest(TestCase):
         )
         factories.ParticipantFactory.create(membership=cached_now)
 
-        with mock.patch.object(membership, 'update_membership_cache') as update_cache:
+        with mock.patch.object(membership, 'refresh_memberships') as refresh:
             membership.refresh_all_membership_cache()
 
-        update_cache.assert_has_calls(
-            [mock.call(stale_participant), mock.call(no_membership_participant)],
-            any_order=True,
+        # All participants are refreshed in bulk (recent participant was omitted!)
+        refresh.assert_called_once()
+        self.assertCountEqual(
+            refresh.call_args[0][0], [stale_participant, no_membership_participant]
         )
-        self.assertEqual(update_cache.call_count, 2)  # recent participant was omitted!
 
 
 @freeze_time("2018-11-19 12:00:00 EST")
@@ -219,3 +215,78 @@ class CanAttendTripTests(TestCase):
         self.assertEqual(dated_membership.waiver_expires, date(2019, 11, 19))
 
         self.assertFalse(any(participant.reasons_cannot_attend(self.trip)))
+
+
+@freeze_time("2019-03-19 14:30:00 EST")
+class GetManyTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.recently_cached = factories.ParticipantFactory.create()
+        with freeze_time("2019-03-12 11:31:22 EST"):
+            stale = factories.MembershipFactory.create(
+                membership_expires=date(2019, 3, 1), waiver_expires=date(2019, 6, 1)
+            )
+        self.stale = factories.ParticipantFactory.create(membership=stale)
+        self.uncached = factories.ParticipantFactory.create(membership=None)
+        self.no_participant = factories.UserFactory.create()
+
+    @staticmethod
+    def _get_many(users, found, **kwargs):
+        def fake_lookup(emails):
+            return OrderedDict(
+                (email, found[email]) for email in emails if email in found
+            )
+
+        with mock.patch.object(
+            geardb, 'matching_memberships', side_effect=fake_lookup
+        ) as lookup:
+            memberships = membership.get_many(users, **kwargs)
+        return memberships, lookup
+
+    def test_only_stale_memberships_looked_up(self):
+        renewed = geardb.format_membership(
+            self.stale.email, date(2020, 3, 18), date(2020, 3, 18)
+        )
+        users = [
+            self.recently_cached.user,
+            self.stale.user,
+            self.uncached.user,
+            self.no_participant,
+        ]
+        memberships, lookup = self._get_many(users, {self.stale.email: renewed})
+
+        # One lookup for every user without a recently-cached membership
+        lookup.assert_called_once()
+        self.assertCountEqual(
+            lookup.call_args[0][0],
+            [self.stale.email, self.uncached.email, self.no_participant.email],
+        )
+
+        self.assertEqual(memberships[self.recently_cached.user_id]['status'], 'Active')
+        self.assertEqual(memberships[self.stale.user_id], renewed)
+        self.assertEqual(memberships[self.uncached.user_id]['status'], 'Missing')
+        self.assertEqual(memberships[self.no_participant.pk]['status'], 'Missing')
+
+        # The cache was updated for the participants we looked up
+        self.stale.membership.refresh_from_db()
+        self.assertEqual(self.stale.membership.membership_expires, date(2020, 3, 18))
+        self.uncached.refresh_from_db()
+        self.assertIsNotNone(self.uncached.membership)
+        self.assertIsNone(self.uncached.membership.membership_expires)
+
+    def test_any_cached_membership(self):
+        users = [self.recently_cached.user, self.stale.user]
+        memberships, lookup = self._get_many(users, {}, max_age=None)
+        lookup.assert_not_called()
+        self.assertEqual(
+            memberships[self.stale.user_id]['status'], 'Missing Membership'
+        )
+
+    def test_queries_do_not_scale_with_users(self):
+        participants = factories.ParticipantFactory.create_batch(10, membership=None)
+        users = [par.user for par in participants]
+
+        # Participants, emails, then create & link cached memberships
+        with self.assertNumQueries(4):
+            memberships, _ = self._get_many(users, {})
+        self.assertEqual(len(memberships), 10)
@@ -0,0 +1,54 @@
+from datetime import datetime
+
+from django.test import SimpleTestCase
+
+from ws.utils.rating_timeline import RatingTimeline
+
+JAN = datetime(2019, 1, 1)
+FEB = datetime(2019, 2, 1)
+MAR = datetime(2019, 3, 1)
+
+
+class RatingTimelineTests(SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        # Given in no particular order, as from the database
+        self.timeline = RatingTimeline(
+            [
+                ('climbing', FEB, 'Full leader', False),
+                ('climbing', JAN, 'Co-leader', False),
+                ('hiking', JAN, 'Leader', True),
+                ('climbing', MAR, 'Sport only', True),
+            ]
+        )
+
+    def test_no_ratings(self):
+        self.assertIsNone(RatingTimeline([]).rating('climbing'))
+        self.assertIsNone(self.timeline.rating('biking'))
+
+    def test_most_recent_active(self):
+        self.assertEqual(self.timeline.rating('climbing'), 'Sport only')
+        self.assertEqual(self.timeline.rating('hiking'), 'Leader')
+
+    def test_at_time(self):
+        self.assertIsNone(self.timeline.rating('climbing', at_time=FEB))
+        self.assertEqual(
+            self.timeline.rating('climbing', must_be_active=False, at_time=FEB),
+            'Full leader',
+        )
+        self.assertIsNone(
+            self.timeline.rating(
+                'climbing', must_be_active=False, at_time=datetime(2018, 12, 1)
+            )
+        )
+
+    def test_after_time(self):
+        self.assertEqual(self.timeline.rating('climbing', after_time=FEB), 'Sport only')
+        self.assertIsNone(self.timeline.rating('climbing', after_time=MAR))
+        self.assertIsNone(self.timeline.rating('climbing', at_time=FEB, after_time=JAN))
+        self.assertEqual(
+            self.timeline.rating(
+                'climbing', must_be_active=False, at_time=FEB, after_time=JAN
+            ),
+            'Full leader',
+        )
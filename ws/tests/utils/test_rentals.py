@@ -0,0 +1,97 @@
+from datetime import date, datetime
+from unittest import mock
+
+from freezegun import freeze_time
+
+from ws import models
+from ws.tests import TestCase, factories
+from ws.utils import geardb, rentals
+from ws.utils.dates import localize
+
+
+def _rental(email, gear_id, checkedout=date(2020, 1, 10)):
+    return geardb.Rental(
+        email=email,
+        id=gear_id,
+        name="Bicycle",
+        cost=10.0,
+        checkedout=checkedout,
+        overdue=False,
+    )
+
+
+@freeze_time("2020-01-15 09:00:00 EST")
+class RefreshRentalsTests(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.trip = factories.TripFactory.create(trip_date=date(2020, 1, 18))
+        self.leader = factories.ParticipantFactory.create()
+        self.trip.leaders.add(self.leader)
+        self.par = factories.SignUpFactory.create(
+            trip=self.trip, on_trip=True
+        ).participant
+
+    def test_upcoming_trip_participants(self):
+        waitlisted = factories.SignUpFactory.create(trip=self.trip, on_trip=False)
+        past_trip = factories.TripFactory.create(trip_date=date(2020, 1, 4))
+        past_leader = factories.ParticipantFactory.create()
+        past_trip.leaders.add(past_leader, self.leader)
+
+        upcoming = rentals.upcoming_trip_participants()
+        self.assertCountEqual(upcoming, [self.leader, self.par])
+        self.assertNotIn(waitlisted.participant, upcoming)
+
+    def test_refresh_in_one_call(self):
+        stale = models.Rental.objects.create(
+            participant=self.par,
+            email=self.par.email,
+            gear_id='OLD-01',
+            name="Returned",
+            cost=1,
+            checkedout=date(2019, 12, 1),
+        )
+
+        items = [
+            _rental(self.leader.email, 'BK-19-04'),
+            _rental(self.par.email, 'SK-1'),
+        ]
+        with mock.patch.object(geardb, 'outstanding_items', return_value=items) as api:
+            self.assertEqual(rentals.refresh_upcoming_rentals(), 2)
+        api.assert_called_once()
+        self.assertCountEqual(api.call_args[0][0], [self.leader.email, self.par.email])
+
+        self.assertFalse(models.Rental.objects.filter(pk=stale.pk).exists())
+        self.assertEqual(
+            [r.gear_id for r in models.Rental.objects.filter(participant=self.leader)],
+            ['BK-19-04'],
+        )
+        self.leader.refresh_from_db()
+        self.assertEqual(
+            self.leader.rentals_last_cached, localize(datetime(2020, 1, 15, 9, 0))
+        )
+
+    def test_trip_rentals(self):
+        self.assertEqual(rentals.trip_rentals(self.trip).last_cached, None)
+
+        items = [
+            _rental(self.par.email, 'SK-1'),
+            # Rented after the trip, so not reported
+            _rental(self.leader.email, 'BK-19-04', checkedout=date(2020, 1, 20)),
+        ]
+        with mock.patch.object(geardb, 'outstanding_items', return_value=items):
+            rentals.refresh_rentals([self.leader.pk, self.par.pk])
+
+        self.trip.refresh_from_db()
+        with self.assertNumQueries(3):
+            trip_rentals = rentals.trip_rentals(self.trip)
+        ((par, (item,)),) = trip_rentals.by_participant
+        self.assertEqual(par, self.par)
+        self.assertEqual(item.gear_id, 'SK-1')
+        self.assertEqual(
+            trip_rentals.last_cached, localize(datetime(2020, 1, 15, 9, 0))
+        )
+        self.assertEqual(trip_rentals.stale_participant_ids, [])
+
+        with freeze_time("2020-01-15 11:00:00 EST"):
+            stale = rentals.trip_rentals(self.trip).stale_participant_ids
+        self.assertCountEqual(stale, [self.leader.pk, self.par.pk])
@@ -0,0 +1,104 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase
+
+from ws import models
+from ws.tests import TestCase, factories
+from ws.utils import search
+
+
+class SearchTermsTests(SimpleTestCase):
+    def test_case_and_accents_folded(self):
+        self.assertEqual(search.search_terms("Élodie  MÜLLER"), ['elodie', 'muller'])
+
+    def test_punctuation_splits_words(self):
+        self.assertEqual(
+            search.search_terms("o'brien_bob@example.com"),
+            ['o', 'brien', 'bob', 'example', 'com'],
+        )
+
+    def test_fold_table(self):
+        self.assertEqual(len(search.FOLD_FROM), len(search.FOLD_TO))
+
+
+class ParticipantSearchMixin:
+    backend: search.ParticipantSearch
+
+    def setUp(self):
+        super().setUp()
+        self.michael = factories.ParticipantFactory.create(
+            name="Michael Bolton", email='mbolton@example.com'
+        )
+        self.michele = factories.ParticipantFactory.create(
+            name="Michèle Dubois", email='md@example.com'
+        )
+        self.ines = factories.ParticipantFactory.create(
+            name="Inés Fernández", email='ines.f@example.com'
+        )
+        factories.ParticipantFactory.create(name="Aaron Blake", email='ab@example.com')
+
+    def _search(self, text):
+        return list(self.backend.search(models.Participant.objects.all(), text))
+
+    def test_prefix_of_any_word(self):
+        self.assertEqual(self._search("mich"), [self.michael, self.michele])
+        self.assertEqual(self._search("dub"), [self.michele])
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self._search("Mich Bol"), [self.michael])
+        self.assertEqual(self._search("Mich Blake"), [])
+
+    def test_accents_and_case_ignored(self):
+        self.assertEqual(self._search("INES"), [self.ines])
+        self.assertEqual(self._search("fernandez"), [self.ines])
+        self.assertEqual(self._search("michèle"), [self.michele])
+
+    def test_email(self):
+        self.assertEqual(self._search("mbolton@exam"), [self.michael])
+        self.assertEqual(self._search("ines.f"), [self.ines])
+
+    def test_full_words_rank_first(self):
+        michelle = factories.ParticipantFactory.create(name="Aaron Michel")
+        self.assertEqual(self._search("michel"), [michelle, self.michele])
+
+    def test_nothing_to_search(self):
+        self.assertEqual(self._search(""), [])
+        self.assertEqual(self._search("@!"), [])
+
+    def test_narrows_queryset(self):
+        participants = models.Participant.objects.exclude(pk=self.michael.pk)
+        self.assertEqual(
+            list(self.backend.search(participants, "mich")), [self.michele]
+        )
+
+
+class PostgresParticipantSearchTests(ParticipantSearchMixin, TestCase):
+    backend = search.PostgresParticipantSearch()
+
+    def test_uses_index(self):
+        matches = self.backend.search(models.Participant.objects.all(), "mich")
+        sql, params = matches.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'EXPLAIN {sql}', params)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        self.assertIn('ws_participant_search', plan)
+
+
+class InMemoryParticipantSearchTests(ParticipantSearchMixin, TestCase):
+    backend = search.InMemoryParticipantSearch()
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_command(self):
+        stdout = StringIO()
+        call_command(
+            'benchmark_participant_search', sizes=[10, 30], searches=3, stdout=stdout
+        )
+        output = stdout.getvalue()
+        self.assertIn("30 participants:", output)
+        self.assertIn("indexed", output)
+        self.assertIn("All changes were rolled back.", output)
+        self.assertFalse(models.Participant.objects.exists())
@@ -1,6 +1,7 @@
 from unittest.mock import PropertyMock, patch
 
 from django.contrib import messages
+from django.db import transaction
 from django.test import RequestFactory, SimpleTestCase
 
 from ws import models
@@ -257,3 +258,97 @@ class UpdateQueuesTest(TestCase):
 
         wl_signup = models.WaitListSignup.objects.get(signup__trip=trip)
         self.assertEqual(wl_signup.signup, two)
+
+
+class ReorderSignupsTests(TestCase):
+    """Bulk reordering must match placing each signup in turn."""
+
+    @staticmethod
+    def _legacy_reorder(trip, ordered_signups):
+        models.SignUp.objects.filter(pk__in=[s.pk for s in ordered_signups]).update(
+            on_trip=False
+        )
+        signup_utils.update_signup_counts(models.Trip.objects.filter(pk=trip.pk))
+        for order, signup in enumerate(ordered_signups):
+            signup.on_trip = False
+            signup_utils.trip_or_wait(signup, trip_must_be_open=False)
+            signup_utils.next_in_order(signup, order)
+
+    @staticmethod
+    def _final_state(trip):
+        trip.refresh_from_db()
+        return (
+            [(s.pk, s.on_trip) for s in trip.signup_set.all()],
+            [s.pk for s in trip.waitlist.signups],
+        )
+
+    def _reordered_state(self, reorder, trip, ordered_pks):
+        """Return the final state after reordering (then roll back)."""
+        with transaction.atomic():
+            signups = models.SignUp.objects.select_related('waitlistsignup')
+            by_pk = signups.in_bulk(ordered_pks)
+            reorder(trip, [by_pk[pk] for pk in ordered_pks])
+            state = self._final_state(trip)
+            transaction.set_rollback(True)
+        return state
+
+    def _compare(self, trip, ordered_pks):
+        legacy = self._reordered_state(self._legacy_reorder, trip, ordered_pks)
+        bulk = self._reordered_state(signup_utils.reorder_signups, trip, ordered_pks)
+        self.assertEqual(legacy, bulk)
+        return bulk
+
+    @staticmethod
+    def _fcfs_trip(maximum_participants, num_on_trip, num_waitlisted):
+        trip = factories.TripFactory.create(
+            algorithm='fcfs', maximum_participants=maximum_participants
+        )
+        signups = [
+            factories.SignUpFactory.create(trip=trip)
+            for _ in range(num_on_trip + num_waitlisted)
+        ]
+        for signup in signups:
+            signup_utils.trip_or_wait(signup)
+        return trip, [signup.pk for signup in signups]
+
+    def test_shuffle_trip_with_space(self):
+        trip, pks = self._fcfs_trip(8, 4, 0)
+        on_trip, waitlisted = self._compare(trip, pks[::-1])
+        self.assertEqual(on_trip, [(pk, True) for pk in pks[::-1]])
+        self.assertEqual(waitlisted, [])
+
+    def test_full_trip_with_waitlist(self):
+        trip, pks = self._fcfs_trip(3, 3, 3)
+        on_trip, waitlisted = self._compare(trip, [pks[4], pks[0], pks[5], pks[3]])
+        self.assertEqual(sum(placed for _, placed in on_trip), 3)
+        self.assertEqual(len(waitlisted), 3)
+
+    def test_trip_shrank(self):
+        trip, pks = self._fcfs_trip(4, 4, 1)
+        models.Trip.objects.filter(pk=trip.pk).update(maximum_participants=2)
+        trip.refresh_from_db()
+        on_trip, waitlisted = self._compare(trip, pks)
+        self.assertEqual(sum(placed for _, placed in on_trip), 2)
+        self.assertEqual(waitlisted, pks[2:])
+
+    def test_only_some_signups_reordered(self):
+        trip, pks = self._fcfs_trip(4, 4, 2)
+        self._compare(trip, [pks[5], pks[1]])
+
+    def test_lottery_trip(self):
+        trip = factories.TripFactory.create(algorithm='lottery')
+        pks = [factories.SignUpFactory.create(trip=trip).pk for _ in range(3)]
+        on_trip, waitlisted = self._compare(trip, pks[::-1])
+        self.assertEqual(on_trip, [(pk, False) for pk in pks])
+        self.assertEqual(waitlisted, [])
+
+    def test_query_count_is_constant(self):
+        trip, pks = self._fcfs_trip(10, 10, 10)
+        signups = models.SignUp.objects.select_related('waitlistsignup')
+        by_pk = signups.in_bulk(pks)
+
+        # Read signups, one of each write, then recount (+ 2 for the savepoint).
+        # Nobody left on the waitlist was there before, so no update is needed.
+        # Deleting the 10 old waitlist entries reads them, then signals each.
+        with self.assertNumQueries(7 + 1 + 10):
+            signup_utils.reorder_signups(trip, [by_pk[pk] for pk in pks[::-1]])
@@ -1,12 +1,18 @@
+import json
 import time
+from collections import OrderedDict
+from datetime import date
 from unittest import mock
 
 import jwt
 from freezegun import freeze_time
 
 import ws.utils.perms as perm_utils
-from ws import enums, settings
+from ws import enums, models, settings, tasks
 from ws.tests import TestCase, factories
+from ws.utils import geardb as geardb_utils
+from ws.utils import rentals as rental_utils
+from ws.utils import signups as signup_utils
 
 
 class JWTSecurityTest(TestCase):
@@ -239,6 +245,43 @@ class JsonProgramLeadersViewTest(TestCase):
         )
 
 
+class JsonAllLeadersViewTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.rating = factories.LeaderRatingFactory.create(
+            participant__name='Tim Beaver', activity=enums.Activity.HIKING.value
+        )
+
+    def test_conditional_get(self):
+        response = self.client.get('/leaders.json/')
+        self.assertEqual(response.json()['leaders'][0]['name'], 'Tim Beaver')
+
+        with self.assertNumQueries(1):
+            unchanged = self.client.get(
+                '/leaders.json/', HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(unchanged.status_code, 304)
+
+        # Deactivating a rating changes the response
+        self.rating.active = False
+        self.rating.save()
+        changed = self.client.get('/leaders.json/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.json(), {'leaders': []})
+
+    def test_leaders_not_served_public_response(self):
+        public = self.client.get('/leaders.json/')
+        self.assertNotIn('ratings', public.json()['leaders'][0])
+
+        self.client.force_login(self.rating.participant.user)
+        response = self.client.get('/leaders.json/', HTTP_IF_NONE_MATCH=public['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()['leaders'][0]['ratings'],
+            [{'activity': 'hiking', 'rating': self.rating.rating}],
+        )
+
+
 class JsonParticipantsTest(TestCase):
     def setUp(self):
         super().setUp()
@@ -288,16 +331,20 @@ class JsonParticipantsTest(TestCase):
         self.assertEqual(response.json(), {'participants': []})
 
         # Search everybody matching 'mich' (matches all but Aaron)
+        # No full word matches, so participants are sorted by name.
         response = self.client.get('/participants.json?search=Mich')
         matches = response.json()['participants']
-        # TODO: Once using FTS or something, assert order.
-        # For now, we just return in any given order.
-        self.assertCountEqual(matches, [searcher, *others])
+        self.assertEqual(matches, [*others, searcher])
 
         # Exclude self when searching
         response = self.client.get('/participants.json?search=Mich&exclude_self=1')
         no_self_matches = response.json()['participants']
-        self.assertCountEqual(no_self_matches, others)
+        self.assertEqual(no_self_matches, others)
+
+        # Full word matches come first
+        response = self.client.get('/participants.json?search=michele')
+        matches = response.json()['participants']
+        self.assertEqual(matches, [self._expect(michele), self._expect(miguel)])
 
     def test_exact_id(self):
         """Participants can be queried by an exact ID."""
@@ -355,3 +402,289 @@ class ApproveTripViewTest(TestCase):
         self._approve(trip, approved=False)
         trip.refresh_from_db()
         self.assertFalse(trip.chair_approved)
+
+
+@freeze_time("2019-01-01 12:00:00 EST")
+class JsonTripsViewTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.leader = factories.ParticipantFactory.create(name='Tim Beaver')
+        factories.LeaderRatingFactory.create(
+            participant=self.leader,
+            activity=enums.Activity.WINTER_SCHOOL.value,
+            rating='Co-leader',
+        )
+        # Several trips share a date, so `time_created` & `id` break ties
+        self.trips = [
+            factories.TripFactory.create(trip_date=trip_date)
+            for trip_date in [
+                date(2019, 1, 5),
+                date(2019, 1, 12),
+                date(2019, 1, 12),
+                date(2019, 1, 12),
+                date(2019, 1, 19),
+            ]
+        ]
+        self.trips[1].leaders.add(self.leader)
+
+    def _all_pages(self, url):
+        trip_ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            trip_ids.extend(trip['id'] for trip in response.json()['trips'])
+            url = response.json()['next']
+        return trip_ids
+
+    def test_paginated(self):
+        ordered = models.Trip.objects.order_by('-trip_date', '-time_created', '-pk')
+        self.assertEqual(
+            self._all_pages('/trips.json?limit=2'),
+            [trip.pk for trip in ordered],
+        )
+
+    def test_pages_take_constant_queries(self):
+        response = self.client.get('/trips.json?limit=2')
+        # Trips, leaders & ratings are each fetched with a single query
+        with self.assertNumQueries(3):
+            response = self.client.get(response.json()['next'])
+        (_, tie_broken) = response.json()['trips']
+        self.assertEqual(tie_broken['id'], self.trips[1].pk)
+        self.assertEqual(
+            tie_broken['leaders'],
+            [{'id': self.leader.pk, 'name': 'Tim Beaver', 'rating': 'Co-leader'}],
+        )
+
+    def test_filters(self):
+        fcfs = factories.TripFactory.create(
+            trip_date=date(2019, 1, 12),
+            program=enums.Program.CLIMBING.value,
+            algorithm='fcfs',
+        )
+        fcfs.leaders.add(self.leader)
+
+        self.assertEqual(self._all_pages('/trips.json?program=climbing'), [fcfs.pk])
+        self.assertEqual(self._all_pages('/trips.json?algorithm=fcfs'), [fcfs.pk])
+        self.assertEqual(
+            self._all_pages(f'/trips.json?leader={self.leader.pk}&limit=1'),
+            [fcfs.pk, self.trips[1].pk],
+        )
+        self.assertEqual(
+            self._all_pages('/trips.json?after=2019-01-06&before=2019-01-12'),
+            [fcfs.pk, self.trips[3].pk, self.trips[2].pk, self.trips[1].pk],
+        )
+
+    def test_invalid_queries(self):
+        for query in [
+            'cursor=garbage',
+            'cursor=WzEsIDIsIDNd',  # [1, 2, 3]
+            'program=snowmobiling',
+            'leader=tim',
+            'after=yesterday',
+            'limit=all',
+        ]:
+            response = self.client.get(f'/trips.json?{query}')
+            self.assertEqual(response.status_code, 400, query)
+
+
+class AdminTripSignupsViewTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.leader = factories.ParticipantFactory.create()
+        self.client.force_login(self.leader.user)
+        self.trip = factories.TripFactory.create(
+            algorithm='fcfs', maximum_participants=2
+        )
+        self.trip.leaders.add(self.leader)
+
+    def _post(self, signups, **kwargs):
+        return self.client.post(
+            f'/trips/{self.trip.pk}/admin/signups/',
+            {'signups': signups, **kwargs},
+            content_type='application/json',
+        )
+
+    def test_reorder_and_delete(self):
+        one, two, three, four = (
+            factories.SignUpFactory.create(trip=self.trip) for _ in range(4)
+        )
+        for signup in [one, two, three, four]:
+            signup_utils.trip_or_wait(signup)
+
+        response = self._post(
+            [
+                {'id': four.pk},
+                {'id': two.pk, 'deleted': True},
+                {'id': three.pk},
+                {'id': one.pk},
+            ]
+        )
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(
+            [(s.pk, s.on_trip) for s in self.trip.signup_set.all()],
+            [(four.pk, True), (three.pk, True), (one.pk, False)],
+        )
+        self.assertEqual(list(self.trip.waitlist.signups), [one])
+
+    def test_queries_do_not_scale_with_signups(self):
+        signups = [factories.SignUpFactory.create(trip=self.trip) for _ in range(20)]
+        for signup in signups:
+            signup_utils.trip_or_wait(signup)
+
+        # (Plus one query to read, then one per signup, leaving the waitlist)
+        with self.assertNumQueries(21 + 1 + 2):
+            response = self._post([{'id': s.pk} for s in reversed(signups)])
+        self.assertEqual(response.status_code, 200)
+
+    def test_signups_changed(self):
+        signup = factories.SignUpFactory.create(trip=self.trip)
+        signup_utils.trip_or_wait(signup)
+        factories.SignUpFactory.create(trip=self.trip, on_trip=True)
+
+        response = self._post([{'id': signup.pk}])
+        self.assertEqual(response.status_code, 400)
+
+
+class MembershipStatusesViewTest(TestCase):
+    def test_cached_and_looked_up(self):
+        leader = factories.ParticipantFactory.create()
+        factories.LeaderRatingFactory.create(participant=leader)
+        self.client.force_login(leader.user)
+
+        cached = factories.ParticipantFactory.create()
+        uncached = factories.ParticipantFactory.create(membership=None)
+
+        with mock.patch.object(
+            geardb_utils, 'matching_memberships', return_value=OrderedDict()
+        ) as lookup:
+            response = self.client.post(
+                '/participants/membership_statuses/',
+                {'participant_ids': [cached.pk, uncached.pk, -1]},
+                content_type='application/json',
+            )
+
+        # Only the participant without a cached membership was looked up
+        lookup.assert_called_once_with([uncached.email])
+        statuses = {
+            int(pk): membership['status']
+            for pk, membership in response.json()['memberships'].items()
+        }
+        self.assertEqual(
+            statuses, {cached.pk: 'Active', uncached.pk: 'Missing', -1: 'Missing'}
+        )
+
+
+class RawMembershipStatsViewTest(TestCase):
+    def test_streams_precomputed_stats(self):
+        leader = factories.ParticipantFactory.create()
+        factories.LeaderRatingFactory.create(participant=leader)
+        self.client.force_login(leader.user)
+        models.MemberStats.objects.create(
+            person_id=37, last_known_affiliation='MIT alum', num_rentals=2
+        )
+
+        # (Tests may not query the gear database, so this would fail if we tried)
+        response = self.client.get('/stats/membership.json')
+        self.assertEqual(
+            json.loads(b''.join(response.streaming_content)),
+            {'members': [{'last_known_affiliation': 'MIT alum', 'num_rentals': 2}]},
+        )
+
+
+@freeze_time("2020-01-15 09:00:00 EST")
+class RentalsViewsTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.trip = factories.TripFactory.create(trip_date=date(2020, 1, 18))
+        self.par = factories.SignUpFactory.create(
+            trip=self.trip, on_trip=True
+        ).participant
+        self.items = [
+            geardb_utils.Rental(
+                email=self.par.email,
+                id='BK-19-04',
+                name="Bicycle",
+                cost=10.0,
+                checkedout=date(2020, 1, 10),
+                overdue=False,
+            )
+        ]
+
+    def _refresh(self):
+        with mock.patch.object(
+            geardb_utils, 'outstanding_items', return_value=self.items
+        ):
+            rental_utils.refresh_rentals([self.par.pk])
+
+    def test_trip_rentals_leaders_only(self):
+        self.client.force_login(self.par.user)
+        response = self.client.get(f'/trips/{self.trip.pk}/rentals.json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_trip_rentals_from_cache(self):
+        leader = factories.ParticipantFactory.create()
+        factories.LeaderRatingFactory.create(participant=leader)
+        self.client.force_login(leader.user)
+        self._refresh()
+
+        with mock.patch.object(tasks.refresh_rentals, 'delay') as refresh:
+            response = self.client.get(f'/trips/{self.trip.pk}/rentals.json')
+        refresh.assert_not_called()
+        self.assertEqual(
+            response.json(),
+            {
+                'rentals': [
+                    {
+                        'participant': {'id': self.par.pk, 'name': self.par.name},
+                        'items': [
+                            {
+                                'email': self.par.email,
+                                'id': 'BK-19-04',
+                                'name': 'Bicycle',
+                                'cost': 10.0,
+                                'checkedout': '2020-01-10',
+                                'overdue': False,
+                            }
+                        ],
+                    }
+                ],
+                'last_cached': '2020-01-15T14:00:00Z',
+                'refreshing': False,
+            },
+        )
+
+        # The page itself reads from the same cache
+        response = self.client.get(f'/trips/{self.trip.pk}/')
+        ((par, (item,)),) = response.context['rentals_by_par']
+        self.assertEqual((par, item.gear_id), (self.par, 'BK-19-04'))
+
+    def test_stale_trip_rentals_refreshed_in_background(self):
+        self.client.force_login(factories.LeaderRatingFactory.create().participant.user)
+        self._refresh()
+
+        with freeze_time("2020-01-15 11:00:00 EST"):
+            with mock.patch.object(tasks.refresh_rentals, 'delay') as refresh:
+                response = self.client.get(f'/trips/{self.trip.pk}/rentals.json')
+        refresh.assert_called_once_with([self.par.pk])
+        self.assertTrue(response.json()['refreshing'])
+        self.assertEqual(len(response.json()['rentals']), 1)
+
+    def test_user_rentals(self):
+        self.client.force_login(self.par.user)
+        url = f'/users/{self.par.user_id}/rentals.json'
+
+        # The first lookup is made directly
+        with mock.patch.object(
+            geardb_utils, 'outstanding_items', return_value=self.items
+        ) as api:
+            response = self.client.get(url)
+        api.assert_called_once()
+        self.assertEqual([r['id'] for r in response.json()['rentals']], ['BK-19-04'])
+
+        # Later lookups are served from the cache
+        with freeze_time("2020-01-15 11:00:00 EST"):
+            with mock.patch.object(tasks.refresh_rentals, 'delay') as refresh:
+                response = self.client.get(url)
+        refresh.assert_called_once_with([self.par.pk])
+        self.assertEqual([r['id'] for r in response.json()['rentals']], ['BK-19-04'])
@@ -36,3 +36,50 @@ class UpcomingTripsViewTest(TestCase):
         self.assertEqual(march.creator.string, 'Suzy Queue')
         self.assertEqual(march.description.string, 'A hike taking place in March')
         self.assertEqual(march.pubDate.string, 'Wed, 01 Jan 2020 12:25:00 -0500')
+
+    def test_conditional_get(self):
+        trip = factories.TripFactory.create(trip_date='2020-02-10')
+        response = self.client.get('/trips.rss')
+        etag = response['ETag']
+        self.assertFalse(response.has_header('Last-Modified'))
+
+        # Polling an unchanged feed takes just one query (whether cached or not)
+        with self.assertNumQueries(1):
+            unchanged = self.client.get('/trips.rss', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(unchanged.status_code, 304)
+        with self.assertNumQueries(1):
+            cached = self.client.get('/trips.rss')
+        self.assertEqual(cached.content, response.content)
+
+        trip.name = 'Renamed trip'
+        with freeze_time("Wed, 1 Jan 2020 12:30:00 EST"):
+            trip.save()
+        changed = self.client.get('/trips.rss', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+        self.assertIn(b'Renamed trip', changed.content)
+
+    def test_changes_without_newer_timestamps(self):
+        """Changes which no timestamp reflects still change the ETag."""
+        trip = factories.TripFactory.create(trip_date='2020-02-10')
+        response = self.client.get('/trips.rss')
+        etag = response['ETag']
+
+        # Clients can't rely on If-Modified-Since, so always get the feed
+        since = self.client.get(
+            '/trips.rss', HTTP_IF_MODIFIED_SINCE='Wed, 01 Jan 2020 18:00:00 GMT'
+        )
+        self.assertEqual(since.status_code, 200)
+
+        creator = trip.creator
+        creator.name = 'Renamed Creator'
+        with freeze_time("Wed, 1 Jan 2020 12:30:00 EST"):
+            creator.save()
+        renamed = self.client.get('/trips.rss', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(renamed.status_code, 200)
+        self.assertIn(b'Renamed Creator', renamed.content)
+
+        trip.delete()
+        deleted = self.client.get('/trips.rss', HTTP_IF_NONE_MATCH=renamed['ETag'])
+        self.assertEqual(deleted.status_code, 200)
+        self.assertNotIn(b'Renamed Creator', deleted.content)
@@ -373,6 +373,11 @@ urlpatterns = [
         api_views.JsonParticipantsView.as_view(),
         name='json-participants',
     ),
+    url(
+        r'^instrumentation.json$',
+        api_views.InstrumentationSummaryView.as_view(),
+        name='json-instrumentation',
+    ),
     url(
         r'^leaders/(?P<pk>\d+)/ratings/(?P<activity>.+).json',
         api_views.get_rating,
@@ -388,6 +393,12 @@ urlpatterns = [
         api_views.UserRentalsView.as_view(),
         name='json-rentals',
     ),
+    url(r'^trips.json$', api_views.JsonTripsView.as_view(), name='json-trips'),
+    url(
+        r'^trips/(?P<pk>\d+)/rentals.json$',
+        api_views.TripRentalsView.as_view(),
+        name='json-trip_rentals',
+    ),
     url(
         r'^trips/(?P<pk>\d+)/signups/$',
         api_views.SimpleSignupsView.as_view(),
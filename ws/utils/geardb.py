@@ -7,20 +7,22 @@ of integrating with this one via an API layer).
 In the meantime, this module contains some direct database access to an
 externally-hosted MySQL database.
 """
+import functools
 import logging
 import typing
-from collections import OrderedDict
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, datetime, timedelta
-from typing import Any, Dict, Iterator, List
+from typing import Any, Dict, Iterator, List, Tuple
 from urllib.parse import urljoin
 
 import requests
 from django.db import connections
-from django.db.models import Case, Count, IntegerField, Sum, When
-from django.db.models.functions import Lower
 from mitoc_const import affiliations
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-from ws import models, settings
+from ws import instrumentation, models, settings
 from ws.utils import api as api_util
 from ws.utils.dates import datetime_from_iso, local_date
 
@@ -53,26 +55,104 @@ def gear_bearer_jwt(**payload) -> str:
     return api_util.bearer_jwt(settings.GEARDB_SECRET_KEY, **payload)
 
 
-def query_api(route: str, **params: Any) -> List[JsonDict]:
-    """Request results from the API on mitoc-gear.mit.edu."""
-    response = requests.get(
-        urljoin(API_BASE, route),
+class GearAPIClient:
+    """A client for the API on mitoc-gear.mit.edu.
+
+    Connections are pooled (and kept alive) between calls, every request has
+    a timeout, and requests which fail for transient reasons (connection
+    errors, or a gateway error from the server) are retried with backoff.
+
+    Paginated results are followed through their `next` links, and lookups
+    by many values (e.g. every email address on a trip) are split into
+    batches which are fetched concurrently.
+    """
+
+    def __init__(
+        self,
+        base_url: str = API_BASE,
+        *,
+        timeout: Tuple[float, float] = (3.05, 10),  # (Connect, read) in seconds
+        retries: int = 3,
+        backoff_factor: float = 0.5,
+        max_workers: int = 4,
+    ):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_workers = max_workers
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(502, 503, 504),
+            raise_on_status=False,  # (We'll raise `APIError` ourselves)
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=max_workers, max_retries=retry
+        )
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _get_page(self, url: str, headers, params=None) -> JsonDict:
+        with instrumentation.external_call('geardb'):
+            try:
+                response = self.session.get(
+                    url, headers=headers, params=params, timeout=self.timeout
+                )
+            except requests.RequestException as e:
+                raise APIError(f"Could not reach {url}") from e
+        if response.status_code != 200:
+            raise APIError(f"{url} responded with {response.status_code}")
+        return response.json()
+
+    def get(self, route: str, **params: Any) -> List[JsonDict]:
+        """Request all results for the route, following any pagination."""
         # NOTE: We sign the payload here, even though current implementations only use query params.
         # This does technically mean that anyone with a valid token can use the token to query any data.
         # However, tokens aren't given to end users, only used on the systems which already have the secret.
-        headers={'Authorization': gear_bearer_jwt(**params)},
-        params=params,
-    )
-    if response.status_code != 200:
-        raise APIError()
+        headers = {'Authorization': gear_bearer_jwt(**params)}
 
-    body = response.json()
-    results: List[JsonDict] = body['results']
+        body = self._get_page(urljoin(self.base_url, route), headers, params)
+        results: List[JsonDict] = body['results']
+        while body['next']:
+            body = self._get_page(body['next'], headers)  # (Link includes params)
+            results.extend(body['results'])
 
-    if body['next'] or len(results) != body['count']:
-        logger.error("Results are paginated; this is not expected or handled.")
+        if len(results) != body['count']:
+            logger.warning("Expected %d results, got %d", body['count'], len(results))
+        return results
+
+    def get_batched(
+        self, route: str, key: str, values: List[Any], batch_size: int = 50
+    ) -> List[JsonDict]:
+        """Request results for many values of a query param (in concurrent batches).
+
+        Results are returned in the order that batches were given.
+        """
+        batches = [
+            values[i : i + batch_size] for i in range(0, len(values), batch_size)
+        ]
+        if len(batches) <= 1:
+            return self.get(route, **{key: values}) if values else []
 
-    return results
+        # Calls in worker threads are invisible to the instrumentation; time the lot
+        with instrumentation.external_call('geardb'):
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                pages = executor.map(
+                    lambda batch: self.get(route, **{key: batch}), batches
+                )
+                return [result for page in pages for result in page]
+
+
+@functools.lru_cache(maxsize=None)
+def api_client() -> GearAPIClient:
+    """Return a client shared by this process (so that connections are reused)."""
+    return GearAPIClient()
+
+
+def query_api(route: str, **params: Any) -> List[JsonDict]:
+    """Request results from the API on mitoc-gear.mit.edu."""
+    return api_client().get(route, **params)
 
 
 class Rental(typing.NamedTuple):
@@ -130,27 +210,12 @@ def membership_expiration(emails):
     It also calculates whether or not the membership has expired.
     """
 
-    def expiration_date(info):
-        mem_expires = info['membership']['expires']
-        return (mem_expires is not None, mem_expires, *waiver_date(info))
-
-    def waiver_date(info):
-        waiver_expires = info['waiver']['expires']
-        return (waiver_expires is not None, waiver_expires)
-
     # Find all memberships under one or more of the participant's emails
     memberships_by_email = matching_memberships(emails)
     if not memberships_by_email:
         return repr_blank_membership()
 
-    # The most recent account should be considered as their one membership
-    most_recent = max(memberships_by_email.values(), key=expiration_date)
-
-    # If there's an older membership with an active waiver, use that!
-    if not most_recent['membership']['active']:
-        last_waiver = max(memberships_by_email.values(), key=waiver_date)
-        if last_waiver['waiver']['active']:
-            most_recent = last_waiver
+    most_recent = most_recent_membership(memberships_by_email.values())
 
     # Since we fetched the most current information from the db, update cache
     # TODO: Should probably refactor this method so it doesn't have unclear side effects
@@ -165,6 +230,31 @@ def membership_expiration(emails):
     return most_recent
 
 
+def most_recent_membership(memberships):
+    """Of all memberships belonging to one person, return the most relevant."""
+
+    def expiration_date(info):
+        mem_expires = info['membership']['expires']
+        return (mem_expires is not None, mem_expires, *waiver_date(info))
+
+    def waiver_date(info):
+        waiver_expires = info['waiver']['expires']
+        return (waiver_expires is not None, waiver_expires)
+
+    memberships = list(memberships)
+
+    # The most recent account should be considered as their one membership
+    most_recent = max(memberships, key=expiration_date)
+
+    # If there's an older membership with an active waiver, use that!
+    if not most_recent['membership']['active']:
+        last_waiver = max(memberships, key=waiver_date)
+        if last_waiver['waiver']['active']:
+            most_recent = last_waiver
+
+    return most_recent
+
+
 def format_cached_membership(participant):
     """Format a ws.models.Membership object as a server response."""
     mem = participant.membership
@@ -289,6 +379,29 @@ def matching_memberships(emails):
     return OrderedDict(_yield_matches(emails))
 
 
+def memberships_by_user(
+    email_to_user: Dict[str, int], chunk_size: int = 500
+) -> Dict[int, JsonDict]:
+    """Return the most relevant membership for each user with one on file.
+
+    Unlike `membership_expiration()`, this is meant for looking up many users
+    at once: emails are queried in chunks (one query per chunk), and the
+    membership cache is left untouched.
+    """
+    emails = list(email_to_user)
+    found: Dict[int, List[JsonDict]] = defaultdict(list)
+    for i in range(0, len(emails), chunk_size):
+        for email, membership in matching_memberships(
+            emails[i : i + chunk_size]
+        ).items():
+            found[email_to_user[email]].append(membership)
+
+    return {
+        user_id: most_recent_membership(memberships)
+        for user_id, memberships in found.items()
+    }
+
+
 def outstanding_items(emails: List[str]) -> Iterator[Rental]:
     """Return all items that are currently checked out to one or more members.
 
@@ -316,7 +429,8 @@ def outstanding_items(emails: List[str]) -> Iterator[Rental]:
 
     today = local_date()
 
-    for result in query_api('rentals/', email=emails):  # One row per item
+    # One row per item
+    for result in api_client().get_batched('rentals/', 'email', emails):
         person, gear = result['person'], result['gear']
 
         # Map from the person record back to the requested email address
@@ -436,7 +550,11 @@ def update_affiliation(participant):
         )
 
 
-def _stats_only_all_active_members():
+# NOTE: This method is only used for the (leaders-only, hacky, `/stats` endpoint)
+# We of course should avoid direct database access, but I'm okay with this not being tested.
+# Worst case, it just breaks a stats-reporting page that I wrote as a one-off.
+# I should make better dashboards in the long run anyway.
+def stats_only_all_active_members():
     """Yield emails and rental activity for all members with current dues."""
     cursor = connections['geardb'].cursor()
     cursor.execute(
@@ -467,98 +585,3 @@ def _stats_only_all_active_members():
                 'num_rentals': num_rentals,
             }
             yield email, info
-
-
-def trips_information():
-    """Give important counts, indexed by user IDs.
-
-    Each participant has a singular underlying user. This user has one or more
-    email addresses, which form the link back to the gear database.
-    The user database lives separately from the participant database, so we'll
-    need to make a separate query for user information anyway.
-    """
-    # TODO: Last year only?
-    signup_on_trip = Case(
-        When(signup__on_trip=True, then=1), default=0, output_field=IntegerField()
-    )
-
-    trips_per_participant = dict(
-        models.Participant.objects.all()
-        .annotate(
-            # NOTE: Adding other annotations results in double-counting signups
-            # (We do multiple JOINs, and can't easily pass a DISTINCT to the Sum)
-            num_trips_attended=Sum(signup_on_trip)
-        )
-        .values_list('pk', 'num_trips_attended')
-    )
-
-    additional_stats = (
-        models.Participant.objects.all()
-        .annotate(
-            num_discounts=Count('discounts', distinct=True),
-            num_trips_led=Count('trips_led', distinct=True),
-        )
-        .values_list('pk', 'user_id', 'num_discounts', 'num_trips_led')
-    )
-
-    for (pk, user_id, num_discounts, num_trips_led) in additional_stats:
-        info = {
-            'num_trips_attended': trips_per_participant[pk],
-            'num_trips_led': num_trips_led,
-            'num_discounts': num_discounts,
-        }
-        yield user_id, info
-
-
-# NOTE: This method is only used for the (leaders-only, hacky, `/stats` endpoint)
-# We of course should avoid direct database access, but I'm okay with this not being tested.
-# Worst case, it just breaks a stats-reporting page that I wrote as a one-off.
-# I should make better dashboards in the long run anyway.
-def membership_information():
-    """All current active members, annotated with additional info.
-
-    For each paying member, we also mark if they:
-    - have attended any trips
-    - have led any trips
-    - have rented gear
-    - make use MITOC discounts
-    """
-    # Get trips information indexed by Trips user ID's
-    info_by_user_id = dict(trips_information())
-
-    # Bridge from a lowercase email address to a Trips user ID
-    email_to_user_id = dict(
-        models.EmailAddress.objects.filter(verified=True)
-        .annotate(lower_email=Lower('email'))
-        .values_list('lower_email', 'user_id')
-    )
-
-    def trips_info_for(email):
-        try:
-            user_id = email_to_user_id[email]
-        except KeyError:  # No Trips account
-            return {}
-
-        try:
-            return info_by_user_id[user_id]
-        except KeyError:  # User, but no corresponding Participant
-            return {}
-
-    # Map from the gear database's person ID to stats about the member
-    all_members = {}
-
-    for email, info in _stats_only_all_active_members():
-        existing_record = all_members.get(info['person_id'])
-
-        if existing_record:
-            # We already recorded them as a member, don't report twice
-            # However, we might only have trips info under an alternate email
-            existing_record.update(trips_info_for(email))
-            continue
-
-        all_members[info['person_id']] = {
-            'last_known_affiliation': info['last_known_affiliation'],
-            'num_rentals': info['num_rentals'],
-            **trips_info_for(email),
-        }
-    return all_members
@@ -8,18 +8,22 @@ spreadsheets. Each spreadsheet will be shared with the company offering the
 discount, so that they can verify membership status.
 """
 import bisect
+import difflib
 import functools
+import hashlib
+import json
 import logging
 import os.path
+import time
 import typing
-from itertools import zip_longest
 
 import gspread
 import httplib2
+from gspread.utils import rowcol_to_a1
 from oauth2client.service_account import ServiceAccountCredentials
 
-from ws import enums, models, settings
-from ws.utils import geardb
+from ws import enums, instrumentation, models, settings
+from ws.utils import membership
 from ws.utils.perms import is_chair
 
 logger = logging.getLogger(__name__)
@@ -68,18 +72,14 @@ def with_refreshed_token(func):
     def func_wrapper(*args, **kwargs):
         client, credentials = connect_to_sheets()
         if credentials.access_token_expired:
-            credentials.refresh(httplib2.Http())  # (`client` points to this)
-            client.login()  # Log in again to refresh credentials
-        func(*args, **kwargs)
+            with instrumentation.external_call('gspread'):
+                credentials.refresh(httplib2.Http())  # (`client` points to this)
+                client.login()  # Log in again to refresh credentials
+        return func(*args, **kwargs)
 
     return func_wrapper
 
 
-def grouper(iterable, n, fillvalue=None):
-    args = [iter(iterable)] * n
-    return zip_longest(*args, fillvalue=fillvalue)
-
-
 class SpreadsheetLabels(typing.NamedTuple):
     name: str
     email: str
@@ -158,27 +158,30 @@ class SheetWriter:
         return 'Standard'
 
     @staticmethod
-    def membership_status(user):
+    def membership_status(membership_info):
         """Return membership status, irrespective of waiver status.
 
         (Companies don't care about participant waiver status, so ignore it).
         """
-        # Status is one external query per user. Expensive! (We should refactor...)
-        membership = geardb.user_membership_expiration(user)['membership']
+        membership_details = membership_info['membership']
 
         # We report Active/Expired, since companies don't care about waiver status
-        if membership['active']:
+        if membership_details['active']:
             return 'Active'
-        if membership['expires']:
-            return 'Expired {}'.format(membership['expires'].isoformat())
+        if membership_details['expires']:
+            return 'Expired {}'.format(membership_details['expires'].isoformat())
         return 'Missing'
 
-    def get_row(self, participant, user):
-        """Get the row values that match the header for this discount sheet."""
+    def get_row(self, participant, user, membership_info):
+        """Get the row values that match the header for this discount sheet.
+
+        `membership_info` should come from `ws.utils.membership.get_many`
+        (looking up memberships one user at a time is expensive!)
+        """
         row_mapper = {
             self.labels.name: participant.name,
             self.labels.email: participant.email,
-            self.labels.membership: self.membership_status(user),
+            self.labels.membership: self.membership_status(membership_info),
             self.labels.student: participant.get_affiliation_display(),
             self.labels.school: self.school(participant),
         }
@@ -192,71 +195,278 @@ class SheetWriter:
         return [row_mapper[label] for label in self.header]
 
 
-def assign(cells, values):
-    for cell, value in zip(cells, values):
-        cell.value = value
+# Before sheets were synced by diffing, every update took three API calls
+# (after opening the sheet): `resize`, `range` & `update_cells` to rewrite the
+# entire sheet, or `findall`, `col_values` & `insert_row` for one participant.
+LEGACY_API_CALLS = 3
 
 
-@with_refreshed_token
-def update_participant(discount, participant):
-    """Add or update the participant.
+def row_digest(values: typing.Sequence[str]) -> str:
+    return hashlib.sha1('\x1f'.join(values).encode()).hexdigest()
 
-    Much more efficient than updating the entire sheet.
-    """
-    user = models.User.objects.get(pk=participant.user_id)
-    client, _ = connect_to_sheets()
-    wks = client.open_by_key(discount.ga_key).sheet1
-    writer = SheetWriter(discount)
 
-    new_row = writer.get_row(participant, user)
+class SheetRow(typing.NamedTuple):
+    name: str
+    email: str
+    digest: str
+    # Cell values are only known for rows we're about to write
+    # (fingerprints store just enough to tell if a row has changed)
+    values: typing.Optional[typing.List[str]] = None
 
-    # Attempt to find existing row, update it if found
-    last_col = len(writer.header)
-    for cell in wks.findall(participant.email):
-        if cell.col == 2:  # (Participants _could_ name themselves an email...)
-            # pylint: disable=too-many-function-args
-            row_cells = wks.range(cell.row, cell.col, cell.row, last_col)
-            assign(row_cells, new_row)
-            return
+    @classmethod
+    def from_values(cls, values: typing.List[str]) -> 'SheetRow':
+        return cls(values[0], values[1], row_digest(values), values)
 
-    # Insert a new row if no existing row found
-    sorted_names = wks.col_values(1)[1:]
-    row_index = bisect.bisect(sorted_names, participant.name) + 1
-    wks.insert_row(new_row, row_index + 1)
 
+class RowDiff(typing.NamedTuple):
+    requests: typing.List[dict]  # Row insertions & deletions, in order
+    to_write: typing.List[typing.Tuple[int, int]]  # Slices of rows to write
+    num_inserted: int
+    num_deleted: int
 
-@with_refreshed_token
-def update_discount_sheet(discount):
-    """Update the entire worksheet, updating all members' status.
 
-    This will remove members who no longer wish to share their information,
-    so it's important to run this periodically.
+def _delete_rows(sheet_id: int, start: int, end: int) -> dict:
+    dimension_range = {
+        'sheetId': sheet_id,
+        'dimension': 'ROWS',
+        'startIndex': start,
+        'endIndex': end,
+    }
+    return {'deleteDimension': {'range': dimension_range}}
 
-    For individual updates, this approach should be avoided (instead, opting to
-    update individual cells in the spreadsheet).
+
+def _insert_rows(sheet_id: int, start: int, num: int, at_end: bool) -> dict:
+    if at_end:
+        return {
+            'appendDimension': {'sheetId': sheet_id, 'dimension': 'ROWS', 'length': num}
+        }
+    dimension_range = {
+        'sheetId': sheet_id,
+        'dimension': 'ROWS',
+        'startIndex': start,
+        'endIndex': start + num,
+    }
+    return {'insertDimension': {'range': dimension_range, 'inheritFromBefore': True}}
+
+
+def diff_rows(
+    old_digests: typing.List[str], new_digests: typing.List[str], sheet_id: int
+) -> RowDiff:
+    """Plan the row insertions, deletions, and writes to turn old into new.
+
+    Requests work from the bottom of the sheet up, so the row indices of each
+    request are still valid when it's reached. Once all are applied, the sheet
+    has as many rows as `new_digests`, and only the rows in `to_write` differ.
     """
+    matcher = difflib.SequenceMatcher(None, old_digests, new_digests, autojunk=False)
+
+    requests, to_write = [], []
+    num_inserted = num_deleted = 0
+    for tag, i1, i2, j1, j2 in reversed(matcher.get_opcodes()):
+        if tag == 'equal':
+            continue
+        if j2 > j1:
+            to_write.append((j1, j2))
+
+        surplus = (i2 - i1) - (j2 - j1)
+        if surplus > 0:
+            requests.append(_delete_rows(sheet_id, i2 - surplus, i2))
+            num_deleted += surplus
+        elif surplus < 0:
+            at_end = i2 == len(old_digests)
+            requests.append(_insert_rows(sheet_id, i2, -surplus, at_end))
+            num_inserted -= surplus
+
+    return RowDiff(requests, to_write[::-1], num_inserted, num_deleted)
+
+
+class SyncReport(typing.NamedTuple):
+    num_rows: int  # Every row in the sheet, including the header
+    rows_written: int
+    rows_inserted: int
+    rows_deleted: int
+    api_calls: int  # (Excludes calls made to open the sheet)
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.num_rows / self.seconds if self.seconds else 0.0
+
+    @property
+    def api_calls_saved(self) -> int:
+        return LEGACY_API_CALLS - self.api_calls
+
+    def __str__(self):
+        return (
+            f"{self.num_rows} rows ({self.rows_written} written, "
+            f"{self.rows_inserted} inserted, {self.rows_deleted} deleted) "
+            f"in {self.seconds:.3f}s ({self.rows_per_second:.0f} rows/sec), "
+            f"{self.api_calls} API calls ({self.api_calls_saved} saved)"
+        )
+
+
+class SheetSync:
+    """Bring one discount's worksheet up to date, sending only what changed.
+
+    After every sync, we store a fingerprint of each row written. The next
+    sync compares against that fingerprint, then sends all row insertions &
+    deletions in one batch request, and all changed rows in another.
+    """
+
+    def __init__(self, discount, wks):
+        self.start = time.perf_counter()
+        self.discount = discount
+        self.wks = wks
+        self.writer = SheetWriter(discount)
+        self.header = SheetRow.from_values(self.writer.header)
+
+    def last_written(self) -> typing.Optional[typing.List[SheetRow]]:
+        """Return the rows last written to the sheet, if they can be trusted.
+
+        If the sheet's dimensions don't match what we last wrote (e.g. somebody
+        edited it by hand) or the columns have since changed, we can't say.
+        """
+        fingerprint = models.DiscountSheetFingerprint.objects.filter(
+            discount=self.discount, ga_key=self.discount.ga_key
+        ).first()
+        if not fingerprint:
+            return None
+
+        rows = [SheetRow(*row) for row in json.loads(fingerprint.rows)]
+        if not rows or rows[0].digest != self.header.digest:
+            return None
+        if (self.wks.row_count, self.wks.col_count) != (
+            len(rows),
+            len(self.writer.header),
+        ):
+            return None
+        return rows
+
+    def _full_rewrite(self, num_rows: int) -> RowDiff:
+        resize = {
+            'updateSheetProperties': {
+                'properties': {
+                    'sheetId': self.wks.id,
+                    'gridProperties': {
+                        'rowCount': num_rows,
+                        'columnCount': len(self.writer.header),
+                    },
+                },
+                'fields': 'gridProperties/rowCount,gridProperties/columnCount',
+            }
+        }
+        return RowDiff([resize], [(0, num_rows)], 0, 0)
+
+    def sync(
+        self, rows: typing.List[SheetRow], old: typing.Optional[typing.List[SheetRow]]
+    ) -> SyncReport:
+        """Write `rows` (all rows after the header), given the sheet's old rows.
+
+        If we don't know what's in the sheet (`old` is None), rewrite it all.
+        """
+        new = [self.header, *rows]
+        if old is None:
+            plan = self._full_rewrite(len(new))
+        else:
+            plan = diff_rows(
+                [row.digest for row in old], [row.digest for row in new], self.wks.id
+            )
+
+        last_col = len(self.writer.header)
+        data = []
+        for start, end in plan.to_write:
+            values = [row.values for row in new[start:end]]
+            if None in values:
+                raise ValueError("Can't write rows with unknown values")
+            cell_range = f'{rowcol_to_a1(start + 1, 1)}:{rowcol_to_a1(end, last_col)}'
+            data.append({'range': cell_range, 'values': values})
+
+        api_calls = 0
+        if plan.requests or data:
+            # Until all writes succeed, we can't vouch for the sheet's contents
+            models.DiscountSheetFingerprint.objects.filter(
+                discount=self.discount
+            ).delete()
+            if plan.requests:
+                with instrumentation.external_call('gspread'):
+                    self.wks.spreadsheet.batch_update({'requests': plan.requests})
+                api_calls += 1
+            if data:
+                with instrumentation.external_call('gspread'):
+                    self.wks.batch_update(data, value_input_option='RAW')
+                api_calls += 1
+            models.DiscountSheetFingerprint.objects.create(
+                discount=self.discount,
+                ga_key=self.discount.ga_key,
+                rows=json.dumps([[row.name, row.email, row.digest] for row in new]),
+            )
+
+        return SyncReport(
+            num_rows=len(new),
+            rows_written=sum(end - start for start, end in plan.to_write),
+            rows_inserted=plan.num_inserted,
+            rows_deleted=plan.num_deleted,
+            api_calls=api_calls,
+            seconds=time.perf_counter() - self.start,
+        )
+
+
+def _open_sync(discount) -> SheetSync:
     client, _ = connect_to_sheets()
-    wks = client.open_by_key(discount.ga_key).sheet1
-    participants = list(discount.participant_set.order_by('name'))
+    with instrumentation.external_call('gspread'):
+        wks = client.open_by_key(discount.ga_key).sheet1
+    return SheetSync(discount, wks)
+
+
+def _sync_all_participants(sync: SheetSync) -> SyncReport:
+    participants = list(sync.discount.participant_set.order_by('name'))
 
     users = models.User.objects.filter(pk__in=[p.user_id for p in participants])
     user_by_id = {user.pk: user for user in users}
+    memberships = membership.get_many(users)
 
-    writer = SheetWriter(discount)
+    rows = []
+    for participant in participants:
+        user = user_by_id[participant.user_id]
+        values = sync.writer.get_row(participant, user, memberships[user.pk])
+        rows.append(SheetRow.from_values(values))
+    return sync.sync(rows, sync.last_written())
 
-    # Resize sheet to exact size, select all cells
-    num_rows, num_cols = len(participants) + 1, len(writer.header)
-    wks.resize(num_rows, num_cols)
-    # pylint: disable=too-many-function-args
-    all_cells = wks.range(1, 1, num_rows, num_cols)
-    rows = grouper(all_cells, len(writer.header))
 
-    assign(next(rows), writer.header)
+@with_refreshed_token
+def update_participant(discount, participant) -> SyncReport:
+    """Add or update the participant.
 
-    # Update each row with current membership information
-    for participant, row in zip(participants, rows):
-        user = user_by_id[participant.user_id]
-        assign(row, writer.get_row(participant, user))
+    Much more efficient than updating the entire sheet (we find the
+    participant's row from the sheet's fingerprint, then write just that row).
+    """
+    sync = _open_sync(discount)
+    old = sync.last_written()
+    if old is None:  # Without reading the whole sheet, we can't find their row
+        return _sync_all_participants(sync)
+
+    user = models.User.objects.get(pk=participant.user_id)
+    (membership_info,) = membership.get_many([user]).values()
+    new_row = SheetRow.from_values(
+        sync.writer.get_row(participant, user, membership_info)
+    )
 
-    # Batch update to minimize API calls
-    wks.update_cells(all_cells)
+    # Drop any existing row (which must move if the participant was renamed)
+    rows = [row for row in old[1:] if row.email != participant.email]
+    rows.insert(bisect.bisect([row.name for row in rows], participant.name), new_row)
+    try:
+        return sync.sync(rows, old)
+    except ValueError:  # Rows shifted in some unexpected way; just redo it all
+        return _sync_all_participants(sync)
+
+
+@with_refreshed_token
+def update_discount_sheet(discount) -> SyncReport:
+    """Update the entire worksheet, updating all members' status.
+
+    This will remove members who no longer wish to share their information,
+    so it's important to run this periodically.
+
+    Only rows which have changed since the last sync are actually sent.
+    """
+    return _sync_all_participants(_open_sync(discount))
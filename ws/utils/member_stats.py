@@ -0,0 +1,183 @@
+"""Precompute statistics about current MITOC members (see `MemberStats`).
+
+Building these statistics means reading every current member from the gear
+database, then counting trips & discounts for each member with an account
+here. That's far too slow to do in a request, so it's done nightly instead.
+"""
+import json
+from typing import Dict, Iterable, Iterator, List, NamedTuple
+
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from ws import models
+from ws.utils import geardb
+
+STATS_FIELDS = (
+    'participant_id',
+    'last_known_affiliation',
+    'num_rentals',
+    'num_trips_attended',
+    'num_trips_led',
+    'num_discounts',
+)
+
+# Only reported for members with a participant (as `MemberStats` documents)
+TRIPS_FIELDS = ('num_trips_attended', 'num_trips_led', 'num_discounts')
+
+
+class RefreshSummary(NamedTuple):
+    created: int
+    updated: int
+    deleted: int
+
+
+def _count_by_participant(rows, participant_ids) -> Dict[int, int]:
+    return dict(
+        rows.filter(participant_id__in=participant_ids)
+        .order_by()  # (Default orderings would break grouping)
+        .values('participant_id')
+        .annotate(count=Count('pk'))
+        .values_list('participant_id', 'count')
+    )
+
+
+def trips_stats(participant_ids: Iterable[int]) -> Dict[int, Dict[str, int]]:
+    """Count trips attended & led (and discounts) for just these participants.
+
+    Each count is its own grouped query, rather than annotations on one query
+    (JOINing multiple relations would multiply, and so overcount, each row).
+    """
+    participant_ids = list(participant_ids)
+    attended = _count_by_participant(
+        models.SignUp.objects.filter(on_trip=True), participant_ids
+    )
+    led = _count_by_participant(models.Trip.leaders.through.objects, participant_ids)
+    discounts = _count_by_participant(
+        models.Participant.discounts.through.objects, participant_ids
+    )
+    return {
+        par_id: {
+            'num_trips_attended': attended.get(par_id, 0),
+            'num_trips_led': led.get(par_id, 0),
+            'num_discounts': discounts.get(par_id, 0),
+        }
+        for par_id in participant_ids
+    }
+
+
+def _participant_ids_by_email(emails: Iterable[str]) -> Dict[str, int]:
+    """Map (lowercase) verified emails to the participant which owns them."""
+    addresses = (
+        models.EmailAddress.objects.filter(verified=True)
+        .annotate(lower_email=Lower('email'))
+        .filter(lower_email__in=set(emails))
+        .values_list('lower_email', 'user_id')
+    )
+    user_id_by_email = dict(addresses)
+    par_id_by_user_id = dict(
+        models.Participant.objects.filter(
+            user_id__in=user_id_by_email.values()
+        ).values_list('user_id', 'pk')
+    )
+    return {
+        email: par_id_by_user_id[user_id]
+        for email, user_id in user_id_by_email.items()
+        if user_id in par_id_by_user_id
+    }
+
+
+def current_member_stats() -> Dict[int, dict]:
+    """Compute the latest stats for each current member, by gear database ID."""
+    members: Dict[int, dict] = {}
+    emails_by_person: Dict[int, List[str]] = {}
+    for email, info in geardb.stats_only_all_active_members():
+        person_id = info['person_id']
+        # Members with multiple emails are reported once per email
+        emails_by_person.setdefault(person_id, []).append(email)
+        members[person_id] = {
+            'last_known_affiliation': info['last_known_affiliation'],
+            'num_rentals': info['num_rentals'],
+        }
+
+    par_id_by_email = _participant_ids_by_email(
+        email for emails in emails_by_person.values() for email in emails
+    )
+    for person_id, emails in emails_by_person.items():
+        # Prefer the primary email's participant, but take any that's found
+        par_ids = [
+            par_id_by_email[email] for email in emails if email in par_id_by_email
+        ]
+        members[person_id]['participant_id'] = par_ids[0] if par_ids else None
+
+    stats_by_par_id = trips_stats(
+        info['participant_id'] for info in members.values() if info['participant_id']
+    )
+    for info in members.values():
+        par_stats = stats_by_par_id.get(info['participant_id'])
+        info.update(par_stats or dict.fromkeys(TRIPS_FIELDS))
+    return members
+
+
+def refresh_member_stats() -> RefreshSummary:
+    """Bring `MemberStats` up to date, writing only rows which changed."""
+    latest = current_member_stats()
+
+    with transaction.atomic():
+        existing = {
+            stats.person_id: stats
+            for stats in models.MemberStats.objects.select_for_update()
+        }
+        to_create = [
+            models.MemberStats(person_id=person_id, **info)
+            for person_id, info in latest.items()
+            if person_id not in existing
+        ]
+        to_update = []
+        now = timezone.now()
+        for person_id, info in latest.items():
+            stats = existing.get(person_id)
+            if stats is None:
+                continue
+            if any(getattr(stats, field) != info[field] for field in STATS_FIELDS):
+                for field in STATS_FIELDS:
+                    setattr(stats, field, info[field])
+                stats.last_updated = now  # (`bulk_update()` ignores `auto_now`)
+                to_update.append(stats)
+        expired = [
+            stats.pk for person_id, stats in existing.items() if person_id not in latest
+        ]
+
+        models.MemberStats.objects.bulk_create(to_create)
+        models.MemberStats.objects.bulk_update(
+            to_update, [*STATS_FIELDS, 'last_updated']
+        )
+        models.MemberStats.objects.filter(pk__in=expired).delete()
+
+    return RefreshSummary(
+        created=len(to_create), updated=len(to_update), deleted=len(expired)
+    )
+
+
+def describe_member(row: dict) -> dict:
+    """Describe a member's stats (trips stats are omitted without an account)."""
+    described = {
+        'last_known_affiliation': row['last_known_affiliation'],
+        'num_rentals': row['num_rentals'],
+    }
+    if row['participant_id'] is not None:
+        described.update({field: row[field] for field in TRIPS_FIELDS})
+    return described
+
+
+def stream_json(chunk_size: int = 500) -> Iterator[str]:
+    """Yield a JSON document of all members, without holding it in memory."""
+    rows = models.MemberStats.objects.values(*STATS_FIELDS).iterator(chunk_size)
+    yield '{"members": ['
+    separator = ''
+    for row in rows:
+        yield separator + json.dumps(describe_member(row))
+        separator = ', '
+    yield ']}'
@@ -1,5 +1,7 @@
 from datetime import timedelta
+from typing import Dict, Iterable, List, Optional
 
+from allauth.account.models import EmailAddress
 from django.db.models import Q
 from django.db.utils import OperationalError
 from sentry_sdk import capture_exception
@@ -8,6 +10,12 @@ from ws import enums, models
 from ws.utils import geardb
 from ws.utils.dates import local_now
 
+# By default, cached memberships older than this are refreshed before use
+MAX_CACHE_AGE = timedelta(hours=1)
+
+# Participants are refreshed (and the cache written) this many at a time
+REFRESH_CHUNK_SIZE = 500
+
 
 def refresh_all_membership_cache():
     """Refresh all membership caches in the system.
@@ -19,20 +27,107 @@ def refresh_all_membership_cache():
     needs_update = Q(membership__isnull=True) | Q(membership__last_cached__lt=last_week)
 
     all_participants = models.Participant.objects.select_related('membership')
-    for par in all_participants.filter(needs_update):
-        update_membership_cache(par)
+    needs_refresh = list(all_participants.filter(needs_update).order_by('pk'))
+    for i in range(0, len(needs_refresh), REFRESH_CHUNK_SIZE):
+        refresh_memberships(needs_refresh[i : i + REFRESH_CHUNK_SIZE])
 
 
 def update_membership_cache(participant):
     """Use results from the gear database to update membership cache."""
-    emails = geardb.verified_emails(participant.user)
+    refresh_memberships([participant])
+
+
+def _is_fresh(membership: Optional[models.Membership], max_age) -> bool:
+    if membership is None:
+        return False
+    return max_age is None or membership.last_cached >= local_now() - max_age
 
-    # If something is found, this method automatically updates the cache
-    most_recent = geardb.membership_expiration(emails)
 
-    # However, if nothing is found, we'll need to set that ourselves
-    if not most_recent['membership']['email']:
-        participant.update_membership(membership_expires=None, waiver_expires=None)
+def get_many(users, max_age: Optional[timedelta] = MAX_CACHE_AGE) -> Dict[int, dict]:
+    """Return membership information for each user, keyed by user ID.
+
+    Memberships cached within `max_age` are reported directly from the cache
+    (if `max_age` is None, any cached membership will do). All others are
+    looked up in the gear database in bulk, which also refreshes the cache.
+    """
+    user_ids = [user.pk for user in users]
+    participants = models.Participant.objects.filter(user_id__in=user_ids)
+    par_by_user_id = {
+        par.user_id: par for par in participants.select_related('membership')
+    }
+
+    memberships: Dict[int, dict] = {}
+    to_refresh: List[int] = []
+    for user_id in user_ids:
+        par = par_by_user_id.get(user_id)
+        if par and _is_fresh(par.membership, max_age):
+            memberships[user_id] = geardb.format_cached_membership(par)
+        else:
+            to_refresh.append(user_id)
+
+    for i in range(0, len(to_refresh), REFRESH_CHUNK_SIZE):
+        chunk = to_refresh[i : i + REFRESH_CHUNK_SIZE]
+        memberships.update(_lookup_memberships(chunk))
+        _update_cache(
+            [par_by_user_id[user_id] for user_id in chunk if user_id in par_by_user_id],
+            memberships,
+        )
+    return memberships
+
+
+def refresh_memberships(participants: Iterable[models.Participant]) -> Dict[int, dict]:
+    """Update the membership cache for each participant, from the gear database.
+
+    Returns the current membership for each participant, keyed by user ID.
+    """
+    participants = list(participants)
+    memberships = _lookup_memberships([par.user_id for par in participants])
+    _update_cache(participants, memberships)
+    return memberships
+
+
+def _lookup_memberships(user_ids: List[int]) -> Dict[int, dict]:
+    """Query the gear database for each user's membership, using verified emails."""
+    emails = EmailAddress.objects.filter(user_id__in=user_ids, verified=True)
+    found = geardb.memberships_by_user(dict(emails.values_list('email', 'user_id')))
+    return {
+        user_id: found.get(user_id) or geardb.repr_blank_membership()
+        for user_id in user_ids
+    }
+
+
+def _update_cache(participants: List[models.Participant], memberships) -> None:
+    """Write each participant's membership to the cache, in bulk."""
+    now = local_now()
+
+    to_update: List[models.Membership] = []
+    to_create: List[models.Membership] = []
+    newly_cached: List[models.Participant] = []
+    for par in participants:
+        info = memberships[par.user_id]
+        cached = par.membership or models.Membership()
+
+        # Like `Participant.update_membership`, known expiration dates aren't cleared
+        cached.membership_expires = (
+            info['membership']['expires'] or cached.membership_expires
+        )
+        cached.waiver_expires = info['waiver']['expires'] or cached.waiver_expires
+        cached.last_cached = now
+
+        if cached.pk:
+            to_update.append(cached)
+        else:
+            par.membership = cached
+            to_create.append(cached)
+            newly_cached.append(par)
+
+    models.Membership.objects.bulk_update(
+        to_update, ['membership_expires', 'waiver_expires', 'last_cached']
+    )
+    models.Membership.objects.bulk_create(to_create)
+    for par, created in zip(newly_cached, to_create):
+        par.membership_id = created.pk
+    models.Participant.objects.bulk_update(newly_cached, ['membership'])
 
 
 def reasons_cannot_attend(user, trip):
@@ -0,0 +1,64 @@
+"""
+Look up the rating a leader held at any point in time.
+
+Trip lists, feedback tables and more show each leader's rating at the time
+of each trip. Rather than filter every rating for each leader on each trip,
+a leader's ratings are kept as a compact timeline (sorted by activity, then
+time) which can be searched with `bisect`.
+
+Timelines are built for each participant instance (so last for just one
+request or task), but many can be built at once: see
+`Participant.load_rating_timelines`.
+"""
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class RatingTimeline:
+    """Every rating one leader has held, grouped by activity & sorted by time."""
+
+    __slots__ = ('_times', '_ratings')
+
+    def __init__(self, ratings: Iterable[Tuple[str, datetime, str, bool]]):
+        """Build from (activity, time_created, rating, active) in any order."""
+        by_activity: Dict[str, List[Tuple[datetime, str, bool]]] = defaultdict(list)
+        for activity, time_created, rating, active in ratings:
+            by_activity[activity].append((time_created, rating, active))
+
+        self._times: Dict[str, List[datetime]] = {}
+        self._ratings: Dict[str, List[Tuple[str, bool]]] = {}
+        for activity, entries in by_activity.items():
+            entries.sort(key=lambda entry: entry[0])
+            self._times[activity] = [time for time, _, _ in entries]
+            self._ratings[activity] = [
+                (rating, active) for _, rating, active in entries
+            ]
+
+    def rating(
+        self,
+        activity: str,
+        must_be_active: bool = True,
+        at_time: Optional[datetime] = None,
+        after_time: Optional[datetime] = None,
+    ) -> Optional[str]:
+        """Return the most recent rating for the activity matching the filters.
+
+        must_be_active: Only consider ratings that are still active
+        at_time:        Only consider ratings created at or before this time
+        after_time:     Only consider ratings created after this time
+        """
+        times = self._times.get(activity)
+        if not times:
+            return None
+        ratings = self._ratings[activity]
+
+        end = len(times) if at_time is None else bisect_right(times, at_time)
+        for i in range(end - 1, -1, -1):
+            if after_time is not None and times[i] <= after_time:
+                return None  # (All earlier ratings are older still)
+            rating, active = ratings[i]
+            if active or not must_be_active:
+                return rating
+        return None
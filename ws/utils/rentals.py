@@ -0,0 +1,129 @@
+"""Cache rentals from the gear database so that trip pages needn't wait on it."""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from allauth.account.models import EmailAddress
+from django.db import transaction
+from django.db.models import Q
+
+from ws import models
+from ws.utils import geardb
+from ws.utils.dates import local_date, local_now
+
+# Cached rentals older than this are refreshed in the background when viewed
+MAX_CACHE_AGE = timedelta(hours=1)
+
+# Participants are refreshed (one API call per chunk) this many at a time
+REFRESH_CHUNK_SIZE = 200
+
+
+class TripRentals(NamedTuple):
+    # Each leader & participant with rentals, in the order that the trip lists them
+    by_participant: List[tuple]  # (Participant, List[models.Rental])
+    # When the *least* recently refreshed person was cached (None if anybody never was)
+    last_cached: Optional[datetime]
+    # Leaders & participants whose rentals should be refreshed
+    stale_participant_ids: List[int]
+
+
+def upcoming_trip_participants():
+    """Return all leaders & participants on trips taking place today or later."""
+    today = local_date()
+    return models.Participant.objects.filter(
+        Q(signup__on_trip=True, signup__trip__trip_date__gte=today)
+        | Q(trips_led__trip_date__gte=today)
+    ).distinct()
+
+
+def refresh_upcoming_rentals() -> int:
+    """Refresh cached rentals for everybody on an upcoming trip.
+
+    Returns the number of participants refreshed.
+    """
+    par_ids = list(upcoming_trip_participants().values_list('pk', flat=True))
+    for i in range(0, len(par_ids), REFRESH_CHUNK_SIZE):
+        refresh_rentals(par_ids[i : i + REFRESH_CHUNK_SIZE])
+    return len(par_ids)
+
+
+def refresh_rentals(participant_ids: Iterable[int]) -> None:
+    """Replace cached rentals for each participant with those in the gear database.
+
+    All participants are looked up in a single API call.
+    """
+    participants = list(
+        models.Participant.objects.filter(pk__in=participant_ids).only('pk', 'user_id')
+    )
+    par_by_user_id = {par.user_id: par for par in participants}
+    emails = EmailAddress.objects.filter(user_id__in=par_by_user_id, verified=True)
+    par_by_email = {
+        addr.email: par_by_user_id[addr.user_id]
+        for addr in emails.only('email', 'user_id')
+    }
+
+    rentals = [
+        models.Rental(
+            participant=par_by_email[item.email],
+            email=item.email,
+            gear_id=item.id,
+            name=item.name,
+            cost=item.cost,
+            checkedout=item.checkedout,
+        )
+        for item in geardb.outstanding_items(list(par_by_email))
+    ]
+
+    with transaction.atomic():
+        models.Rental.objects.filter(participant__in=participants).delete()
+        models.Rental.objects.bulk_create(rentals)
+        models.Participant.objects.filter(pk__in=[p.pk for p in participants]).update(
+            rentals_last_cached=local_now()
+        )
+
+
+def is_stale(
+    participant: models.Participant, max_age: timedelta = MAX_CACHE_AGE
+) -> bool:
+    last_cached = participant.rentals_last_cached
+    return last_cached is None or last_cached < local_now() - max_age
+
+
+def trip_rentals(trip: models.Trip, max_age: timedelta = MAX_CACHE_AGE) -> TripRentals:
+    """Report cached rentals for each leader & participant on the trip.
+
+    Only items checked out on or before the trip date are reported (anything
+    rented later definitely wasn't rented for the trip).
+    """
+    on_trip = trip.signup_set.filter(on_trip=True).select_related('participant')
+    people = list(trip.leaders.all()) + [signup.participant for signup in on_trip]
+
+    items: Dict[int, List[models.Rental]] = defaultdict(list)
+    cached = models.Rental.objects.filter(
+        participant__in=people, checkedout__lte=trip.trip_date
+    )
+    for rental in cached:
+        items[rental.participant_id].append(rental)
+
+    unique_people = list({par.pk: par for par in people}.values())
+    cached_times = [par.rentals_last_cached for par in unique_people]
+    never_cached = not cached_times or None in cached_times
+    return TripRentals(
+        by_participant=[(par, items[par.pk]) for par in unique_people if items[par.pk]],
+        last_cached=None if never_cached else min(cached_times),  # type: ignore
+        stale_participant_ids=[
+            par.pk for par in unique_people if is_stale(par, max_age)
+        ],
+    )
+
+
+def format_rental(rental: models.Rental) -> dict:
+    """Describe a cached rental (like the gear database would) for JSON."""
+    return {
+        'email': rental.email,
+        'id': rental.gear_id,
+        'name': rental.name,
+        'cost': rental.cost,
+        'checkedout': rental.checkedout,
+        'overdue': rental.overdue,
+    }
@@ -0,0 +1,125 @@
+"""Find participants by name or email, as a leader types into a search box.
+
+Searches match the start of each word in a participant's name or email
+(so "mich bol" will find "Michael Bolton" or "michael@bolton.example.com").
+Case and accents are ignored ("Ines" finds "Inés", "élodie" finds "Elodie").
+
+The search backend is set by `settings.PARTICIPANT_SEARCH_BACKEND`:
+
+- `PostgresParticipantSearch` queries a GIN index on each participant's
+  `search_document`: the words of their (case- and accent-folded) name & email.
+  A database trigger maintains that document, using the same folding as here
+  (see the `ws_participant_search_text` SQL function, created by a migration).
+- `InMemoryParticipantSearch` builds a prefix index in-process on every
+  search. It's slow on large tables, but needs nothing from the database.
+"""
+import bisect
+import itertools
+import re
+from typing import Dict, List, Set, Tuple
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import Case, F, IntegerField, QuerySet, When
+from django.utils.module_loading import import_string
+
+# Accented characters are folded to unaccented letters (both here & in SQL).
+# Postgres's `lower()` might ignore non-ASCII characters, so give both cases.
+FOLD_FROM = (
+    'àáâãäåāăąçćčďđèéêëēėęěìíîïīįłñńňòóôõöøōőŕřśšşťùúûüūůűųýÿźżž'
+    'ÀÁÂÃÄÅĀĂĄÇĆČĎĐÈÉÊËĒĖĘĚÌÍÎÏĪĮŁÑŃŇÒÓÔÕÖØŌŐŔŘŚŠŞŤÙÚÛÜŪŮŰŲÝŸŹŻŽ'
+)
+FOLD_TO = 'aaaaaaaaacccddeeeeeeeeiiiiiilnnnoooooooorrssstuuuuuuuuyyzzz' * 2
+_FOLD_TABLE = str.maketrans(FOLD_FROM, FOLD_TO)
+
+# Runs of letters & digits (underscores are separators, as with Postgres)
+WORD_REGEX = re.compile(r'[^\W_]+')
+
+
+def fold(text: str) -> str:
+    return text.lower().translate(_FOLD_TABLE)
+
+
+def search_terms(text: str) -> List[str]:
+    """Return the folded words to search by (each one a prefix)."""
+    return WORD_REGEX.findall(fold(text))
+
+
+class ParticipantSearch:
+    """Narrow participants down to those matching some search text."""
+
+    def search(self, participants: QuerySet, text: str) -> QuerySet:
+        """Return participants matching all words in `text`, best matches first.
+
+        If there's nothing to search by, no participants match.
+        """
+        raise NotImplementedError
+
+
+class PostgresParticipantSearch(ParticipantSearch):
+    def search(self, participants: QuerySet, text: str) -> QuerySet:
+        terms = search_terms(text)
+        if not terms:
+            return participants.none()
+
+        # Every word must match (as a prefix), but full-word matches rank higher
+        prefixes = SearchQuery(
+            ' & '.join(f'{term}:*' for term in terms),
+            config='simple',
+            search_type='raw',
+        )
+        full_words = SearchQuery(' | '.join(terms), config='simple', search_type='raw')
+        return (
+            participants.filter(search_document=prefixes)
+            .annotate(search_rank=SearchRank(F('search_document'), full_words))
+            .order_by('-search_rank', 'name', 'pk')
+        )
+
+
+class InMemoryParticipantSearch(ParticipantSearch):
+    @staticmethod
+    def _index(participants: QuerySet) -> List[Tuple[str, int]]:
+        """Return a sorted list of `(word, participant_pk)` for all participants."""
+        index: Set[Tuple[str, int]] = set()
+        for pk, name, email in participants.values_list('pk', 'name', 'email'):
+            index.update((word, pk) for word in search_terms(f'{name} {email}'))
+        return sorted(index)
+
+    def search(self, participants: QuerySet, text: str) -> QuerySet:
+        terms = search_terms(text)
+        if not terms:
+            return participants.none()
+
+        index = self._index(participants)
+        words = [word for word, _pk in index]
+
+        # Count full-word matches for each participant matching every term
+        full_word_matches: Dict[int, int] = {}
+        for i, term in enumerate(terms):
+            matches: Dict[int, int] = {}
+            start = bisect.bisect_left(words, term)
+            for word, pk in itertools.islice(index, start, None):
+                if not word.startswith(term):
+                    break
+                matches[pk] = max(matches.get(pk, 0), int(word == term))
+            full_word_matches = {
+                pk: full_word_matches.get(pk, 0) + num
+                for pk, num in matches.items()
+                if i == 0 or pk in full_word_matches
+            }
+
+        if not full_word_matches:
+            return participants.none()
+        rank = Case(
+            *(When(pk=pk, then=-num) for pk, num in full_word_matches.items()),
+            output_field=IntegerField(),
+        )
+        return (
+            participants.filter(pk__in=full_word_matches)
+            .annotate(search_rank=rank)
+            .order_by('search_rank', 'name', 'pk')
+        )
+
+
+def participant_search() -> ParticipantSearch:
+    return import_string(settings.PARTICIPANT_SEARCH_BACKEND)()
@@ -1,10 +1,81 @@
+import itertools
+from datetime import timedelta
+
 from django.contrib import messages
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
 from ws import models
 
 
+def _signup_count(**filters):
+    signups = (
+        models.SignUp.objects.filter(trip=OuterRef('pk'), **filters)
+        .order_by()
+        .values('trip')
+        .annotate(count=Count('pk'))
+        .values('count')
+    )
+    return Coalesce(Subquery(signups, output_field=IntegerField()), 0)
+
+
+def actual_signup_counts():
+    """Expressions to compute each of a trip's (denormalized) signup counts."""
+    return {
+        'num_signups': _signup_count(),
+        'num_on_trip': _signup_count(on_trip=True),
+        'num_waitlisted': _signup_count(waitlistsignup__isnull=False),
+    }
+
+
+def update_signup_counts(trips):
+    """Recompute the signup counts on each trip in the given QuerySet.
+
+    Signals (and `save_on_trip`) keep these counts up to date when saving or
+    deleting individual objects, but bulk operations (`update()`, `bulk_create()`, etc.) bypass
+    signals, and must instead call this method when done.
+    """
+    return trips.update(cache_version=F('cache_version') + 1, **actual_signup_counts())
+
+
+def adjust_signup_counts(trips, cached_trip=None, **deltas):
+    """Atomically adjust denormalized signup counts (see `Trip.num_signups`).
+
+    If given, the trip instance in memory is also updated (other instances
+    of the same trip will be stale, so this is just a convenience).
+
+    Trip lists show signup counts, so cached rows are invalidated too.
+    """
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    deltas['cache_version'] = 1
+    trips.update(**{field: F(field) + delta for field, delta in deltas.items()})
+    if cached_trip is not None:
+        for field, delta in deltas.items():
+            setattr(cached_trip, field, getattr(cached_trip, field) + delta)
+
+
+def save_on_trip(signup, on_trip: bool) -> None:
+    """Put the signup on the trip (or take it off), adjusting signup counts.
+
+    Only `on_trip` is written. Counts are adjusted if this instance's value
+    changes, so a stale instance can miscount (see `repair_signup_counts`),
+    but capacity checks count signups afresh (see `Trip.current_open_slots`).
+    """
+    was_on_trip = signup.on_trip
+    signup.on_trip = on_trip
+    signup.save(update_fields=['on_trip', 'last_updated'])
+    if was_on_trip != on_trip:
+        adjust_signup_counts(
+            models.Trip.objects.filter(pk=signup.trip_id),
+            signup.trip if models.SignUp.trip.is_cached(signup) else None,
+            num_on_trip=1 if on_trip else -1,
+        )
+
+
 def next_in_order(signup, manual_order=None):
     """Add the signup to the next-ordered spot on the trip or in waitlist.
 
@@ -37,8 +108,7 @@ def next_in_order(signup, manual_order=None):
 @transaction.atomic
 def add_to_waitlist(signup, request=None, prioritize=False, top_spot=False):
     """Add the given signup to the waitlist, optionally prioritizing it."""
-    signup.on_trip = False
-    signup.save()
+    save_on_trip(signup, False)
 
     try:
         wl_signup = signup.waitlistsignup
@@ -76,12 +146,11 @@ def trip_or_wait(
             messages.error(request, "Trip is not an open first-come, first-serve trip")
         return signup
 
-    if not trip.open_slots:  # Trip is full, add to the waiting list
+    if not trip.current_open_slots():  # Trip is full, add to the waiting list
         add_to_waitlist(signup, request, prioritize, top_spot)
         return signup
 
-    signup.on_trip = True
-    signup.save()
+    save_on_trip(signup, True)
     if request:
         messages.success(request, "Signed up!")
 
@@ -94,6 +163,86 @@ def trip_or_wait(
     return signup
 
 
+def _existing_waitlist_signup(signup):
+    try:
+        return signup.waitlistsignup
+    except models.WaitListSignup.DoesNotExist:
+        return None
+
+
+@transaction.atomic
+def reorder_signups(trip, ordered_signups):
+    """Place signups on the trip (or its waitlist) in exactly the given order.
+
+    This has the same result as taking each signup off the trip, then calling
+    `trip_or_wait` & `next_in_order` on each signup in turn - but rather than
+    saving each signup (and re-querying open slots) one at a time, the final
+    state is computed up front and written in a few bulk queries.
+
+    Signups should have `waitlistsignup` already selected.
+    """
+    ordered_signups = list(ordered_signups)
+    keep_pks = {signup.pk for signup in ordered_signups}
+
+    trip_signups = list(trip.signup_set.values_list('pk', 'on_trip', 'manual_order'))
+    num_others_on_trip = sum(
+        1 for pk, on_trip, _ in trip_signups if on_trip and pk not in keep_pks
+    )
+
+    # Mimic a series of saves: each signup is updated slightly after the last.
+    # (`last_updated` breaks ties in `manual_order` when ordering a trip)
+    now = timezone.now()
+    ticks = (now + timedelta(microseconds=i) for i in itertools.count())
+
+    to_create, to_delete, to_update = [], [], []
+    num_placed = 0
+    for order, signup in enumerate(ordered_signups):
+        signup.on_trip = False
+        wl_signup = _existing_waitlist_signup(signup)
+
+        # Equivalent to `trip_or_wait(signup, trip_must_be_open=False)`
+        if trip.algorithm == 'fcfs':
+            open_slots = trip.maximum_participants - num_others_on_trip - num_placed
+            if open_slots:
+                signup.on_trip = True
+                num_placed += 1
+                if wl_signup:
+                    to_delete.append(wl_signup)
+                    wl_signup = None
+            elif not wl_signup:
+                wl_signup = models.WaitListSignup(signup=signup, waitlist=trip.waitlist)
+                to_create.append(wl_signup)
+            signup.last_updated = next(ticks)
+
+        # Equivalent to `next_in_order(signup, order)`
+        if signup.on_trip:
+            # Only the first signup (order 0) takes `last_of_priority`
+            if order:
+                signup.manual_order = order
+            else:
+                manual_orders = [manual_order for _, _, manual_order in trip_signups]
+                if None in manual_orders:
+                    signup.manual_order = 1
+                else:
+                    signup.manual_order = max(manual_orders) + 1
+            signup.last_updated = next(ticks)
+        elif wl_signup:
+            # pylint: disable=invalid-unary-operand-type
+            wl_signup.manual_order = -order if order else trip.waitlist.last_of_priority
+            if wl_signup.pk:
+                to_update.append(wl_signup)
+
+    models.SignUp.objects.bulk_update(
+        ordered_signups, ['on_trip', 'manual_order', 'last_updated']
+    )
+    models.WaitListSignup.objects.filter(
+        pk__in=[wl_signup.pk for wl_signup in to_delete]
+    ).delete()
+    models.WaitListSignup.objects.bulk_create(to_create)
+    models.WaitListSignup.objects.bulk_update(to_update, ['manual_order'])
+    update_signup_counts(models.Trip.objects.filter(pk=trip.pk))
+
+
 def update_queues_if_trip_open(trip):
     """Update queues if the trip is an open, first-come, first-serve trip.
 
@@ -103,8 +252,7 @@ def update_queues_if_trip_open(trip):
     if not (trip.signups_open and trip.algorithm == 'fcfs'):
         return
 
-    on_trip = trip.signup_set.filter(on_trip=True)
-    diff = trip.maximum_participants - on_trip.count()
+    diff = trip.current_open_slots()
 
     waitlisted = models.WaitListSignup.objects.filter(signup__trip=trip)
     if diff > 0:  # Trip is growing, add waitlisted participants if applicable
@@ -113,8 +261,6 @@ def update_queues_if_trip_open(trip):
     elif diff < 0:  # Trip is shrinking, move lowest signups to waitlist
         for _ in range(abs(diff)):
             last = trip.signup_set.filter(on_trip=True).last()
-            last.on_trip = False
-            last.save()
             # Make sure they're at the top!
             add_to_waitlist(last, prioritize=True, top_spot=True)
 
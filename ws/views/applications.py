@@ -153,6 +153,11 @@ class AllLeaderApplicationsView(ApplicationManager, ListView):  # type: ignore[m
             if app.num_ratings:
                 apps_by_year[app.year].append(app)
 
+        # Each participant's current rating is shown alongside their application
+        models.Participant.load_rating_timelines(
+            app.participant for apps in apps_by_year.values() for app in apps
+        )
+
         for year, apps in sorted(apps_by_year.items(), reverse=True):
             sorted_by_name = sorted(apps, key=lambda app: app.participant.name)
             yield (year, sorted_by_name)
@@ -1,12 +1,11 @@
 from django.contrib import messages
-from django.db import connections
 from django.db.utils import IntegrityError
 from django.shortcuts import redirect
 from django.urls import reverse
 from django.utils.decorators import method_decorator
 from django.views.generic import TemplateView, View
 
-from ws import merge, models
+from ws import duplicates, merge, models
 from ws.decorators import admin_only
 
 
@@ -25,57 +24,9 @@ class PotentialDuplicatesView(AdminOnlyView, TemplateView):
 
     template_name = 'duplicates/index.html'
 
-    @property
-    def potential_duplicates(self):
-        """Yield pairs of potential duplicates.
-
-        Each pair of potential duplicates has the most recently active person
-        listed last. It's suggested that the merge is done into that account.
-        """
-        cursor = connections['default'].cursor()
-        # TODO: Move this out of the view into its own module, with direct testing
-        cursor.execute(
-            '''
-            with dupe_groups as (
-              select array_agg(id order by profile_last_updated desc, id desc) as dupes
-                from ws_participant
-               group by name
-              having count(*) > 1
-            union
-              select array_agg(id order by profile_last_updated desc, id desc) as dupes
-                from ws_participant
-               where cell_phone != ''
-               group by cell_phone
-              having count(*) > 1
-            ),
-            potential_pairs as (
-              select dupes[1] as new_participant,
-                     unnest(dupes[2:]) as old_participant
-                from dupe_groups
-            )
-            select old_participant,
-                   new_participant
-              from potential_pairs pp
-                   left join ws_distinctaccounts da on
-                      (da.left_id = pp.old_participant and da.right_id = pp.new_participant)
-                   or (da.left_id = pp.new_participant and da.right_id = pp.old_participant)
-             where da.id is null
-            '''
-        )
-        pairs = [(row[0], row[1]) for row in cursor.fetchall()]
-
-        # Map PKs back to objects that can be used easily in templates
-        participants = models.Participant.objects.filter(
-            pk__in=[pk for pair in pairs for pk in pair]
-        ).select_related('emergency_info__emergency_contact', 'car')
-        par_by_pk = {par.pk: par for par in participants}
-
-        for old, new in pairs:
-            yield (par_by_pk[old], par_by_pk[new])
-
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['potential_duplicates'] = list(self.potential_duplicates)
+        context['potential_duplicates'] = list(duplicates.ranked_pairs())
         return context
 
 
@@ -322,18 +322,19 @@ class ParticipantView(
         # Avoid doubly-listing trips where they participated or led the trip
         created_but_not_on = trips_created.exclude(leading_trip | par_on_trip)
 
+        # Trip lists are rendered (from instances) or counted, so evaluate them now
         return {
             'current': {
-                'on_trip': accepted.filter(in_future),
-                'waitlisted': waitlisted.filter(in_future),
-                'leader': trips_led.filter(in_future),
-                'creator': created_but_not_on.filter(in_future),
+                'on_trip': list(accepted.filter(in_future)),
+                'waitlisted': list(waitlisted.filter(in_future)),
+                'leader': list(trips_led.filter(in_future)),
+                'creator': list(created_but_not_on.filter(in_future)),
                 'wimp': participant.wimp_trips.filter(in_future),
             },
             'past': {
-                'on_trip': accepted.filter(in_past),
-                'leader': trips_led.filter(in_past),
-                'creator': created_but_not_on.filter(in_past),
+                'on_trip': list(accepted.filter(in_past)),
+                'leader': list(trips_led.filter(in_past)),
+                'creator': list(created_but_not_on.filter(in_past)),
                 'wimp': participant.wimp_trips.filter(in_past),
             },
         }
@@ -481,7 +482,7 @@ class ProfileView(ParticipantView):
         today = date_utils.local_date()
         ordered_trips = models.Trip.objects.order_by('-trip_date', '-time_created')
         current_trips = ordered_trips.filter(trip_date__gte=today)
-        context = {'current_trips': annotated_for_trip_list(current_trips)}
+        context = {'current_trips': list(annotated_for_trip_list(current_trips))}
 
         num_trips = len(context['current_trips'])  # Use len to avoid extra query
 
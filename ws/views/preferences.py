@@ -15,6 +15,7 @@ from django.urls import reverse_lazy
 from django.utils.decorators import method_decorator
 from django.views.generic import CreateView, FormView, TemplateView
 
+import ws.messages
 from ws import enums, forms, models, tasks
 from ws.decorators import user_info_required
 from ws.mixins import LotteryPairingMixin
@@ -242,6 +243,7 @@ class LotteryPreferencesView(TemplateView, LotteryPairingMixin):
         for signup in signups:
             signup.order = order_per_signup[signup.pk]
         models.SignUp.objects.bulk_update(signups, ['order'])
+        ws.messages.invalidate_state([par.pk])  # (Bulk updates send no signals)
 
     def handle_paired_signups(self):
         """For participants who might be paired, warn if other participant hasn't signed up.
@@ -5,7 +5,7 @@ from typing import Dict, List, Optional
 import requests
 from mitoc_const import affiliations
 
-from ws import models, settings
+from ws import instrumentation, models, settings
 
 AFFILIATION_MAPPING = {aff.CODE: aff.VALUE for aff in affiliations.ALL}
 
@@ -54,7 +54,8 @@ def get_base_url() -> str:
     https://na2.docusign.net/restapi/v2/accounts/<numeric_account_id>
     """
     v2_base = settings.DOCUSIGN_API_BASE  # (Demo or production)
-    resp = requests.get(v2_base + 'login_information', headers=get_headers())
+    with instrumentation.external_call('docusign'):
+        resp = requests.get(v2_base + 'login_information', headers=get_headers())
 
     return resp.json()['loginAccounts'][0]['baseUrl']
 
@@ -151,7 +152,8 @@ def sign_embedded(
         'returnUrl': 'https://mitoc-trips.mit.edu',
     }
     # Fetch a URL that can be used to sign the waiver (expires in 5 minutes)
-    redir_url = requests.post(recipient_url, json=user, headers=get_headers())
+    with instrumentation.external_call('docusign'):
+        redir_url = requests.post(recipient_url, json=user, headers=get_headers())
     return redir_url.json()['url']
 
 
@@ -194,7 +196,10 @@ def initiate_waiver(
         releasor_dict['clientUserId'] = participant.pk
 
     base_url = get_base_url()
-    env = requests.post(f'{base_url}/envelopes', json=new_env, headers=get_headers())
+    with instrumentation.external_call('docusign'):
+        env = requests.post(
+            f'{base_url}/envelopes', json=new_env, headers=get_headers()
+        )
 
     # If there's no participant, an email will be sent; no need to redirect
     redir_url: Optional[str] = None